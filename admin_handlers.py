@@ -1,38 +1,39 @@
 # admin_handlers.py
 
 import os
+import csv
+import io
+import time
 from datetime import datetime
 from zoneinfo import ZoneInfo  # ⬅️ usamos zona horaria sin dependencias externas
 from telebot import TeleBot
-from telebot.types import ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove
-
-from config import ADMIN_ID, PLANS, CLIENTS_DIR
-from storage import load_json, save_json
-from utils import generate_qr, delete_config, get_stats, calcular_nuevo_vencimiento
-from generator import create_config
-
-CONFIGS_FILE = os.path.join(CLIENTS_DIR, 'configuraciones.json')
+from telebot.apihelper import ApiTelegramException
+from telebot.types import (
+    ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove,
+    InlineKeyboardMarkup, InlineKeyboardButton,
+    InlineQueryResultArticle, InputTextMessageContent
+)
+
+from config import ADMIN_ID, PLANS, CLIENTS_DIR, LISTADO_POR_PAGINA, BUSQUEDA_POR_PAGINA, BUSQUEDA_TTL
+from client_store import ClientRecord, get_client_store
+from client_index import get_client_index
+from client_stats import get_client_stats
+from payment_store import get_payment_store
+from utils import generate_qr, delete_config, calcular_nuevo_vencimiento, escapar_md
+from generator import NOMBRE_VALIDO
+from provisioning_queue import get_provisioning_queue, formatear_stats
+from peer_telemetry import get_peer_telemetry, nombres_por_clave, formatear_bytes, formatear_hace
+from quota_engine import get_quota_engine, hay_cuotas
+from qr_cache import get_qr_cache
+from file_id_cache import enviar_documento, enviar_foto
+from client_handlers import mostrar_menu_cliente
+from outbound import get_outbound
+from router import get_router, formatear_stats as formatear_rutas
 
 # ====== ZONAS HORARIAS ======
 TZ_UTC = ZoneInfo("UTC")
 TZ_CUBA = ZoneInfo("America/Havana")
 
-def _parse_dt_any_utc(s: str) -> datetime:
-    """Parsea string del JSON y lo devuelve con tz UTC."""
-    for fmt in ("%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S"):
-        try:
-            dt = datetime.strptime(s, fmt)
-            return dt.replace(tzinfo=TZ_UTC)
-        except ValueError:
-            pass
-    # si nada funcionó, re-lanza con el formato base
-    dt = datetime.strptime(s, "%Y-%m-%d %H:%M")
-    return dt.replace(tzinfo=TZ_UTC)
-
-def _fmt_cuba_from_str(s: str) -> str:
-    """Convierte string UTC del JSON a string hora Cuba 12h."""
-    return _parse_dt_any_utc(s).astimezone(TZ_CUBA).strftime("%d/%m/%Y %I:%M %p")
-
 def _fmt_cuba_from_dt(dt: datetime) -> str:
     """Convierte datetime (asumido UTC naive) a string hora Cuba 12h."""
     return dt.replace(tzinfo=TZ_UTC).astimezone(TZ_CUBA).strftime("%d/%m/%Y %I:%M %p")
@@ -44,6 +45,7 @@ def admin_menu():
         KeyboardButton('➕ Crear configuración'),
         KeyboardButton('🛠 Gestionar configuraciones'),
         KeyboardButton('📊 Estadísticas'),
+        KeyboardButton('📶 Conexiones'),
         KeyboardButton('🔙 Volver')
     )
     return kb
@@ -61,30 +63,241 @@ def gestion_menu():
     )
     return kb
 
+# ====== LISTADO PAGINADO ======
+# Filtros de "Ver todas": clave corta (viaja en callback_data) -> (etiqueta, plan, activa)
+FILTROS_LISTADO = {
+    't': ('Todas', None, None),
+    'a': ('✅ Activas', None, True),
+    'e': ('⛔️ Expiradas', None, False),
+}
+FILTROS_LISTADO.update({f"p{i}": (plan, plan, None) for i, plan in enumerate(PLANS)})
+
+# Filas ya formateadas: {nombre: ((vence, plan, activa), texto)}
+_FILAS = {}
+
+def _resumen_cliente(rec: ClientRecord) -> str:
+    """'✅ Activa — vence … — plan …' (texto plano)."""
+    estado = "✅ Activa" if rec.activa else "⛔️ Expirada"
+    venc_local = _fmt_cuba_from_dt(rec.vencimiento) if rec.vence else '—'
+    return f"{estado} — vence {venc_local} — plan {rec.plan or '—'}"
+
+def _fila_listado(rec: ClientRecord) -> str:
+    """Fila del listado; solo se vuelve a formatear si cambió el registro."""
+    cli = rec.nombre
+    clave = (rec.vence, rec.plan, rec.activa)
+    cacheada = _FILAS.get(cli)
+    if cacheada and cacheada[0] == clave:
+        return cacheada[1]
+    texto = f"• {escapar_md(cli)}: {escapar_md(_resumen_cliente(rec))}"
+    _FILAS[cli] = (clave, texto)
+    return texto
+
+def _olvidar_fila(evento, nombre, registro):
+    """Oyente del ClientStore: descarta la fila cacheada del cliente modificado."""
+    _FILAS.pop(nombre, None)
+
+def _render_listado(pagina: int, filtro: str) -> tuple[str, InlineKeyboardMarkup]:
+    """Texto y teclado de una página del listado (consulta por índice, orden por vencimiento)."""
+    if filtro not in FILTROS_LISTADO:
+        filtro = 't'
+    etiqueta, plan, activa = FILTROS_LISTADO[filtro]
+    store = get_client_store()
+    pagina = max(0, pagina)
+    filas, total = store.pagina(pagina * LISTADO_POR_PAGINA, LISTADO_POR_PAGINA, plan=plan, activa=activa)
+    paginas = max(1, -(-total // LISTADO_POR_PAGINA))
+    if not filas and pagina >= paginas and total:
+        # la página ya no existe (bajas desde que se mostró): ir a la última
+        pagina = paginas - 1
+        filas, total = store.pagina(pagina * LISTADO_POR_PAGINA, LISTADO_POR_PAGINA, plan=plan, activa=activa)
+
+    if total:
+        lines = [f"📁 *Configuraciones registradas:* {escapar_md(etiqueta)} — {total} (página {pagina + 1}/{paginas})"]
+        lines += [_fila_listado(rec) for rec in filas]
+    else:
+        lines = [f"ℹ️ No hay configuraciones ({escapar_md(etiqueta)})."]
+
+    kb = InlineKeyboardMarkup()
+    nav = []
+    if pagina > 0:
+        nav.append(InlineKeyboardButton("⬅️", callback_data=f"vt:{pagina - 1}:{filtro}"))
+    nav.append(InlineKeyboardButton(f"{pagina + 1}/{paginas}", callback_data=f"vt:{pagina}:{filtro}"))
+    if pagina + 1 < paginas:
+        nav.append(InlineKeyboardButton("➡️", callback_data=f"vt:{pagina + 1}:{filtro}"))
+    kb.row(*nav)
+    botones = [
+        InlineKeyboardButton(f"· {et} ·" if clave == filtro else et, callback_data=f"vt:0:{clave}")
+        for clave, (et, _, _) in FILTROS_LISTADO.items()
+    ]
+    for i in range(0, len(botones), 3):
+        kb.row(*botones[i:i + 3])
+    return "\n".join(lines), kb
+
+def _editar(bot: TeleBot, call, texto: str, kb, parse_mode: str | None = None) -> None:
+    """Edita el mensaje del callback; ignora el error de 'sin cambios' (misma página)."""
+    try:
+        bot.edit_message_text(texto, call.message.chat.id, call.message.message_id,
+                              parse_mode=parse_mode, reply_markup=kb)
+    except ApiTelegramException as e:
+        if 'not modified' not in str(e):
+            raise
+
+# ====== SELECTOR DE CLIENTES ======
+# Acción del selector: clave (viaja en callback_data) -> (título, texto si no hay clientes)
+ACCIONES_SELECTOR = {
+    'r': ("♻️ Selecciona un cliente a renovar:", "ℹ️ No hay configuraciones para renovar."),
+    'e': ("❌ Selecciona un cliente a eliminar:", "ℹ️ No hay configuraciones para eliminar."),
+    'q': ("📁 Selecciona un cliente para ver su QR:", "ℹ️ No hay configuraciones."),
+    'c': ("📄 Selecciona un cliente para descargar su .conf:", "ℹ️ No hay configuraciones."),
+}
+
+# Búsqueda en curso por chat: {chat_id: {'accion': clave de ACCIONES_SELECTOR, 'q': texto, 'hasta': ts}}
+# Se cierra al elegir, al pasar a cualquier otra ruta o al caducar (BUSQUEDA_TTL).
+BUSQUEDAS = {}
+
+def _busqueda(chat_id: int) -> dict | None:
+    """Búsqueda en curso de *chat_id* (None si no hay o ya caducó)."""
+    busqueda = BUSQUEDAS.get(chat_id)
+    if busqueda and busqueda['hasta'] < time.time():
+        BUSQUEDAS.pop(chat_id, None)
+        return None
+    return busqueda
+
+def _render_selector(accion: str, texto: str, pagina: int) -> tuple[str, InlineKeyboardMarkup]:
+    """Página de coincidencias del índice; cada botón lleva el rowid del cliente."""
+    indice = get_client_index()
+    pagina = max(0, pagina)
+    nombres, total = indice.buscar(texto, pagina * BUSQUEDA_POR_PAGINA, BUSQUEDA_POR_PAGINA)
+    paginas = max(1, -(-total // BUSQUEDA_POR_PAGINA))
+    if not nombres and pagina >= paginas and total:
+        pagina = paginas - 1
+        nombres, total = indice.buscar(texto, pagina * BUSQUEDA_POR_PAGINA, BUSQUEDA_POR_PAGINA)
+    ids = get_client_store().rowids(nombres)
+
+    titulo = ACCIONES_SELECTOR[accion][0]
+    if texto:
+        cabecera = f"{titulo}\n🔎 «{texto}»: {total} coincidencia(s). Escribe otro texto para cambiar la búsqueda."
+    else:
+        cabecera = f"{titulo}\n🔎 Escribe parte del nombre para filtrar ({total} clientes)."
+
+    kb = InlineKeyboardMarkup()
+    for cli in nombres:
+        if cli in ids:
+            kb.row(InlineKeyboardButton(cli, callback_data=f"cp:{accion}:{ids[cli]}"))
+    nav = []
+    if pagina > 0:
+        nav.append(InlineKeyboardButton("⬅️", callback_data=f"cl:{pagina - 1}"))
+    nav.append(InlineKeyboardButton(f"{pagina + 1}/{paginas}", callback_data=f"cl:{pagina}"))
+    if pagina + 1 < paginas:
+        nav.append(InlineKeyboardButton("➡️", callback_data=f"cl:{pagina + 1}"))
+    kb.row(*nav)
+    kb.row(InlineKeyboardButton("❌ Cancelar", callback_data="cl:x"))
+    return cabecera, kb
+
+def _kb_ficha(rowid: int) -> InlineKeyboardMarkup:
+    """Acciones sobre un cliente (resultado de la búsqueda inline)."""
+    kb = InlineKeyboardMarkup()
+    kb.row(
+        InlineKeyboardButton("♻️ Renovar", callback_data=f"cp:r:{rowid}"),
+        InlineKeyboardButton("❌ Eliminar", callback_data=f"cp:e:{rowid}")
+    )
+    kb.row(
+        InlineKeyboardButton("📁 Ver QR", callback_data=f"cp:q:{rowid}"),
+        InlineKeyboardButton("📄 Descargar .conf", callback_data=f"cp:c:{rowid}")
+    )
+    return kb
+
+# ====== ESTADÍSTICAS ======
+def _formatear_planes(por_plan: dict) -> str:
+    """Desglose por plan: activas / total (planes de PLANS primero, en su orden)."""
+    otros = sorted((p for p in por_plan if p not in PLANS), key=str)
+    lines = ["🗂 *Por plan:*"]
+    for plan in [p for p in PLANS if p in por_plan] + otros:
+        activos, total = por_plan[plan]
+        lines.append(f"• {escapar_md(str(plan or '—'))}: {activos} activas / {total}")
+    return "\n".join(lines) if len(lines) > 1 else "🗂 *Por plan:* —"
+
+def _formatear_ventas(ventas: list) -> str:
+    """Ventas aprobadas por día; importes solo si algún plan tiene 'precio'."""
+    con_precio = any('precio' in p for p in PLANS.values())
+    if not ventas:
+        return "💰 *Ventas (7 días):* ninguna"
+    total = sum(v for _, v, _ in ventas)
+    importe = sum(i for _, _, i in ventas)
+    lines = [f"💰 *Ventas (7 días):* {total}" + (f" — {importe:.0f} CUP" if con_precio else "")]
+    for dia, v, i in ventas:
+        lines.append(f"• {dia}: {v}" + (f" — {i:.0f} CUP" if con_precio else ""))
+    return "\n".join(lines)
+
+# ====== CONEXIONES ======
+def _formatear_conexiones(top: int = 10, max_online: int = 30) -> str:
+    """En línea ahora, tráfico de hoy y los que más consumen (telemetría de `wg show dump`)."""
+    telemetria = get_peer_telemetry()
+    ultima = telemetria.ultima_muestra()
+    if ultima is None:
+        return "ℹ️ Aún no hay muestras de telemetría de los peers."
+    nombres = nombres_por_clave()
+    ahora = time.time()
+    online = telemetria.online(ahora)
+    hoy = telemetria.bytes_hoy()
+    rx = sum(r for r, _ in hoy.values())
+    tx = sum(t for _, t in hoy.values())
+    lines = [
+        f"📶 *Conexiones* (muestra de hace {formatear_hace(ahora - ultima)})\n",
+        f"🟢 En línea ahora: {len(online)} de {len(telemetria)} peers",
+        f"📥 Hoy: ⬆️ {formatear_bytes(rx)} subida — ⬇️ {formatear_bytes(tx)} bajada",
+    ]
+    mayores = telemetria.top(top)
+    if mayores:
+        lines.append("\n🏆 *Mayor consumo hoy:*")
+        for i, (key, r, t) in enumerate(mayores, 1):
+            nombre = escapar_md(nombres.get(key, key[:8] + '…'))
+            lines.append(f"{i}. {nombre} — {formatear_bytes(r + t)} (⬆️ {formatear_bytes(r)} ⬇️ {formatear_bytes(t)})")
+    if hay_cuotas():
+        suspendidos = get_quota_engine().suspendidos()
+        lines.append(f"\n🚫 Suspendidos por cuota: {len(suspendidos)}"
+                     + (f" — {escapar_md(', '.join(suspendidos[:max_online]))}" if suspendidos else ""))
+    if online:
+        lines.append("\n🟢 *En línea:*")
+        for key, handshake in online[:max_online]:
+            lines.append(f"• {escapar_md(nombres.get(key, key[:8] + '…'))} — handshake hace {formatear_hace(ahora - handshake)}")
+        if len(online) > max_online:
+            lines.append(f"… y {len(online) - max_online} más")
+    return "\n".join(lines)
+
 TEMP = {}
 
 def register_admin_handlers(bot: TeleBot):
+    router = get_router(bot)
+    get_client_store().add_listener(_olvidar_fila)
+
+    @router.antes
+    def cerrar_busqueda(message, ruta):
+        # Cualquier botón o comando cierra la búsqueda: el texto siguiente ya no es un filtro
+        if ruta != 'buscar_cliente':
+            BUSQUEDAS.pop(message.chat.id, None)
 
-    @bot.message_handler(commands=['start'])
+    @router.comando('start')
     def handle_start(message):
         if message.from_user.id != ADMIN_ID:
-            return bot.send_message(message.chat.id, "⛔️ Acceso restringido.")
+            return mostrar_menu_cliente(bot, message)
         text = (
             "👋 *Panel de Administración Francho Wire Bot*\n\n"
             "Gestiona tus clientes WireGuard de forma rápida:\n"
             "• ➕ Crear configuración\n"
             "• 🛠 Gestionar configuraciones\n"
             "• 📊 Estadísticas\n"
-            "• 🔙 Volver\n\n"
+            "• 📶 Conexiones (en línea, tráfico de hoy)\n"
+            "• 🔙 Volver\n"
+            "• /lote — alta masiva (lista o CSV)\n\n"
             "Selecciona una opción."
         )
         bot.send_message(message.chat.id, text, parse_mode="Markdown", reply_markup=admin_menu())
 
-    @bot.message_handler(func=lambda m: m.text == '🔙 Volver')
+    @router.texto('🔙 Volver')
     def back_to_main(message):
         bot.send_message(message.chat.id, "↩️ Menú principal.", reply_markup=admin_menu())
 
-    @bot.message_handler(func=lambda m: m.text == '🛠 Gestionar configuraciones')
+    @router.texto('🛠 Gestionar configuraciones')
     def handle_gestionar(message):
         bot.send_message(
             message.chat.id,
@@ -93,20 +306,38 @@ def register_admin_handlers(bot: TeleBot):
             reply_markup=gestion_menu()
         )
 
-    @bot.message_handler(func=lambda m: m.text == '📊 Estadísticas')
+    @router.texto('📊 Estadísticas')
     def handle_stats(message):
-        activos, expirados = get_stats()
-        total = activos + expirados
+        resumen = get_client_stats().resumen()
+        qr = get_qr_cache().stats()
         msg = (
             f"📊 *Estadísticas del sistema:*\n\n"
-            f"✅ Activas: {activos}\n"
-            f"⛔️ Expiradas: {expirados}\n"
-            f"📦 Total: {total}"
+            f"✅ Activas: {resumen['activos']}\n"
+            f"⛔️ Expiradas: {resumen['expirados']}\n"
+            f"📦 Total: {resumen['total']}\n\n"
+            f"{_formatear_planes(resumen['por_plan'])}\n\n"
+            f"{_formatear_ventas(get_payment_store().ventas_por_dia(7))}\n\n"
+            f"{formatear_stats(get_provisioning_queue().stats())}\n\n"
+            f"🖼 *Caché de QR:* {qr['hits_memoria']} en memoria + {qr['hits_disco']} en disco / "
+            f"{qr['misses']} generados ({qr['ratio']:.0%} aciertos)"
         )
+        envios = get_outbound().stats() if get_outbound() else None
+        if envios:
+            msg += (
+                f"\n📤 *Envíos:* {envios['enviados']} — 429: {envios['limitados']} — "
+                f"reintentos: {envios['reintentados']} — avisos agrupados: {envios['alertas_agrupadas']}"
+            )
+        msg += f"\n\n{formatear_rutas(router.stats())}"
         bot.send_message(message.chat.id, msg, parse_mode="Markdown")
 
+    @router.texto('📶 Conexiones')
+    def handle_conexiones(message):
+        if message.from_user.id != ADMIN_ID:
+            return bot.send_message(message.chat.id, "⛔️ Acceso restringido.")
+        bot.send_message(message.chat.id, _formatear_conexiones(), parse_mode="Markdown")
+
     # ===== CREAR =====
-    @bot.message_handler(func=lambda m: m.text == '➕ Crear configuración')
+    @router.texto('➕ Crear configuración')
     def iniciar_creacion(message):
         bot.send_message(
             message.chat.id,
@@ -139,112 +370,289 @@ def register_admin_handlers(bot: TeleBot):
         cliente = data.get('cliente')
         plan = message.text
 
-        if not cliente:
-            return bot.send_message(message.chat.id, "❌ Nombre inválido.", reply_markup=admin_menu())
+        if not cliente or not NOMBRE_VALIDO.fullmatch(cliente):
+            TEMP.pop(message.chat.id, None)
+            return bot.send_message(message.chat.id, "❌ Nombre inválido (solo letras, números, '.', '-' y '_').",
+                                    reply_markup=admin_menu())
         if plan not in PLANS:
             return bot.send_message(message.chat.id, "❌ Plan inválido, intenta de nuevo.", reply_markup=admin_menu())
 
         venc = calcular_nuevo_vencimiento(plan)
-        success, conf_path, qr_path = create_config(cliente, plan, venc)
-        if not success:
-            return bot.send_message(message.chat.id, f"❌ Error: {conf_path}", reply_markup=admin_menu())
-
-        # Guardar/actualizar en JSON con plan
-        datos = load_json(CONFIGS_FILE)
-        datos[cliente] = {
-            "plan": plan,
-            "vencimiento": venc.strftime("%Y-%m-%d %H:%M"),  # UTC en JSON
-            "activa": True
-        }
-        save_json(CONFIGS_FILE, datos)
-
-        caption = (
-            f"✅ *{cliente}* creado.\n"
-            f"📅 Vence el: *{_fmt_cuba_from_dt(venc)}* (hora Cuba)"
-        )
-        if os.path.exists(conf_path):
-            with open(conf_path, 'rb') as f:
-                bot.send_document(message.chat.id, f, caption=caption, parse_mode="Markdown")
-        if os.path.exists(qr_path):
-            with open(qr_path, 'rb') as qr:
-                bot.send_photo(message.chat.id, qr)
+        chat_id = message.chat.id
+
+        def entregar(ok, resultado):
+            if not ok:
+                return bot.send_message(chat_id, f"❌ Error: {resultado}", reply_markup=admin_menu())
+            conf_path, qr_path = resultado
+            caption = (
+                f"✅ *{cliente}* creado.\n"
+                f"📅 Vence el: *{_fmt_cuba_from_dt(venc)}* (hora Cuba)"
+            )
+            if os.path.exists(conf_path):
+                enviar_documento(bot, chat_id, conf_path, caption=caption, parse_mode="Markdown")
+            if os.path.exists(qr_path):
+                enviar_foto(bot, chat_id, qr_path)
 
         TEMP.pop(message.chat.id, None)
-        bot.send_message(message.chat.id, "↩️ Menú principal.", reply_markup=admin_menu())
+        ok, posicion = get_provisioning_queue().submit_create(cliente, plan, venc, on_done=entregar)
+        if not ok:
+            return bot.send_message(message.chat.id, f"❌ {posicion}", reply_markup=admin_menu())
+        bot.send_message(
+            message.chat.id,
+            f"⏳ Creando *{cliente}* (posición {posicion} en la cola). Te envío el .conf y el QR al terminar.",
+            parse_mode="Markdown",
+            reply_markup=admin_menu()
+        )
+
+    # ===== ALTA MASIVA =====
+    @router.comando('lote')
+    def iniciar_lote(message):
+        if message.from_user.id != ADMIN_ID:
+            return bot.send_message(message.chat.id, "⛔️ Acceso restringido.")
+        kb = ReplyKeyboardMarkup(resize_keyboard=True, row_width=2)
+        for plan in PLANS:
+            kb.add(KeyboardButton(plan))
+        kb.add(KeyboardButton('🔙 Menú admin'))
+        bot.send_message(
+            message.chat.id,
+            "📦 *Alta masiva*\nSelecciona el plan por defecto del lote:",
+            parse_mode="Markdown",
+            reply_markup=kb
+        )
+        bot.register_next_step_handler(message, _lote_pedir_lista)
+
+    def _lote_pedir_lista(message):
+        if message.text == '🔙 Menú admin' or message.text not in PLANS:
+            TEMP.pop(message.chat.id, None)
+            return bot.send_message(message.chat.id, "↩️ Menú principal.", reply_markup=admin_menu())
+        TEMP[message.chat.id] = {'accion': 'lote', 'plan': message.text}
+        bot.send_message(
+            message.chat.id,
+            "📝 Envía la lista de clientes: un nombre por línea, o un documento CSV "
+            "con columnas `nombre[,plan]` (la cabecera es opcional).",
+            parse_mode="Markdown",
+            reply_markup=ReplyKeyboardRemove()
+        )
+        bot.register_next_step_handler(message, _lote_crear)
+
+    def _lote_filas(texto: str, plan_defecto: str) -> list[tuple[str, str]]:
+        """[(nombre, plan)] a partir de texto plano o CSV."""
+        filas = []
+        for row in csv.reader(io.StringIO(texto)):
+            row = [c.strip() for c in row]
+            if not row or not row[0] or row[0].startswith('#'):
+                continue
+            if not filas and row[0].lower() == 'nombre':
+                continue  # cabecera
+            plan = row[1] if len(row) > 1 and row[1] else plan_defecto
+            filas.append((row[0], plan))
+        return filas
+
+    def _lote_crear(message):
+        data = TEMP.pop(message.chat.id, {})
+        plan = data.get('plan')
+        if not plan:
+            return bot.send_message(message.chat.id, "❌ Datos inválidos.", reply_markup=admin_menu())
+
+        if message.content_type == 'document':
+            try:
+                info = bot.get_file(message.document.file_id)
+                texto = bot.download_file(info.file_path).decode('utf-8-sig')
+            except Exception as e:
+                return bot.send_message(message.chat.id, f"❌ No se pudo leer el documento: {e}", reply_markup=admin_menu())
+        else:
+            texto = message.text or ''
+
+        filas = _lote_filas(texto, plan)
+        if not filas:
+            return bot.send_message(message.chat.id, "❌ La lista está vacía.", reply_markup=admin_menu())
+
+        chat_id = message.chat.id
+
+        def entregar(ok, res):
+            if isinstance(res, str):
+                return bot.send_message(chat_id, f"❌ Error en el alta masiva: {res}", reply_markup=admin_menu())
+            _entregar_lote(chat_id, res)
+
+        ok, posicion = get_provisioning_queue().submit_bulk(filas, on_done=entregar)
+        if not ok:
+            return bot.send_message(chat_id, f"❌ {posicion}", reply_markup=admin_menu())
+        bot.send_message(
+            chat_id,
+            f"⏳ Creando {len(filas)} configuraciones (posición {posicion} en la cola). "
+            "Te envío el ZIP al terminar.",
+            reply_markup=admin_menu()
+        )
+
+    def _entregar_lote(chat_id, res):
+        """Resumen del alta masiva y ZIP con los .conf y QR (en el hilo de la cola)."""
+        tiempos = ", ".join(f"{fase} {seg:.2f}s" for fase, seg in res['tiempos'].items())
+        lines = [
+            "📦 *Alta masiva terminada*",
+            f"✅ Creados: {len(res['creados'])}",
+            f"❌ Errores: {len(res['errores'])}",
+        ]
+        for nombre, error in res['errores'][:20]:
+            lines.append(f"• {nombre or '—'}: {error}")
+        if len(res['errores']) > 20:
+            lines.append(f"• … y {len(res['errores']) - 20} más")
+        if tiempos:
+            lines.append(f"⏱ {tiempos}")
+            lines.append(f"🚀 {res['por_segundo']:.1f} clientes/s")
+        if res['zip'] and os.path.exists(res['zip']):
+            with open(res['zip'], 'rb') as f:
+                bot.send_document(chat_id, f)
+        bot.send_message(chat_id, "\n".join(lines), reply_markup=admin_menu())
 
     # ===== VER TODAS =====
-    @bot.message_handler(func=lambda m: m.text == '🗂 Ver todas')
+    @router.texto('🗂 Ver todas')
     def ver_todas(message):
-        datos = load_json(CONFIGS_FILE)
-        if not datos:
-            return bot.send_message(message.chat.id, "ℹ️ No hay configuraciones.")
-        lines = ["📁 *Configuraciones registradas:*"]
-        for cli, info in datos.items():
-            estado = "✅ Activa" if info.get('activa') else "⛔️ Expirada"
-            venc_s = info.get('vencimiento', '—')
-            plan_s = info.get('plan', '—')
-            try:
-                venc_local = _fmt_cuba_from_str(venc_s)
-            except Exception:
-                venc_local = venc_s
-            lines.append(f"• {cli}: {estado} — vence {venc_local} — plan {plan_s}")
-        bot.send_message(message.chat.id, "\n".join(lines), parse_mode="Markdown")
+        texto, kb = _render_listado(0, 't')
+        bot.send_message(message.chat.id, texto, parse_mode="Markdown", reply_markup=kb)
+
+    @router.callback('vt')
+    def ver_todas_pagina(call):
+        if call.from_user.id != ADMIN_ID:
+            return bot.answer_callback_query(call.id, "Sin permisos.")
+        try:
+            _, pagina, filtro = call.data.split(':')
+            pagina = int(pagina)
+        except ValueError:
+            return bot.answer_callback_query(call.id, "Datos inválidos.")
+        texto, kb = _render_listado(pagina, filtro)
+        _editar(bot, call, texto, kb, parse_mode="Markdown")
+        bot.answer_callback_query(call.id)
 
     # ===== POR EXPIRAR =====
-    @bot.message_handler(func=lambda m: m.text == '📆 Por expirar')
+    @router.texto('📆 Por expirar')
     def por_expirar(message):
-        datos = load_json(CONFIGS_FILE)
-        proximas = []
-        ahora_utc = datetime.now(TZ_UTC)
-        for cli, info in datos.items():
-            venc_s = info.get('vencimiento')
-            if not venc_s:
-                continue
-            try:
-                vendt_utc = _parse_dt_any_utc(venc_s)
-            except Exception:
-                continue
-            dias = (vendt_utc - ahora_utc).days
-            if 0 <= dias <= 3:
-                proximas.append((cli, dias, vendt_utc))
+        ahora = time.time()
+        # Corte del índice de vencimientos: solo los que vencen en los próximos 3 días
+        proximas = [
+            (cli, int((ts - ahora) // 86400), ts)
+            for cli, ts in get_client_stats().expirando(ahora, ahora + 4 * 86400 - 1)
+        ]
         if not proximas:
             return bot.send_message(message.chat.id, "✅ No hay configuraciones próximas a expirar.")
         lines = ["📆 *Por expirar en próximos 3 días:*"]
-        for cli, dias, vendt_utc in proximas:
-            lines.append(f"• {cli}: vence en {dias} día(s) — {_fmt_cuba_from_str(vendt_utc.strftime('%Y-%m-%d %H:%M'))}")
+        for cli, dias, ts in proximas:
+            lines.append(f"• {escapar_md(cli)}: vence en {dias} día(s) — {_fmt_cuba_from_dt(datetime.fromtimestamp(ts))}")
         bot.send_message(message.chat.id, "\n".join(lines), parse_mode="Markdown")
 
-    # ===== RENOVAR =====
-    @bot.message_handler(func=lambda m: m.text == '♻️ Renovar')
+    # ===== SELECTOR DE CLIENTES (Renovar, Eliminar, Ver QR, Descargar .conf) =====
+    def _abrir_selector(message, accion):
+        if not len(get_client_index()):
+            return bot.send_message(message.chat.id, ACCIONES_SELECTOR[accion][1], reply_markup=admin_menu())
+        BUSQUEDAS[message.chat.id] = {'accion': accion, 'q': '', 'hasta': time.time() + BUSQUEDA_TTL}
+        texto, kb = _render_selector(accion, '', 0)
+        bot.send_message(message.chat.id, texto, reply_markup=kb)
+
+    @router.texto('♻️ Renovar')
     def renew_menu(message):
-        datos = load_json(CONFIGS_FILE)
-        if not datos:
-            return bot.send_message(message.chat.id, "ℹ️ No hay configuraciones para renovar.", reply_markup=admin_menu())
-        kb = ReplyKeyboardMarkup(resize_keyboard=True, row_width=2)
-        for cli in sorted(datos.keys()):
-            kb.add(KeyboardButton(cli))
-        kb.add(KeyboardButton('🔙 Menú admin'))
-        TEMP[message.chat.id] = {'accion': 'renovar'}
-        bot.send_message(message.chat.id, "♻️ Selecciona un cliente a renovar:", reply_markup=kb)
-        bot.register_next_step_handler(message, _renovar_elegir_plan)
+        _abrir_selector(message, 'r')
 
-    def _renovar_elegir_plan(message):
-        if message.text == '🔙 Menú admin':
-            TEMP.pop(message.chat.id, None)
-            return bot.send_message(message.chat.id, "↩️ Menú principal.", reply_markup=admin_menu())
+    @router.texto('❌ Eliminar')
+    def delete_menu(message):
+        _abrir_selector(message, 'e')
+
+    @router.texto('📁 Ver QR')
+    def qr_menu(message):
+        _abrir_selector(message, 'q')
+
+    @router.texto('📄 Descargar .conf')
+    def conf_menu(message):
+        _abrir_selector(message, 'c')
+
+    @router.predicado(lambda m: m.from_user.id == ADMIN_ID and _busqueda(m.chat.id) is not None)
+    def buscar_cliente(message):
+        busqueda = BUSQUEDAS[message.chat.id]
+        busqueda['q'] = message.text.strip()
+        busqueda['hasta'] = time.time() + BUSQUEDA_TTL
+        texto, kb = _render_selector(busqueda['accion'], busqueda['q'], 0)
+        bot.send_message(message.chat.id, texto, reply_markup=kb)
+
+    @router.callback('cl')
+    def selector_pagina(call):
+        if call.from_user.id != ADMIN_ID:
+            return bot.answer_callback_query(call.id, "Sin permisos.")
+        chat_id = call.message.chat.id
+        valor = call.data.split(':', 1)[1]
+        busqueda = _busqueda(chat_id)
+        if valor == 'x' or busqueda is None:
+            BUSQUEDAS.pop(chat_id, None)
+            _editar(bot, call, "↩️ Búsqueda cerrada.", None)
+            return bot.answer_callback_query(call.id)
+        try:
+            pagina = int(valor)
+        except ValueError:
+            return bot.answer_callback_query(call.id, "Datos inválidos.")
+        busqueda['hasta'] = time.time() + BUSQUEDA_TTL
+        texto, kb = _render_selector(busqueda['accion'], busqueda['q'], pagina)
+        _editar(bot, call, texto, kb)
+        bot.answer_callback_query(call.id)
+
+    @router.callback('cp')
+    def selector_elegir(call):
+        if call.from_user.id != ADMIN_ID:
+            return bot.answer_callback_query(call.id, "Sin permisos.")
+        try:
+            _, accion, rowid = call.data.split(':')
+            cliente = get_client_store().nombre_de_rowid(int(rowid))
+        except ValueError:
+            return bot.answer_callback_query(call.id, "Datos inválidos.")
+        if not cliente or accion not in ACCIONES_SELECTOR:
+            return bot.answer_callback_query(call.id, "❌ Cliente no encontrado.")
+        # Los mensajes enviados por la búsqueda inline no traen chat: se responde en privado
+        chat_id = call.message.chat.id if call.message else call.from_user.id
+        BUSQUEDAS.pop(chat_id, None)
+        bot.answer_callback_query(call.id)
+        if accion == 'r':
+            _renovar_elegir_plan(chat_id, cliente)
+        elif accion == 'e':
+            ejecutar_eliminacion(chat_id, cliente)
+        elif accion == 'q':
+            enviar_qr_selection(chat_id, cliente)
+        else:
+            enviar_conf_selection(chat_id, cliente)
 
-        cliente = message.text.strip()
-        datos = load_json(CONFIGS_FILE)
-        if cliente not in datos:
-            return bot.send_message(message.chat.id, "❌ Cliente no encontrado.", reply_markup=admin_menu())
+    @router.inline
+    def buscar_inline(query):
+        if query.from_user.id != ADMIN_ID:
+            return bot.answer_inline_query(query.id, [], cache_time=300, is_personal=True)
+        try:
+            desde = int(query.offset or 0)
+        except ValueError:
+            desde = 0
+        store = get_client_store()
+        nombres, total = get_client_index().buscar(query.query, desde, 20)
+        ids = store.rowids(nombres)
+        resultados = []
+        for cli in nombres:
+            rec = store.record(cli)
+            if cli not in ids or rec is None:
+                continue
+            resultados.append(InlineQueryResultArticle(
+                id=str(ids[cli]),
+                title=cli,
+                description=_resumen_cliente(rec),
+                input_message_content=InputTextMessageContent(f"👤 {cli}"),
+                reply_markup=_kb_ficha(ids[cli])
+            ))
+        siguiente = str(desde + len(nombres)) if desde + len(nombres) < total else ''
+        bot.answer_inline_query(query.id, resultados, cache_time=0, is_personal=True, next_offset=siguiente)
 
-        TEMP[message.chat.id] = {'accion': 'renovar', 'cliente': cliente}
+    # ===== RENOVAR =====
+    def _renovar_elegir_plan(chat_id, cliente):
+        if not get_client_store().exists(cliente):
+            return bot.send_message(chat_id, "❌ Cliente no encontrado.", reply_markup=admin_menu())
+
+        TEMP[chat_id] = {'accion': 'renovar', 'cliente': cliente}
         kb = ReplyKeyboardMarkup(resize_keyboard=True, row_width=2)
         for plan in PLANS:
             kb.add(KeyboardButton(plan))
         kb.add(KeyboardButton('🔙 Menú admin'))
-        bot.send_message(message.chat.id, f"🗓 *Plan para renovar {cliente}:*", parse_mode="Markdown", reply_markup=kb)
-        bot.register_next_step_handler(message, _renovar_aplicar)
+        bot.send_message(chat_id, f"🗓 *Plan para renovar {escapar_md(cliente)}:*", parse_mode="Markdown", reply_markup=kb)
+        bot.register_next_step_handler_by_chat_id(chat_id, _renovar_aplicar)
 
     def _renovar_aplicar(message):
         if message.text == '🔙 Menú admin':
@@ -259,95 +667,45 @@ def register_admin_handlers(bot: TeleBot):
             TEMP.pop(message.chat.id, None)
             return bot.send_message(message.chat.id, "❌ Datos inválidos.", reply_markup=admin_menu())
 
-        datos = load_json(CONFIGS_FILE)
-        if cliente not in datos:
-            TEMP.pop(message.chat.id, None)
-            return bot.send_message(message.chat.id, "❌ Cliente no encontrado.", reply_markup=admin_menu())
+        chat_id = message.chat.id
 
-        nuevo_venc = calcular_nuevo_vencimiento(plan)
-        datos[cliente]['vencimiento'] = nuevo_venc.strftime("%Y-%m-%d %H:%M")  # UTC en JSON
-        datos[cliente]['plan'] = plan
-        datos[cliente]['activa'] = True
-        save_json(CONFIGS_FILE, datos)
+        def entregar(ok, nuevo_venc):
+            if not ok:
+                return bot.send_message(chat_id, "❌ Cliente no encontrado.", reply_markup=admin_menu())
+            bot.send_message(
+                chat_id,
+                f"♻️ *{escapar_md(cliente)}* renovado hasta {_fmt_cuba_from_dt(nuevo_venc)} (plan: {plan})",
+                parse_mode="Markdown",
+                reply_markup=admin_menu()
+            )
 
         TEMP.pop(message.chat.id, None)
-        bot.send_message(
-            message.chat.id,
-            f"♻️ *{cliente}* renovado hasta {_fmt_cuba_from_dt(nuevo_venc)} (plan: {plan})",
-            parse_mode="Markdown",
-            reply_markup=admin_menu()
-        )
+        ok, posicion = get_provisioning_queue().submit_renew(cliente, plan, on_done=entregar)  # UTC en el registro
+        if not ok:
+            bot.send_message(message.chat.id, f"❌ {posicion}", reply_markup=admin_menu())
 
     # ===== ELIMINAR =====
-    @bot.message_handler(func=lambda m: m.text == '❌ Eliminar')
-    def delete_menu(message):
-        datos = load_json(CONFIGS_FILE)
-        if not datos:
-            return bot.send_message(message.chat.id, "ℹ️ No hay configuraciones para eliminar.", reply_markup=admin_menu())
-        kb = ReplyKeyboardMarkup(resize_keyboard=True, row_width=2)
-        for cli in sorted(datos.keys()):
-            kb.add(KeyboardButton(cli))
-        kb.add(KeyboardButton('🔙 Menú admin'))
-        bot.send_message(message.chat.id, "❌ Selecciona un cliente a eliminar:", reply_markup=kb)
-        bot.register_next_step_handler(message, ejecutar_eliminacion)
-
-    def ejecutar_eliminacion(message):
-        if message.text == '🔙 Menú admin':
-            return bot.send_message(message.chat.id, "↩️ Menú principal.", reply_markup=admin_menu())
-        cliente = message.text.strip()
+    def ejecutar_eliminacion(chat_id, cliente):
         if delete_config(cliente):
-            datos = load_json(CONFIGS_FILE)
-            if cliente in datos:
-                datos.pop(cliente)
-                save_json(CONFIGS_FILE, datos)
-            bot.send_message(message.chat.id, f"🗑️ *{cliente}* eliminado.", parse_mode="Markdown", reply_markup=admin_menu())
+            bot.send_message(chat_id, f"🗑️ *{escapar_md(cliente)}* eliminado.", parse_mode="Markdown", reply_markup=admin_menu())
         else:
-            bot.send_message(message.chat.id, "❌ No se encontró el cliente.", reply_markup=admin_menu())
+            bot.send_message(chat_id, "❌ No se encontró el cliente.", reply_markup=admin_menu())
 
     # ===== VER QR =====
-    @bot.message_handler(func=lambda m: m.text == '📁 Ver QR')
-    def qr_menu(message):
-        datos = load_json(CONFIGS_FILE)
-        if not datos:
-            return bot.send_message(message.chat.id, "ℹ️ No hay configuraciones.", reply_markup=admin_menu())
-        kb = ReplyKeyboardMarkup(resize_keyboard=True, row_width=2)
-        for cli in sorted(datos.keys()):
-            kb.add(KeyboardButton(cli))
-        kb.add(KeyboardButton('🔙 Menú admin'))
-        bot.send_message(message.chat.id, "📁 Selecciona un cliente para ver su QR:", reply_markup=kb)
-        bot.register_next_step_handler(message, enviar_qr_selection)
-
-    def enviar_qr_selection(message):
-        if message.text == '🔙 Menú admin':
-            return bot.send_message(message.chat.id, "↩️ Menú principal.", reply_markup=admin_menu())
-        cliente = message.text.strip()
+    def enviar_qr_selection(chat_id, cliente):
+        conf_path = os.path.join(CLIENTS_DIR, f"{cliente}.conf")
         qr_path = os.path.join(CLIENTS_DIR, f"{cliente}.png")
+        if os.path.exists(conf_path):
+            qr_path = generate_qr(conf_path)  # desde la caché; se regenera si el .conf cambió
         if os.path.exists(qr_path):
-            with open(qr_path, 'rb') as qr:
-                bot.send_photo(message.chat.id, qr, caption=f"📸 QR de *{cliente}*", parse_mode="Markdown")
+            enviar_foto(bot, chat_id, qr_path, caption=f"📸 QR de *{escapar_md(cliente)}*", parse_mode="Markdown")
         else:
-            bot.send_message(message.chat.id, "❌ QR no encontrado.", reply_markup=admin_menu())
+            bot.send_message(chat_id, "❌ QR no encontrado.", reply_markup=admin_menu())
 
     # ===== DESCARGAR .CONF =====
-    @bot.message_handler(func=lambda m: m.text == '📄 Descargar .conf')
-    def conf_menu(message):
-        datos = load_json(CONFIGS_FILE)
-        if not datos:
-            return bot.send_message(message.chat.id, "ℹ️ No hay configuraciones.", reply_markup=admin_menu())
-        kb = ReplyKeyboardMarkup(resize_keyboard=True, row_width=2)
-        for cli in sorted(datos.keys()):
-            kb.add(KeyboardButton(cli))
-        kb.add(KeyboardButton('🔙 Menú admin'))
-        bot.send_message(message.chat.id, "📄 Selecciona un cliente para descargar su .conf:", reply_markup=kb)
-        bot.register_next_step_handler(message, enviar_conf_selection)
-
-    def enviar_conf_selection(message):
-        if message.text == '🔙 Menú admin':
-            return bot.send_message(message.chat.id, "↩️ Menú principal.", reply_markup=admin_menu())
-        cliente = message.text.strip()
+    def enviar_conf_selection(chat_id, cliente):
         conf_path = os.path.join(CLIENTS_DIR, f"{cliente}.conf")
         if os.path.exists(conf_path):
-            with open(conf_path, 'rb') as f:
-                bot.send_document(message.chat.id, f, caption=f"📄 *{cliente}*", parse_mode="Markdown")
+            enviar_documento(bot, chat_id, conf_path, caption=f"📄 *{escapar_md(cliente)}*", parse_mode="Markdown")
         else:
-            bot.send_message(message.chat.id, "❌ .conf no encontrado.", reply_markup=admin_menu())
+            bot.send_message(chat_id, "❌ .conf no encontrado.", reply_markup=admin_menu())
@@ -0,0 +1,143 @@
+# async_runtime.py
+#
+# Modo asíncrono del bot (BOT_MODE = 'async').
+# - Un bucle asyncio hace el long polling con AsyncTeleBot.get_updates (aiohttp):
+#   recibir updates nunca espera a que termine un handler.
+# - Cada update se atiende en su propia tarea: los handlers registrados en el
+#   TeleBot síncrono (admin, pagos, clientes) se ejecutan en el executor del
+#   bucle, con hasta ASYNC_MAX_CONCURRENCIA a la vez. Las llamadas bloqueantes
+#   (subprocess, QR, ficheros, peticiones a Telegram) no frenan a los demás usuarios;
+#   create_config sigue yendo a la cola de aprovisionamiento.
+# - Los updates de un mismo chat se procesan en orden (un candado por chat), así
+#   los register_next_step_handler siguen funcionando igual que en polling.
+# - El vigilante de vencimientos corre como tarea (ExpirationScheduler.run_async).
+#
+# Los handlers siguen siendo SÍNCRONOS: AsyncTeleBot solo se usa para
+# get_updates, y cada update se despacha con el TeleBot de siempre
+# (process_new_updates) dentro del executor. No se reescriben como corrutinas
+# porque:
+# - son los mismos en los tres modos (polling, webhook, async) y dependen del
+#   estado del TeleBot síncrono (register_next_step_handler, router);
+# - casi todo lo que hacen es bloqueante (sqlite3, `wg` por subprocess, QR,
+#   ficheros): en el bucle lo frenarían igual y habría que llevarlo a hilos.
+# Por eso el TeleBot debe crearse con threaded=False, para que process_new_updates
+# ejecute los handlers en el hilo del executor que lo llama.
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from telebot import TeleBot
+from telebot.async_telebot import AsyncTeleBot
+
+from config import BOT_TOKEN, ASYNC_MAX_CONCURRENCIA, POLL_TIMEOUT
+from utils import chat_de_update
+
+
+class AsyncDispatcher:
+
+    def __init__(self, bot: TeleBot, token: str = BOT_TOKEN,
+                 max_concurrencia: int = ASYNC_MAX_CONCURRENCIA, poll_timeout: int = POLL_TIMEOUT):
+        self.bot = bot
+        self.token = token
+        self.max_concurrencia = max_concurrencia
+        self.poll_timeout = poll_timeout
+        self._candados = {}        # chat_id -> [asyncio.Lock, tareas que lo usan]
+        self._tareas = set()
+        self._stop = None
+        self.recibidos = 0
+        self.procesados = 0
+        self.errores = 0
+
+    # ========================= DESPACHO =========================
+    def despachar(self, update) -> asyncio.Task:
+        """Crea la tarea que procesa *update* (respetando el orden por chat)."""
+        self.recibidos += 1
+        tarea = asyncio.create_task(self._procesar(update))
+        self._tareas.add(tarea)
+        tarea.add_done_callback(self._tareas.discard)
+        return tarea
+
+    async def _procesar(self, update) -> None:
+        chat_id = chat_de_update(update)
+        entrada = self._candados.get(chat_id)
+        if entrada is None:
+            entrada = self._candados[chat_id] = [asyncio.Lock(), 0]
+        entrada[1] += 1
+        try:
+            async with entrada[0]:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self.bot.process_new_updates, [update])
+            self.procesados += 1
+        except Exception as e:
+            self.errores += 1
+            print(f"[async_runtime] error procesando update {update.update_id}: {e}")
+        finally:
+            entrada[1] -= 1
+            if entrada[1] == 0:
+                del self._candados[chat_id]
+
+    # ========================= BUCLE =========================
+    async def polling(self) -> None:
+        """Long polling hasta stop(); cada lote se reparte en tareas."""
+        abot = AsyncTeleBot(self.token)
+        offset = None
+        espera_error = 1
+        try:
+            while not self._stop.is_set():
+                try:
+                    updates = await abot.get_updates(offset=offset, timeout=self.poll_timeout)
+                    espera_error = 1
+                except Exception as e:
+                    print(f"[async_runtime] getUpdates falló: {e}; reintento en {espera_error}s")
+                    await asyncio.sleep(espera_error)
+                    espera_error = min(espera_error * 2, 60)
+                    continue
+                for update in updates:
+                    offset = update.update_id + 1
+                    self.despachar(update)
+        finally:
+            await abot.close_session()
+
+    async def run(self, tareas_extra=()) -> None:
+        """
+        Arranca el polling y las corrutinas de *tareas_extra* (p. ej. el vigilante
+        de vencimientos) y espera a stop().
+        """
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=self.max_concurrencia,
+                                                     thread_name_prefix='handler'))
+        self._stop = asyncio.Event()
+        extra = [asyncio.create_task(c) for c in tareas_extra]
+        try:
+            await self.polling()
+        finally:
+            for t in extra:
+                t.cancel()
+            if self._tareas:
+                await asyncio.gather(*self._tareas, return_exceptions=True)
+
+    def stop(self) -> None:
+        if self._stop is not None:
+            self._stop.set()
+
+    def stats(self) -> dict:
+        return {
+            'recibidos': self.recibidos,
+            'procesados': self.procesados,
+            'errores': self.errores,
+            'en_curso': len(self._tareas),
+        }
+
+
+def run_async_bot(bot: TeleBot, scheduler=None) -> None:
+    """Punto de entrada del modo async desde main.py (bloquea)."""
+    dispatcher = AsyncDispatcher(bot)
+    extra = [scheduler.run_async()] if scheduler is not None else []
+    print(f"[async_runtime] modo async: hasta {dispatcher.max_concurrencia} handlers a la vez")
+    try:
+        asyncio.run(dispatcher.run(extra))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if scheduler is not None:
+            scheduler.stop()
@@ -0,0 +1,89 @@
+# benchmarks/bench_async.py
+#
+# Prueba de carga: updates/s con usuarios simultáneos contra un servidor falso
+# de la Bot API (benchmarks/fake_bot_api.py), en modo 'polling'
+# (TeleBot.polling, 2 hilos de handlers) y en modo 'async' (async_runtime).
+#
+# Cada usuario simulado envía /planes; el handler real de payments_handlers
+# responde con un sendMessage, que el servidor falso retrasa --latencia ms
+# (el RTT hasta Telegram, que es lo que bloquea un handler síncrono).
+#
+# Uso:
+#   python benchmarks/bench_async.py [--usuarios 50] [--mensajes 10] [--latencia 50] [--modo ambos]
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from telebot import TeleBot  # noqa: E402
+
+from fake_bot_api import FakeBotApi, TOKEN  # noqa: E402
+from payments_handlers import register_payments_handlers  # noqa: E402
+from async_runtime import AsyncDispatcher  # noqa: E402
+
+
+def bench_polling(api: FakeBotApi, total: int) -> float:
+    bot = TeleBot(TOKEN)
+    register_payments_handlers(bot)
+    inicio_envios = api.envios
+    hilo = threading.Thread(target=bot.polling, kwargs={'non_stop': True, 'timeout': 1, 'interval': 0},
+                            daemon=True)
+    t0 = time.perf_counter()
+    hilo.start()
+    ok = api.esperar_envios(inicio_envios + total)
+    dt = time.perf_counter() - t0
+    bot.stop_polling()
+    hilo.join(timeout=5)
+    if not ok:
+        print("polling: no terminó a tiempo")
+    return dt
+
+
+def bench_async(api: FakeBotApi, total: int, concurrencia: int) -> float:
+    bot = TeleBot(TOKEN, threaded=False)
+    register_payments_handlers(bot)
+    dispatcher = AsyncDispatcher(bot, token=TOKEN, max_concurrencia=concurrencia, poll_timeout=1)
+    objetivo = api.envios + total
+    medido = {}
+
+    async def vigilar():
+        await asyncio.get_running_loop().run_in_executor(None, api.esperar_envios, objetivo)
+        medido['fin'] = time.perf_counter()
+        dispatcher.stop()
+
+    t0 = time.perf_counter()
+    asyncio.run(dispatcher.run([vigilar()]))
+    return medido.get('fin', time.perf_counter()) - t0
+
+
+def _resumen(nombre: str, total: int, dt: float) -> None:
+    print(f"{nombre:<10} updates={total:<6} tiempo={dt:7.2f} s  {total / dt:8.1f} updates/s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--usuarios', type=int, default=50)
+    parser.add_argument('--mensajes', type=int, default=10, help='mensajes por usuario')
+    parser.add_argument('--latencia', type=float, default=50, help='ms por llamada saliente')
+    parser.add_argument('--concurrencia', type=int, default=32, help='handlers simultáneos (async)')
+    parser.add_argument('--modo', choices=['polling', 'async', 'ambos'], default='ambos')
+    args = parser.parse_args()
+
+    api = FakeBotApi(latencia=args.latencia / 1000).start()
+    api.apuntar_telebot()
+    print(f"{args.usuarios} usuarios × {args.mensajes} mensajes, {args.latencia:.0f} ms por envío")
+    try:
+        if args.modo in ('polling', 'ambos'):
+            total = api.encolar_mensajes(args.usuarios, args.mensajes, '/planes')
+            _resumen('polling', total, bench_polling(api, total))
+        if args.modo in ('async', 'ambos'):
+            total = api.encolar_mensajes(args.usuarios, args.mensajes, '/planes')
+            _resumen('async', total, bench_async(api, total, args.concurrencia))
+    finally:
+        api.stop()
@@ -0,0 +1,85 @@
+# benchmarks/bench_generator.py
+#
+# Latencia por cliente: motor nativo (claves + .conf en proceso + un `wg syncconf`)
+# frente al camino del script (`sudo bash crear_cliente.sh`, ~8 procesos).
+#
+# Uso:
+#   python benchmarks/bench_generator.py [-n 200] [--script]
+#
+# El camino nativo usa un wg0.conf temporal y un `wg` falso (/bin/true), así que
+# no necesita root. --script ejecuta el script real (requiere sudo, wg y qrencode,
+# y añade peers reales a wg0: úsalo solo en un servidor de pruebas).
+# Sin el paquete cryptography las claves salen de `wg genkey`/`wg pubkey` (WG_BIN).
+# Sin --script se mide además el coste de lanzar 8 procesos triviales, que es la
+# cota inferior del script.
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import SCRIPT_PATH  # noqa: E402
+from generator import render_client_conf  # noqa: E402
+from wireguard import generar_par_claves  # noqa: E402
+from wg_server_config import add_peer  # noqa: E402
+
+
+def _resumen(nombre: str, tiempos: list[float]) -> None:
+    ms = sorted(t * 1000 for t in tiempos)
+    p95 = ms[int(len(ms) * 0.95) - 1] if len(ms) >= 20 else ms[-1]
+    print(f"{nombre:<28} n={len(ms):<5} media={statistics.mean(ms):8.2f} ms  "
+          f"p50={statistics.median(ms):8.2f} ms  p95={p95:8.2f} ms")
+
+
+def bench_nativo(n: int) -> list[float]:
+    tiempos = []
+    with tempfile.TemporaryDirectory() as tmp:
+        wg_conf = os.path.join(tmp, 'wg0.conf')
+        open(wg_conf, 'w').close()
+        for i in range(n):
+            t0 = time.perf_counter()
+            priv, pub = generar_par_claves()
+            direccion = f"10.9.{i // 250}.{i % 250 + 2}/32"
+            with open(os.path.join(tmp, f"c{i}.conf"), 'w') as f:
+                f.write(render_client_conf(priv, direccion))
+            add_peer(f"c{i}", pub, direccion, conf_path=wg_conf, wg_bin='/bin/true', sudo=False)
+            tiempos.append(time.perf_counter() - t0)
+    return tiempos
+
+
+def bench_spawns(n: int, procesos: int = 8) -> list[float]:
+    tiempos = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        for _ in range(procesos):
+            subprocess.run(['/bin/true'])
+        tiempos.append(time.perf_counter() - t0)
+    return tiempos
+
+
+def bench_script(n: int) -> list[float]:
+    tiempos = []
+    for i in range(n):
+        t0 = time.perf_counter()
+        subprocess.run(['sudo', 'bash', SCRIPT_PATH, f"bench_{os.getpid()}_{i}"],
+                       capture_output=True, text=True, check=True)
+        tiempos.append(time.perf_counter() - t0)
+    return tiempos
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=200)
+    parser.add_argument('--script', action='store_true', help='ejecuta también el script real')
+    args = parser.parse_args()
+
+    _resumen('nativo', bench_nativo(args.n))
+    if args.script:
+        _resumen('script (crear_cliente.sh)', bench_script(args.n))
+    else:
+        _resumen('8 procesos (cota script)', bench_spawns(args.n))
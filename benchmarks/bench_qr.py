@@ -0,0 +1,80 @@
+# benchmarks/bench_qr.py
+#
+# ms/QR y bytes/QR: camino anterior (qrcode.make con valores por defecto, PNG a
+# disco y relectura) frente a qr_engine (versión fija, PNG en memoria) y frente
+# a qr_engine.render_many en un pool de procesos.
+#
+# Uso:
+#   python benchmarks/bench_qr.py [-n 200] [--workers 4]
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+
+import qrcode
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generator import render_client_conf  # noqa: E402
+from wireguard import generar_par_claves  # noqa: E402
+from qr_engine import render_png, render_many  # noqa: E402
+
+
+def _resumen(nombre: str, tiempos: list[float], tamanos: list[int]) -> None:
+    ms = sorted(t * 1000 for t in tiempos)
+    p95 = ms[int(len(ms) * 0.95) - 1] if len(ms) >= 20 else ms[-1]
+    print(f"{nombre:<28} n={len(ms):<5} media={statistics.mean(ms):7.2f} ms  "
+          f"p95={p95:7.2f} ms  bytes/QR={statistics.mean(tamanos):7.0f}")
+
+
+def _confs(n: int) -> list[str]:
+    return [render_client_conf(generar_par_claves()[0], f"10.9.{i // 250}.{i % 250 + 2}/32")
+            for i in range(n)]
+
+
+def bench_anterior(confs: list[str]) -> tuple[list[float], list[int]]:
+    """Como el utils.generate_qr original: make() por defecto, a disco, y el handler relee el PNG."""
+    tiempos, tamanos = [], []
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, texto in enumerate(confs):
+            t0 = time.perf_counter()
+            ruta = os.path.join(tmp, f"c{i}.png")
+            qrcode.make(texto).save(ruta)
+            with open(ruta, 'rb') as f:
+                datos = f.read()
+            tiempos.append(time.perf_counter() - t0)
+            tamanos.append(len(datos))
+    return tiempos, tamanos
+
+
+def bench_engine(confs: list[str]) -> tuple[list[float], list[int]]:
+    tiempos, tamanos = [], []
+    for texto in confs:
+        t0 = time.perf_counter()
+        datos = render_png(texto)
+        tiempos.append(time.perf_counter() - t0)
+        tamanos.append(len(datos))
+    return tiempos, tamanos
+
+
+def bench_lote(confs: list[str], workers: int | None) -> tuple[float, list[int]]:
+    t0 = time.perf_counter()
+    pngs = render_many(confs, workers)
+    return time.perf_counter() - t0, [len(p) for p in pngs]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    confs = _confs(args.n)
+    _resumen('qrcode.make + disco', *bench_anterior(confs))
+    _resumen('qr_engine (BytesIO)', *bench_engine(confs))
+    total, tamanos = bench_lote(confs, args.workers)
+    print(f"{'qr_engine.render_many':<28} n={args.n:<5} total={total * 1000:7.1f} ms  "
+          f"por QR={total * 1000 / args.n:7.2f} ms  bytes/QR={statistics.mean(tamanos):7.0f}")
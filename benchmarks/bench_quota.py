@@ -0,0 +1,74 @@
+# benchmarks/bench_quota.py
+#
+# Motor de cuotas (quota_engine.py) con N clientes con tráfico en cada muestra:
+#   muestra     — sumar los deltas, añadir las líneas al log y revisar cuotas
+#   compactar   — instantánea atómica (consumo.json) y log nuevo
+#   carga       — arranque: instantánea + log de su generación
+#
+# Uso:
+#   python benchmarks/bench_quota.py [--clientes 10000] [--muestras 20]
+
+import os
+import sys
+import time
+import base64
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from client_store import ClientStore  # noqa: E402
+from quota_engine import QuotaEngine  # noqa: E402
+
+
+def clave(i: int) -> str:
+    return base64.b64encode(i.to_bytes(32, 'big')).decode()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clientes', type=int, default=10000)
+    parser.add_argument('--muestras', type=int, default=20)
+    args = parser.parse_args()
+
+    carpeta = tempfile.mkdtemp()
+    store = ClientStore(os.path.join(carpeta, 'bench.db'), legacy_jsons=())
+    vence = datetime.now() + timedelta(days=30)
+    store.upsert_many([(f"cliente{i}", '30 días', vence, True, clave(i), None)
+                       for i in range(args.clientes)])
+
+    def motor():
+        return QuotaEngine(snapshot=os.path.join(carpeta, 'consumo.json'), store=store,
+                           suspender=False, compactar_cada=10 ** 9)
+
+    engine = motor()
+    engine.load()
+    deltas = {clave(i): (1000 + i, 5000 + i) for i in range(args.clientes)}
+
+    t0 = time.perf_counter()
+    for k in range(args.muestras):
+        engine.on_muestra(time.time(), deltas)
+    muestra = (time.perf_counter() - t0) / args.muestras * 1000
+    log = os.path.getsize(engine._ruta_log(engine._gen))
+
+    t0 = time.perf_counter()
+    engine._log.close()
+    engine._log = None
+    recarga = motor()
+    recarga.load()
+    carga_log = (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    recarga.compactar()
+    compactar = (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    motor().load()
+    carga_snap = (time.perf_counter() - t0) * 1000
+
+    print(f"{args.clientes} clientes, {args.muestras} muestras")
+    print(f"muestra    {muestra:8.2f} ms (log {log / 1024:.0f} KiB)")
+    print(f"carga      {carga_log:8.2f} ms (instantánea + log)")
+    print(f"compactar  {compactar:8.2f} ms")
+    print(f"carga      {carga_snap:8.2f} ms (solo instantánea)")
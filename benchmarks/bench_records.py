@@ -0,0 +1,64 @@
+# benchmarks/bench_records.py
+#
+# Registro de clientes en memoria con N clientes:
+#   dict    — forma heredada del JSON (fecha como texto, se parsea en cada uso)
+#   record  — ClientRecord (slots, vencimiento en epoch, plan internado)
+# Mide la memoria de la caché (tracemalloc) y una pasada típica de las rutas
+# calientes: contar vigentes a una fecha.
+#
+# Uso:
+#   python benchmarks/bench_records.py [--clientes 100000]
+
+import os
+import sys
+import time
+import random
+import argparse
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from client_store import FMT_VENC, _record, _to_epoch  # noqa: E402
+
+
+def medir_memoria(construir) -> tuple[object, float]:
+    tracemalloc.start()
+    datos = construir()
+    actual, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return datos, actual
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clientes', type=int, default=100000)
+    args = parser.parse_args()
+
+    ahora = datetime.now()
+    filas = [
+        (f"cliente{i}", random.choice(['15 días', '30 días']),
+         (ahora + timedelta(hours=random.uniform(-24 * 30, 24 * 30))).strftime(FMT_VENC),
+         True, f"{i:043d}=", f"10.9.{i // 250}.{i % 250 + 2}/32")
+        for i in range(args.clientes)
+    ]
+
+    dicts, mem_dict = medir_memoria(lambda: {
+        n: {"plan": str(p), "vencimiento": v, "activa": a, "public_key": k, "direccion": d}
+        for n, p, v, a, k, d in filas
+    })
+    records, mem_rec = medir_memoria(lambda: {
+        n: _record(n, str(p), _to_epoch(v), a, k, d) for n, p, v, a, k, d in filas
+    })
+
+    t0 = time.perf_counter()
+    vigentes_dict = sum(1 for info in dicts.values() if datetime.strptime(info['vencimiento'], FMT_VENC) > ahora)
+    t_dict = (time.perf_counter() - t0) * 1000
+    t0 = time.perf_counter()
+    limite = ahora.timestamp()
+    vigentes_rec = sum(1 for rec in records.values() if rec.vence > limite)
+    t_rec = (time.perf_counter() - t0) * 1000
+
+    print(f"{args.clientes} clientes")
+    print(f"dict     {mem_dict / args.clientes:6.0f} B/cliente   vigentes {vigentes_dict} en {t_dict:8.1f} ms")
+    print(f"record   {mem_rec / args.clientes:6.0f} B/cliente   vigentes {vigentes_rec} en {t_rec:8.1f} ms")
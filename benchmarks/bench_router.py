@@ -0,0 +1,63 @@
+# benchmarks/bench_router.py
+#
+# Coste de despachar un mensaje de texto según el tamaño del menú:
+#   lambdas  — un @bot.message_handler(func=lambda m: m.text == ...) por botón;
+#              telebot prueba los filtros en orden hasta que uno coincide.
+#   router   — router.Router: un handler por tipo de contenido y búsqueda en dict.
+# Se mide solo la resolución (sin red): los handlers no hacen nada.
+#
+# Uso:
+#   python benchmarks/bench_router.py [--mensajes 20000]
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from telebot import TeleBot  # noqa: E402
+from telebot.types import Message  # noqa: E402
+
+from fake_bot_api import FakeBotApi, TOKEN  # noqa: E402
+from router import Router  # noqa: E402
+
+
+def mensajes(textos: list[str], n: int) -> list:
+    api = FakeBotApi()
+    return [Message.de_json(api.update_mensaje(1, random.choice(textos))['message']) for _ in range(n)]
+
+
+def bench_lambdas(textos: list[str], msgs: list) -> float:
+    bot = TeleBot(TOKEN, threaded=False)
+    for t in textos:
+        bot.message_handler(func=lambda m, t=t: m.text == t)(lambda m: None)
+    t0 = time.perf_counter()
+    bot.process_new_messages(list(msgs))
+    return time.perf_counter() - t0
+
+
+def bench_router(textos: list[str], msgs: list) -> float:
+    bot = TeleBot(TOKEN, threaded=False)
+    router = Router(bot)
+    for t in textos:
+        router.texto(t)(lambda m: None)
+    t0 = time.perf_counter()
+    bot.process_new_messages(list(msgs))
+    return time.perf_counter() - t0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mensajes', type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"{'botones':>8} {'lambdas µs/msg':>15} {'router µs/msg':>14}")
+    for n in (10, 50, 200, 1000):
+        textos = [f"boton {i}" for i in range(n)]
+        msgs = mensajes(textos, args.mensajes)
+        a = bench_lambdas(textos, msgs)
+        b = bench_router(textos, msgs)
+        print(f"{n:>8} {a / len(msgs) * 1e6:>15.1f} {b / len(msgs) * 1e6:>14.1f}")
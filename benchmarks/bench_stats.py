@@ -0,0 +1,61 @@
+# benchmarks/bench_stats.py
+#
+# "📊 Estadísticas" y "📆 Por expirar" con N clientes (client_stats.ClientStats):
+#   carga    — índice inicial a partir de los registros (una ordenación)
+#   consulta — resumen + vencimientos de los próximos 4 días (bisect)
+#   upsert   — alta/renovación, con el coste de mantener el índice
+#
+# Uso:
+#   python benchmarks/bench_stats.py [--clientes 10000] [--repeticiones 200]
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from client_store import ClientStore  # noqa: E402
+from client_stats import ClientStats  # noqa: E402
+
+
+def medir(fn, repeticiones: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(repeticiones):
+        fn()
+    return (time.perf_counter() - t0) / repeticiones * 1000
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clientes', type=int, default=10000)
+    parser.add_argument('--repeticiones', type=int, default=200)
+    args = parser.parse_args()
+
+    ahora = datetime.now()
+    store = ClientStore(os.path.join(tempfile.mkdtemp(), 'bench.db'), legacy_jsons=())
+    store.upsert_many([
+        (f"cliente{i}", random.choice(['15 días', '30 días']),
+         ahora + timedelta(hours=random.uniform(-24 * 30, 24 * 30)), True, None, None)
+        for i in range(args.clientes)
+    ])
+    stats = ClientStats()
+    store.add_listener(stats.on_store_event)
+    t0 = time.perf_counter()
+    stats.load(store.records())
+    carga = (time.perf_counter() - t0) * 1000
+
+    def indice():
+        stats.resumen()
+        stats.expirando(time.time(), time.time() + 4 * 86400)
+
+    def renovar():
+        store.upsert(f"cliente{random.randrange(args.clientes)}", '30 días',
+                     datetime.now() + timedelta(days=random.uniform(0, 30)))
+
+    print(f"{args.clientes} clientes (carga inicial del índice {carga:.1f} ms)")
+    print(f"consulta {medir(indice, args.repeticiones):8.3f} ms")
+    print(f"upsert   {medir(renovar, args.repeticiones):8.3f} ms (incluye actualizar el índice)")
@@ -0,0 +1,85 @@
+# benchmarks/bench_telemetry.py
+#
+# Telemetría de peers (peer_telemetry.py) con N peers y un dump falso de
+# `wg show wg0 dump`:
+#   ingesta  — parsear el dump y añadir la muestra a los buffers circulares
+#   vistas   — en línea ahora, bytes de hoy y los que más consumen
+#   memoria  — buffers tras llenar el anillo (tracemalloc)
+#
+# Con --salida escribe un dump falso para probar el bot sin WireGuard
+# (TELEMETRIA_DUMP = '<ruta>' en config.py); cada ejecución avanza los contadores.
+#
+# Uso:
+#   python benchmarks/bench_telemetry.py [--peers 1000] [--muestras 288]
+#   python benchmarks/bench_telemetry.py --peers 20 --salida /tmp/wg0.dump
+
+import os
+import sys
+import time
+import random
+import base64
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from peer_telemetry import PeerTelemetry  # noqa: E402
+
+
+def clave(i: int) -> str:
+    return base64.b64encode(i.to_bytes(32, 'big')).decode()
+
+
+def dump_falso(peers: int, ahora: float, paso: int, semilla: int = 1) -> str:
+    """Dump con el formato de `wg show wg0 dump`; los contadores crecen con *paso*."""
+    rnd = random.Random(semilla)
+    lineas = [f"{clave(0)}\t{clave(1)}\t51820\toff"]
+    for i in range(peers):
+        tasa = rnd.choice((0, 0, 10_000, 200_000, 5_000_000))  # bytes por paso
+        handshake = int(ahora - rnd.uniform(0, 600)) if tasa else 0
+        rx, tx = tasa * paso // 8, tasa * paso
+        lineas.append(
+            f"{clave(i + 2)}\t(none)\t{'203.0.113.%d:%d' % (i % 250, 40000 + i % 20000) if tasa else '(none)'}"
+            f"\t10.9.{(i + 2) // 250}.{(i + 2) % 250}/32\t{handshake}\t{rx}\t{tx}\t25"
+        )
+    return "\n".join(lineas) + "\n"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--peers', type=int, default=1000)
+    parser.add_argument('--muestras', type=int, default=288)
+    parser.add_argument('--salida', help='escribir un dump falso en esta ruta y salir')
+    args = parser.parse_args()
+
+    if args.salida:
+        paso = int(time.time() // 60)  # contadores crecientes entre ejecuciones
+        with open(args.salida, 'w') as f:
+            f.write(dump_falso(args.peers, time.time(), paso % 1_000_000))
+        print(f"dump de {args.peers} peers escrito en {args.salida}")
+        sys.exit(0)
+
+    inicio = time.time() - args.muestras * 300
+    # 8 dumps que se repiten: los contadores vuelven a cero cada 8 muestras (reinicio de wg0)
+    dumps = [dump_falso(args.peers, inicio + k * 300, k) for k in range(8)]
+
+    tracemalloc.start()
+    telemetria = PeerTelemetry(muestras=args.muestras)
+    t0 = time.perf_counter()
+    for k in range(args.muestras):
+        telemetria.ingerir(dumps[k % len(dumps)], ahora=inicio + k * 300)
+    ingesta = (time.perf_counter() - t0) / args.muestras * 1000
+    memoria, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    ahora = inicio + (args.muestras - 1) * 300
+    t0 = time.perf_counter()
+    online = telemetria.online(ahora)
+    hoy = telemetria.bytes_desde(ahora - 12 * 3600)
+    top = telemetria.top(10, desde=ahora - 12 * 3600)
+    vistas = (time.perf_counter() - t0) * 1000
+
+    print(f"{args.peers} peers, {args.muestras} muestras")
+    print(f"ingesta  {ingesta:8.2f} ms por muestra (parseo incluido)")
+    print(f"vistas   {vistas:8.2f} ms (en línea {len(online)}, {len(hoy)} con tráfico, top {len(top)})")
+    print(f"memoria  {memoria / 1024 / 1024:8.2f} MiB ({memoria / args.peers:.0f} B por peer)")
@@ -0,0 +1,94 @@
+# benchmarks/bench_webhook.py
+#
+# Sustituto de Telegram para el modo webhook: publica updates falsos por POST
+# en webhook_server (con la cabecera del secreto) desde varios clientes a la vez
+# y mide updates/s, respuestas 503 (contrapresión) y rechazos por secreto.
+# Los envíos del bot (sendMessage) van a benchmarks/fake_bot_api.py.
+#
+# Uso:
+#   python benchmarks/bench_webhook.py [--usuarios 50] [--mensajes 10] [--latencia 50]
+#                                      [--clientes 8] [--cola 1000]
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import http.client
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from telebot import TeleBot  # noqa: E402
+
+from fake_bot_api import FakeBotApi, TOKEN  # noqa: E402
+from payments_handlers import register_payments_handlers  # noqa: E402
+from webhook_server import WebhookServer  # noqa: E402
+
+
+def publicar(port: int, path: str, secreto: str, updates: list[dict], codigos: dict, lock) -> None:
+    """Cliente que publica *updates*; reintenta los 503 como haría Telegram."""
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    for update in updates:
+        cuerpo = json.dumps(update).encode()
+        while True:
+            conn.request('POST', path, body=cuerpo, headers={
+                'Content-Type': 'application/json',
+                'X-Telegram-Bot-Api-Secret-Token': secreto,
+            })
+            resp = conn.getresponse()
+            resp.read()
+            with lock:
+                codigos[resp.status] = codigos.get(resp.status, 0) + 1
+            if resp.status != 503:
+                break
+            time.sleep(float(resp.getheader('Retry-After') or 1) / 10)
+    conn.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--usuarios', type=int, default=50)
+    parser.add_argument('--mensajes', type=int, default=10, help='mensajes por usuario')
+    parser.add_argument('--latencia', type=float, default=50, help='ms por llamada saliente')
+    parser.add_argument('--clientes', type=int, default=8, help='conexiones simultáneas del sustituto')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--cola', type=int, default=1000, help='máximo de updates en cola')
+    args = parser.parse_args()
+
+    api = FakeBotApi(latencia=args.latencia / 1000).start()
+    api.apuntar_telebot()
+    bot = TeleBot(TOKEN, threaded=False)
+    register_payments_handlers(bot)
+    servidor = WebhookServer(bot, host='127.0.0.1', port=0, workers=args.workers,
+                             cola_max=args.cola).start()
+
+    # Secreto incorrecto: debe dar 403 y no procesarse
+    conn = http.client.HTTPConnection('127.0.0.1', servidor.port)
+    conn.request('POST', servidor.path, body=json.dumps(api.update_mensaje(1, '/planes')),
+                 headers={'X-Telegram-Bot-Api-Secret-Token': 'incorrecto', 'Content-Type': 'application/json'})
+    print(f"secreto incorrecto -> {conn.getresponse().status}")
+    conn.close()
+
+    updates = [api.update_mensaje(1000 + u, '/planes')
+               for _ in range(args.mensajes) for u in range(args.usuarios)]
+    codigos, lock = {}, threading.Lock()
+    lotes = [updates[i::args.clientes] for i in range(args.clientes)]
+    t0 = time.perf_counter()
+    hilos = [threading.Thread(target=publicar, args=(servidor.port, servidor.path, servidor.secret, lote, codigos, lock))
+             for lote in lotes]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    t_ingesta = time.perf_counter() - t0
+    ok = api.esperar_envios(len(updates))
+    dt = time.perf_counter() - t0
+    servidor.stop()
+    api.stop()
+
+    print(f"{args.usuarios} usuarios × {args.mensajes} mensajes, {args.latencia:.0f} ms por envío, "
+          f"{args.workers} workers, cola {args.cola}")
+    print(f"ingesta   {len(updates) / t_ingesta:8.1f} updates/s  respuestas={codigos}")
+    print(f"proceso   {len(updates) / dt:8.1f} updates/s  ({'completo' if ok else 'INCOMPLETO'})  {servidor.stats()}")
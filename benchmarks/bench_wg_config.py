@@ -0,0 +1,92 @@
+# benchmarks/bench_wg_config.py
+#
+# Modelo de wg0.conf (wg_server_config.py) con N peers:
+#   parse      — leer el fichero al mapa indexado por clave pública
+#   alta       — add() de un peer + confirmar (un syncconf + escritura atómica)
+#   suspender  — update(activo=False) de un lote + confirmar
+#   baja       — remove() de un lote + confirmar
+#   sin cambios — confirmar sin cambios pendientes (ni `wg` ni escritura)
+#
+# `wg` es /bin/true: se mide el trabajo en proceso (diff, render, escritura).
+#
+# Uso:
+#   python benchmarks/bench_wg_config.py [--peers 1000 10000] [--lote 100]
+
+import os
+import sys
+import time
+import base64
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wg_server_config import WgServerConfig, cargar  # noqa: E402
+
+
+def clave(i: int) -> str:
+    return base64.b64encode(i.to_bytes(32, 'big')).decode()
+
+
+def texto_conf(peers: int) -> str:
+    bloques = ["[Interface]\nAddress = 10.9.0.1/16\nPrivateKey = x\nListenPort = 51820\n"]
+    bloques += [f"# c{i}\n[Peer]\nPublicKey = {clave(i)}\n"
+                f"AllowedIPs = 10.9.{i // 250}.{i % 250 + 2}/32\nPersistentKeepalive = 25\n"
+                for i in range(peers)]
+    return "\n".join(bloques)
+
+
+def medir(fn, repeticiones: int = 5) -> float:
+    t0 = time.perf_counter()
+    for _ in range(repeticiones):
+        fn()
+    return (time.perf_counter() - t0) / repeticiones * 1000
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--peers', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--lote', type=int, default=100)
+    args = parser.parse_args()
+
+    for n in args.peers:
+        ruta = os.path.join(tempfile.mkdtemp(), 'wg0.conf')
+        texto = texto_conf(n)
+        with open(ruta, 'w') as f:
+            f.write(texto)
+        kw = {'interface': 'wg0', 'wg_bin': '/bin/true'}
+
+        parse = medir(lambda: WgServerConfig.parse(texto))
+        conf = cargar(ruta, sudo=False)
+
+        extra = iter(range(n, n + 1000))
+        def alta():
+            i = next(extra)
+            conf.add(f"c{i}", clave(i), f"10.10.{i // 250}.{i % 250 + 2}/32")
+            conf.confirmar(**kw)
+        alta_ms = medir(alta)
+
+        lote = [clave(i) for i in range(args.lote)]
+        def suspender():
+            for k in lote:
+                conf.update(k, activo=False)
+            conf.confirmar(**kw)
+            for k in lote:
+                conf.update(k, activo=True)
+            conf.confirmar(**kw)
+        suspender_ms = medir(suspender) / 2
+
+        sin_cambios = medir(lambda: conf.confirmar(**kw), 50)
+
+        t0 = time.perf_counter()
+        for k in lote:
+            conf.remove(k)
+        conf.confirmar(**kw)
+        baja = (time.perf_counter() - t0) * 1000
+
+        print(f"{n} peers (lote {args.lote})")
+        print(f"  parse        {parse:8.2f} ms")
+        print(f"  alta         {alta_ms:8.2f} ms")
+        print(f"  suspender    {suspender_ms:8.2f} ms")
+        print(f"  baja         {baja:8.2f} ms")
+        print(f"  sin cambios  {sin_cambios:8.3f} ms")
@@ -0,0 +1,154 @@
+# benchmarks/fake_bot_api.py
+#
+# Servidor falso de la Bot API de Telegram (solo stdlib) para pruebas de carga.
+# - getUpdates sirve updates sintéticos (mensajes de N usuarios simulados) con
+#   long polling real (espera hasta `timeout` si no hay nada).
+# - sendMessage, sendPhoto, sendDocument, answerCallbackQuery... responden
+#   tras `latencia` segundos (simula el RTT hasta api.telegram.org) y se cuentan.
+#
+# Uso desde un benchmark:
+#   api = FakeBotApi(latencia=0.05).start()
+#   api.apuntar_telebot()            # apihelper/asyncio_helper -> este servidor
+#   api.encolar_mensajes(usuarios=50, por_usuario=10, texto='/planes')
+#   api.esperar_envios(500); api.stop()
+
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlparse
+
+TOKEN = '123456:FAKE-token-para-pruebas'
+
+
+class FakeBotApi:
+
+    def __init__(self, latencia: float = 0.0, host: str = '127.0.0.1', port: int = 0):
+        self.latencia = latencia
+        self._cond = threading.Condition()
+        self._updates = []          # [(update_id, dict)]
+        self._siguiente_id = 1
+        self.envios = 0
+        self.por_metodo = {}
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                self._responder()
+
+            def do_POST(self):
+                self._responder()
+
+            def _responder(self):
+                url = urlparse(self.path)
+                metodo = url.path.rsplit('/', 1)[-1]
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                largo = int(self.headers.get('Content-Length') or 0)
+                cuerpo = self.rfile.read(largo) if largo else b''
+                tipo = self.headers.get('Content-Type', '')
+                if cuerpo and 'json' in tipo:
+                    params.update(json.loads(cuerpo))
+                elif cuerpo and 'urlencoded' in tipo:
+                    params.update({k: v[0] for k, v in parse_qs(cuerpo.decode()).items()})
+                resultado = api.atender(metodo, params)
+                datos = json.dumps({'ok': True, 'result': resultado}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(datos)))
+                self.end_headers()
+                self.wfile.write(datos)
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://{host}:{self.httpd.server_address[1]}"
+
+    # ========================= CICLO DE VIDA =========================
+    def start(self) -> 'FakeBotApi':
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def apuntar_telebot(self) -> None:
+        """Redirige pyTelegramBotAPI (síncrono y asyncio) a este servidor."""
+        from telebot import apihelper, asyncio_helper
+        apihelper.API_URL = self.url + "/bot{0}/{1}"
+        asyncio_helper.API_URL = self.url + "/bot{0}/{1}"
+
+    # ========================= UPDATES =========================
+    def update_mensaje(self, uid: int, texto: str) -> dict:
+        """Update de un mensaje de texto de *uid* (reserva un update_id)."""
+        with self._cond:
+            update_id = self._siguiente_id
+            self._siguiente_id += 1
+        mensaje = {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': uid, 'type': 'private'},
+            'from': {'id': uid, 'is_bot': False, 'first_name': f'u{uid}'},
+            'text': texto,
+        }
+        if texto.startswith('/'):
+            mensaje['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(texto.split()[0])}]
+        return {'update_id': update_id, 'message': mensaje}
+
+    def encolar(self, updates: list[dict]) -> None:
+        with self._cond:
+            self._updates.extend((u['update_id'], u) for u in updates)
+            self._cond.notify_all()
+
+    def encolar_mensajes(self, usuarios: int, por_usuario: int, texto: str, primer_uid: int = 1000) -> int:
+        """Encola usuarios × por_usuario mensajes (intercalados). Devuelve cuántos."""
+        updates = [self.update_mensaje(primer_uid + u, texto)
+                   for _ in range(por_usuario) for u in range(usuarios)]
+        self.encolar(updates)
+        return len(updates)
+
+    # ========================= MÉTODOS =========================
+    def atender(self, metodo: str, params: dict):
+        if metodo == 'getMe':
+            return {'id': 1, 'is_bot': True, 'first_name': 'fake', 'username': 'fake_bot'}
+        if metodo == 'getUpdates':
+            return self._get_updates(params)
+        if metodo in ('setWebhook', 'deleteWebhook'):
+            return True
+
+        if self.latencia:
+            time.sleep(self.latencia)
+        with self._cond:
+            self.envios += 1
+            self.por_metodo[metodo] = self.por_metodo.get(metodo, 0) + 1
+            n = self.envios
+            self._cond.notify_all()
+        if metodo in ('answerCallbackQuery', 'editMessageReplyMarkup'):
+            return True
+        chat_id = int(params.get('chat_id', 0) or 0)
+        return {'message_id': n, 'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'}, 'text': params.get('text', '')}
+
+    def _get_updates(self, params: dict) -> list[dict]:
+        offset = int(params.get('offset') or 0)
+        limite = int(params.get('limit') or 100)
+        fin = time.time() + float(params.get('timeout') or 0)
+        with self._cond:
+            while True:
+                self._updates = [(i, u) for i, u in self._updates if i >= offset]
+                if self._updates or time.time() >= fin:
+                    return [u for _, u in self._updates[:limite]]
+                self._cond.wait(fin - time.time())
+
+    def esperar_envios(self, n: int, timeout: float = 120.0) -> bool:
+        """Bloquea hasta que el bot haya hecho *n* envíos (o vence *timeout*)."""
+        fin = time.time() + timeout
+        with self._cond:
+            while self.envios < n:
+                restante = fin - time.time()
+                if restante <= 0:
+                    return False
+                self._cond.wait(restante)
+            return True
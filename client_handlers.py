@@ -1,62 +1,117 @@
 # client_handlers.py
+#
+# Panel de cliente: /start de un usuario que no es el admin y los botones de su
+# menú. Los clientes de cada usuario salen de utils.clientes_de_usuario (su ID
+# de Telegram va en el nombre del cliente), así que un usuario con varias
+# compras ve todas sus configuraciones.
 
 from telebot import TeleBot
 from telebot.types import ReplyKeyboardMarkup, KeyboardButton
-from config import CLIENTES_DIR
-from utils import ruta_conf_cliente, generar_qr_desde_conf, cargar_cliente
+from client_store import get_client_store
+from peer_telemetry import get_peer_telemetry, clave_de_cliente, formatear_bytes, formatear_hace
+from quota_engine import get_quota_engine, hay_cuotas
+from router import get_router
+from file_id_cache import enviar_documento, enviar_foto_bytes
+from utils import ruta_conf_cliente, generar_qr_desde_conf, clientes_de_usuario, escapar_md
 import os
+import time
 
-def mostrar_menu_cliente(bot: TeleBot, chat_id: int):
-    """
-    Muestra el menú principal para clientes registrados.
-    """
-    if not cliente_existe(chat_id):
-        return bot.send_message(chat_id, "❌ No estás registrado como cliente.\nContacta con el administrador para obtener tu configuración.")
+NO_REGISTRADO = ("❌ No estás registrado como cliente.\n"
+                 "Usa /planes para comprar una configuración o contacta con el administrador.")
 
+def menu_cliente():
     kb = ReplyKeyboardMarkup(resize_keyboard=True, row_width=2)
     kb.add(
         KeyboardButton("📁 Ver configuración"),
         KeyboardButton("📅 Ver vencimiento"),
-        KeyboardButton("📷 Ver código QR")
+        KeyboardButton("📷 Ver código QR"),
+        KeyboardButton("📶 Mi conexión")
     )
-    bot.send_message(chat_id, "📲 *Panel de Cliente Francho Wire Bot*\n\nSelecciona una opción:", reply_markup=kb, parse_mode="Markdown")
+    return kb
 
-def cliente_existe(chat_id: int) -> bool:
+def mostrar_menu_cliente(bot: TeleBot, message):
     """
-    Verifica si el archivo del cliente existe por su ID.
+    Muestra el menú principal para clientes registrados.
     """
-    ruta = os.path.join(CLIENTES_DIR, f"{chat_id}.json")
-    return os.path.exists(ruta)
+    if not clientes_de_usuario(message.from_user.id):
+        return bot.send_message(message.chat.id, NO_REGISTRADO)
+    bot.send_message(message.chat.id, "📲 *Panel de Cliente Francho Wire Bot*\n\nSelecciona una opción:",
+                     reply_markup=menu_cliente(), parse_mode="Markdown")
 
-def manejar_respuesta_cliente(bot: TeleBot, message):
-    """
-    Maneja las respuestas del cliente desde el menú.
-    """
-    chat_id = message.chat.id
-    if not cliente_existe(chat_id):
-        return bot.send_message(chat_id, "❌ No estás registrado como cliente.\nSolicita tu configuración al administrador.")
-
-    texto = message.text.strip()
-
-    if texto == "📁 Ver configuración":
-        ruta = ruta_conf_cliente(str(chat_id))
-        if not os.path.exists(ruta):
-            return bot.send_message(chat_id, "⚠️ No se encontró tu archivo de configuración.")
-        with open(ruta, "rb") as archivo:
-            bot.send_document(chat_id, archivo, caption="📄 Aquí tienes tu archivo de configuración WireGuard.")
-
-    elif texto == "📅 Ver vencimiento":
-        datos = cargar_cliente(str(chat_id))
-        if not datos:
-            return bot.send_message(chat_id, "⚠️ No se pudo obtener la información de vencimiento.")
-        bot.send_message(chat_id, f"📆 Tu configuración vence el:\n*{datos['vencimiento']}*", parse_mode="Markdown")
-
-    elif texto == "📷 Ver código QR":
-        ruta = ruta_conf_cliente(str(chat_id))
-        if not os.path.exists(ruta):
-            return bot.send_message(chat_id, "⚠️ No se encontró tu archivo de configuración.")
-        qr = generar_qr_desde_conf(ruta)
-        if qr:
-            bot.send_photo(chat_id, qr, caption="📷 Código QR de tu configuración")
-        else:
-            bot.send_message(chat_id, "❌ No se pudo generar el código QR.")
+def _estado_conexion(nombre: str) -> str:
+    """Conexión y consumo de hoy de un cliente (Markdown)."""
+    clave = clave_de_cliente(nombre)
+    estado = get_peer_telemetry().peer(clave) if clave else None
+    if estado is None:
+        return f"*{escapar_md(nombre)}*: todavía no hay datos de tu conexión. Inténtalo en unos minutos."
+    if estado['online']:
+        linea = "🟢 *Conectado*"
+    elif estado['handshake']:
+        linea = f"⚪️ *Sin conexión* (última hace {formatear_hace(time.time() - estado['handshake'])})"
+    else:
+        linea = "⚪️ *Sin conexión* (aún no se ha conectado)"
+    texto = (
+        f"*{escapar_md(nombre)}* — {linea}\n📊 Consumo de hoy:\n"
+        f"⬇️ Bajada: {formatear_bytes(estado['tx_hoy'])}\n"
+        f"⬆️ Subida: {formatear_bytes(estado['rx_hoy'])}"
+    )
+    if hay_cuotas():
+        uso, cuota = get_quota_engine().uso(nombre)
+        if cuota:
+            texto += f"\n📦 Datos del plan: {formatear_bytes(uso)} de {formatear_bytes(cuota)} ({uso / cuota:.0%})"
+    return texto
+
+def register_client_handlers(bot: TeleBot):
+    router = get_router(bot)
+
+    def _clientes(message) -> list[str]:
+        clientes = clientes_de_usuario(message.from_user.id)
+        if not clientes:
+            bot.send_message(message.chat.id, NO_REGISTRADO)
+        return clientes
+
+    @router.texto("📁 Ver configuración")
+    def ver_configuracion(message):
+        for nombre in _clientes(message):
+            ruta = ruta_conf_cliente(nombre)
+            if not os.path.exists(ruta):
+                bot.send_message(message.chat.id, f"⚠️ No se encontró el archivo de configuración de {nombre}.")
+                continue
+            enviar_documento(bot, message.chat.id, ruta, caption=f"📄 {nombre}: tu archivo de configuración WireGuard.")
+
+    @router.texto("📅 Ver vencimiento")
+    def ver_vencimiento(message):
+        clientes = _clientes(message)
+        if not clientes:
+            return
+        lines = ["📆 *Tus configuraciones:*"]
+        store = get_client_store()
+        for nombre in clientes:
+            rec = store.record(nombre)
+            if rec is None:
+                continue
+            estado = "✅ Activa" if rec.activa else "⛔️ Expirada"
+            vence = rec.vencimiento.strftime('%d/%m/%Y %I:%M %p') if rec.vence else '—'
+            lines.append(f"• {escapar_md(nombre)}: vence el *{vence}* — {estado}")
+        bot.send_message(message.chat.id, "\n".join(lines), parse_mode="Markdown")
+
+    @router.texto("📷 Ver código QR")
+    def ver_qr(message):
+        for nombre in _clientes(message):
+            ruta = ruta_conf_cliente(nombre)
+            if not os.path.exists(ruta):
+                bot.send_message(message.chat.id, f"⚠️ No se encontró el archivo de configuración de {nombre}.")
+                continue
+            qr = generar_qr_desde_conf(ruta)
+            if qr:
+                enviar_foto_bytes(bot, message.chat.id, f"{os.path.abspath(ruta)}#qr", qr.getvalue(), qr.name,
+                                  caption=f"📷 Código QR de {nombre}")
+            else:
+                bot.send_message(message.chat.id, f"❌ No se pudo generar el código QR de {nombre}.")
+
+    @router.texto("📶 Mi conexión")
+    def mi_conexion(message):
+        clientes = _clientes(message)
+        if clientes:
+            bot.send_message(message.chat.id, "\n\n".join(_estado_conexion(n) for n in clientes),
+                             parse_mode="Markdown")
@@ -0,0 +1,111 @@
+# client_index.py
+#
+# Índice en memoria de nombres de cliente para el selector del panel admin y
+# la búsqueda inline (@bot texto).
+# - Lista ordenada de nombres en minúsculas: coincidencias por prefijo con bisect.
+# - Trigramas -> nombres: coincidencias por subcadena (3+ caracteres) cruzando
+#   los conjuntos de los trigramas de la consulta, sin recorrer todo el registro.
+# - Se mantiene al día con los eventos del ClientStore (altas y bajas).
+#
+# buscar() devuelve primero los que empiezan por el texto y luego los que lo
+# contienen, ambos en orden alfabético, paginados con desde/limite.
+
+import bisect
+import threading
+
+from client_store import get_client_store
+
+
+def _trigramas(texto: str) -> set[str]:
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+class ClientIndex:
+
+    def __init__(self, nombres=()):
+        self._lock = threading.Lock()
+        self._trigramas = {}      # trigrama -> {nombre}
+        # [(nombre en minúsculas, nombre)] ordenada
+        self._orden = sorted({(n.lower(), n) for n in nombres})
+        for minus, nombre in self._orden:
+            for t in _trigramas(minus):
+                self._trigramas.setdefault(t, set()).add(nombre)
+
+    # ========================= MANTENIMIENTO =========================
+    def _agregar(self, nombre: str) -> None:
+        clave = (nombre.lower(), nombre)
+        i = bisect.bisect_left(self._orden, clave)
+        if i < len(self._orden) and self._orden[i] == clave:
+            return
+        self._orden.insert(i, clave)
+        for t in _trigramas(clave[0]):
+            self._trigramas.setdefault(t, set()).add(nombre)
+
+    def _quitar(self, nombre: str) -> None:
+        clave = (nombre.lower(), nombre)
+        i = bisect.bisect_left(self._orden, clave)
+        if i < len(self._orden) and self._orden[i] == clave:
+            del self._orden[i]
+        for t in _trigramas(clave[0]):
+            nombres = self._trigramas.get(t)
+            if nombres is not None:
+                nombres.discard(nombre)
+                if not nombres:
+                    del self._trigramas[t]
+
+    def on_store_event(self, evento: str, nombre: str, registro) -> None:
+        """Oyente del ClientStore."""
+        with self._lock:
+            if evento == 'delete':
+                self._quitar(nombre)
+            elif evento == 'upsert':
+                self._agregar(nombre)
+
+    # ========================= BÚSQUEDA =========================
+    def buscar(self, texto: str = '', desde: int = 0, limite: int = 10) -> tuple[list[str], int]:
+        """
+        Nombres que empiezan por *texto* y después los que lo contienen (sin
+        distinguir mayúsculas). Devuelve (página de nombres, total de coincidencias).
+        """
+        q = (texto or '').strip().lower()
+        with self._lock:
+            if not q:
+                return [n for _, n in self._orden[desde:desde + limite]], len(self._orden)
+            ini = bisect.bisect_left(self._orden, (q,))
+            fin = bisect.bisect_left(self._orden, (q + '\uffff',))
+            prefijo = [n for _, n in self._orden[ini:fin]]
+            contienen = []
+            if len(q) >= 3:
+                conjuntos = sorted((self._trigramas.get(t, set()) for t in _trigramas(q)), key=len)
+                candidatos = set.intersection(*conjuntos) if conjuntos and conjuntos[0] else set()
+                contienen = sorted(
+                    (n for n in candidatos if q in n.lower() and not n.lower().startswith(q)),
+                    key=lambda n: (n.lower(), n)
+                )
+        total = len(prefijo) + len(contienen)
+        if desde < len(prefijo):
+            pagina = prefijo[desde:desde + limite]
+            pagina += contienen[:limite - len(pagina)]
+        else:
+            pagina = contienen[desde - len(prefijo):desde - len(prefijo) + limite]
+        return pagina, total
+
+    def __len__(self) -> int:
+        return len(self._orden)
+
+
+# ========================= INSTANCIA COMPARTIDA =========================
+_index = None
+_index_lock = threading.Lock()
+
+def get_client_index() -> ClientIndex:
+    """Índice compartido; se construye con el registro y se suscribe a sus cambios."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                store = get_client_store()
+                index = ClientIndex(store.nombres())
+                store.add_listener(index.on_store_event)
+                _index = index
+    return _index
@@ -0,0 +1,111 @@
+# client_stats.py
+#
+# Estadísticas de clientes mantenidas de forma incremental (sin recorrer ni
+# reparsear el registro en cada "📊 Estadísticas" o "📆 Por expirar").
+# - Índice ordenado de vencimientos [(instante, nombre)], global y por plan:
+#   contar vigentes/expirados a una fecha es un bisect (O(log N)) y "vencen entre
+#   A y B" es un corte de la lista.
+# - Se actualiza con los eventos del ClientStore (altas, renovaciones, bajas),
+#   usando el vencimiento ya decodificado del ClientRecord (epoch).
+#
+# Igual que get_stats() y el planificador: vigente = vencimiento posterior a ahora
+# (fecha naive del registro, mismo reloj que datetime.now()).
+
+import bisect
+import threading
+import time
+
+from client_store import ClientRecord, get_client_store
+
+
+def _instante(entrada: tuple) -> float:
+    return entrada[0]
+
+
+class ClientStats:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clientes = {}       # nombre -> (instante, plan)
+        self._orden = []          # [(instante, nombre)] ordenada
+        self._por_plan = {}       # plan -> [(instante, nombre)] ordenada
+
+    # ========================= CARGA / CAMBIOS =========================
+    def load(self, registros: dict[str, ClientRecord]) -> None:
+        """Carga inicial desde {nombre: ClientRecord} (una ordenación)."""
+        with self._lock:
+            self._clientes = {n: (rec.vence, rec.plan) for n, rec in registros.items()}
+            self._orden = sorted((ts, n) for n, (ts, _) in self._clientes.items())
+            self._por_plan = {}
+            for ts, n in self._orden:
+                self._por_plan.setdefault(self._clientes[n][1], []).append((ts, n))
+
+    def _quitar(self, nombre: str) -> None:
+        previo = self._clientes.pop(nombre, None)
+        if previo is None:
+            return
+        ts, plan = previo
+        for lista in (self._orden, self._por_plan.get(plan)):
+            i = bisect.bisect_left(lista, (ts, nombre))
+            if i < len(lista) and lista[i] == (ts, nombre):
+                del lista[i]
+        if not self._por_plan.get(plan):
+            self._por_plan.pop(plan, None)
+
+    def _poner(self, nombre: str, rec: ClientRecord) -> None:
+        ts, plan = rec.vence, rec.plan
+        self._clientes[nombre] = (ts, plan)
+        bisect.insort(self._orden, (ts, nombre))
+        bisect.insort(self._por_plan.setdefault(plan, []), (ts, nombre))
+
+    def on_store_event(self, evento: str, nombre: str, registro: ClientRecord | None) -> None:
+        """Oyente del ClientStore."""
+        with self._lock:
+            if evento == 'delete':
+                self._quitar(nombre)
+            elif evento == 'upsert':
+                previo = self._clientes.get(nombre)
+                if previo != (registro.vence, registro.plan):
+                    self._quitar(nombre)
+                    self._poner(nombre, registro)
+
+    # ========================= CONSULTAS =========================
+    def resumen(self, ahora: float | None = None) -> dict:
+        """
+        {'activos', 'expirados', 'total', 'por_plan': {plan: (activos, total)}}
+        a la fecha *ahora* (timestamp; por defecto, ya).
+        """
+        ahora = time.time() if ahora is None else ahora
+        with self._lock:
+            total = len(self._orden)
+            activos = total - bisect.bisect_right(self._orden, ahora, key=_instante)
+            por_plan = {
+                plan: (len(lista) - bisect.bisect_right(lista, ahora, key=_instante), len(lista))
+                for plan, lista in self._por_plan.items()
+            }
+        return {'activos': activos, 'expirados': total - activos, 'total': total, 'por_plan': por_plan}
+
+    def expirando(self, desde: float, hasta: float) -> list[tuple[str, float]]:
+        """[(nombre, instante)] con vencimiento en (desde, hasta], por fecha."""
+        with self._lock:
+            i = bisect.bisect_right(self._orden, desde, key=_instante)
+            j = bisect.bisect_right(self._orden, hasta, key=_instante)
+            return [(n, ts) for ts, n in self._orden[i:j]]
+
+
+# ========================= INSTANCIA COMPARTIDA =========================
+_stats = None
+_stats_lock = threading.Lock()
+
+def get_client_stats() -> ClientStats:
+    """Estadísticas compartidas; se cargan del registro y se suscriben a sus cambios."""
+    global _stats
+    if _stats is None:
+        with _stats_lock:
+            if _stats is None:
+                store = get_client_store()
+                stats = ClientStats()
+                store.add_listener(stats.on_store_event)
+                stats.load(store.records())
+                _stats = stats
+    return _stats
@@ -0,0 +1,439 @@
+# client_store.py
+#
+# Registro de clientes en SQLite (modo WAL). Único módulo que conoce la ruta,
+# el esquema y el acceso de lectura/escritura del registro: el resto del bot
+# usa get_client_store().
+# - Una fila por cliente: altas, renovaciones y bajas son upserts/deletes por clave,
+#   sin volver a parsear ni reescribir todo el registro.
+# - Índices sobre `vencimiento` y `activa` para vencimientos y estadísticas, y
+#   compuestos (vencimiento|plan|activa, …, nombre) para el listado paginado (pagina()).
+# - Migración única desde los dos configuraciones.json heredados
+#   (clientes/ y data/), fusionando y quedándose con el vencimiento más reciente.
+# - Caché en memoria write-through: las lecturas no tocan disco salvo que otro
+#   proceso modifique la base (PRAGMA data_version) o se reemplace el fichero.
+# - La caché guarda ClientRecord (dataclass inmutable con __slots__): el
+#   vencimiento como entero (segundos epoch, columna `vence`) decodificado una vez
+#   al cargar, y el plan como cadena internada. Las rutas calientes (planificador,
+#   estadísticas, listados) comparan enteros en vez de parsear fechas.
+# - Oyentes (add_listener) avisados tras cada alta/renovación/cambio/baja con el
+#   ClientRecord, para que planificador, estadísticas, etc. se actualicen de forma
+#   incremental.
+#
+# get()/all() devuelven los registros con la forma que tenía el JSON, más los datos
+# del peer y el vencimiento en epoch:
+#   {"plan": <str>, "vencimiento": "%Y-%m-%d %H:%M", "activa": <bool>,
+#    "public_key": <str|None>, "direccion": <str|None>, "vence": <int>}
+# record()/records() devuelven directamente los ClientRecord.
+
+import os
+import sys
+import json
+import sqlite3
+import threading
+from dataclasses import dataclass, replace
+from datetime import datetime
+
+from config import CLIENTS_DIR
+
+# Base de datos y JSON heredados (se importan una sola vez)
+DB_FILE = os.path.join(CLIENTS_DIR, 'configuraciones.db')
+LEGACY_JSON = os.path.join(CLIENTS_DIR, 'configuraciones.json')
+LEGACY_JSON_DATA = os.path.normpath(os.path.join(CLIENTS_DIR, '..', 'data', 'configuraciones.json'))
+
+# Formato de fecha guardado (ordena igual como texto que como fecha)
+FMT_VENC = "%Y-%m-%d %H:%M"
+
+SCHEMA_VERSION = 5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS clientes (
+    nombre      TEXT PRIMARY KEY,
+    plan        TEXT,
+    vencimiento TEXT,
+    activa      INTEGER NOT NULL DEFAULT 1,
+    public_key  TEXT,
+    direccion   TEXT,
+    vence       INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_clientes_vencimiento ON clientes(vencimiento);
+CREATE INDEX IF NOT EXISTS idx_clientes_activa ON clientes(activa);
+CREATE INDEX IF NOT EXISTS idx_clientes_venc_nombre ON clientes(vencimiento, nombre);
+CREATE INDEX IF NOT EXISTS idx_clientes_plan_venc ON clientes(plan, vencimiento, nombre);
+CREATE INDEX IF NOT EXISTS idx_clientes_activa_venc ON clientes(activa, vencimiento, nombre);
+"""
+
+
+def _fmt_venc(vencimiento) -> str | None:
+    if vencimiento is None:
+        return None
+    if isinstance(vencimiento, datetime):
+        return vencimiento.strftime(FMT_VENC)
+    return str(vencimiento)
+
+
+def _to_epoch(vencimiento) -> int:
+    """Segundos epoch del vencimiento (datetime o texto FMT_VENC); 0 si no hay fecha válida."""
+    if isinstance(vencimiento, datetime):
+        # misma precisión que la columna de texto (minutos)
+        return int(vencimiento.replace(second=0, microsecond=0).timestamp())
+    try:
+        return int(datetime.strptime(vencimiento, FMT_VENC).timestamp())
+    except (TypeError, ValueError):
+        return 0
+
+
+@dataclass(frozen=True, slots=True)
+class ClientRecord:
+    """Cliente en memoria. vence: segundos epoch (0 = sin fecha)."""
+    nombre: str
+    plan: str | None
+    vence: int
+    activa: bool = True
+    public_key: str | None = None
+    direccion: str | None = None
+
+    @property
+    def vencimiento(self) -> datetime | None:
+        return datetime.fromtimestamp(self.vence) if self.vence else None
+
+    def vigente(self, ahora: float) -> bool:
+        return self.vence > ahora
+
+    def as_dict(self) -> dict:
+        """Forma de registro heredada del JSON (más 'vence')."""
+        return {
+            "plan": self.plan,
+            "vencimiento": _fmt_venc(self.vencimiento),
+            "activa": self.activa,
+            "public_key": self.public_key,
+            "direccion": self.direccion,
+            "vence": self.vence,
+        }
+
+
+def _record(nombre: str, plan: str | None, vence: int, activa, public_key, direccion) -> ClientRecord:
+    return ClientRecord(sys.intern(nombre), sys.intern(plan) if plan else plan, vence or 0,
+                        bool(activa), public_key, direccion)
+
+
+_COLS = "nombre, plan, vence, activa, public_key, direccion"
+
+
+def _row_to_record(row) -> ClientRecord:
+    return _record(*row)
+
+
+_UPSERT = (
+    "INSERT INTO clientes(nombre, plan, vencimiento, vence, activa, public_key, direccion) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT(nombre) DO UPDATE SET plan = excluded.plan, "
+    "vencimiento = excluded.vencimiento, vence = excluded.vence, activa = excluded.activa, "
+    "public_key = COALESCE(excluded.public_key, public_key), "
+    "direccion = COALESCE(excluded.direccion, direccion)"
+)
+
+
+def _nuevo_registro(previo: ClientRecord | None, nombre, plan, vence, activa,
+                    public_key, direccion) -> ClientRecord:
+    """Registro tras un upsert: public_key/direccion en None conservan las previas."""
+    return _record(nombre, plan, vence, activa,
+                   public_key or (previo.public_key if previo else None),
+                   direccion or (previo.direccion if previo else None))
+
+
+class ClientStore:
+    """
+    Acceso al registro de clientes. Seguro entre hilos (una conexión compartida
+    protegida por un lock; SQLite en WAL permite lectores externos concurrentes).
+    """
+
+    def __init__(self, path: str = DB_FILE,
+                 legacy_jsons: tuple = (LEGACY_JSON, LEGACY_JSON_DATA)):
+        folder = os.path.dirname(path)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder, exist_ok=True)
+        self.path = path
+        self._lock = threading.RLock()
+        # Caché: {nombre: ClientRecord}, nombres ordenados y huella de la base
+        self._cache = None
+        self._nombres = None
+        self._data_version = None
+        self._file_id = None
+        self._listeners = []
+        self._open()
+        self._init_schema(legacy_jsons)
+
+    def _open(self):
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._file_id = self._stat_id()
+
+    def _stat_id(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_dev, st.st_ino
+
+    @property
+    def lock(self) -> threading.RLock:
+        """Lock reentrante para agrupar lectura+escritura (p. ej. renovaciones)."""
+        return self._lock
+
+    # ========================= OYENTES =========================
+    def add_listener(self, fn) -> None:
+        """
+        Registra fn(evento, nombre, registro) para 'upsert', 'activa' y 'delete'.
+        registro es el ClientRecord (inmutable) o None en 'delete'. Se llama fuera
+        del lock del store.
+        """
+        self._listeners.append(fn)
+
+    def _notify(self, evento: str, nombre: str, registro: ClientRecord | None) -> None:
+        for fn in list(self._listeners):
+            try:
+                fn(evento, nombre, registro)
+            except Exception as e:
+                print(f"[client_store] error en oyente {evento}: {e}")
+
+    # ========================= CACHÉ =========================
+    def _invalidate(self):
+        self._cache = None
+        self._nombres = None
+
+    def _cached(self) -> dict:
+        """
+        Devuelve la caché (bajo self._lock), recargándola solo si la base cambió
+        desde fuera: otra conexión escribió o el fichero fue reemplazado.
+        """
+        file_id = self._stat_id()
+        if file_id != self._file_id:
+            self._conn.close()
+            self._open()
+            self._invalidate()
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._data_version:
+            self._data_version = version
+            self._invalidate()
+        if self._cache is None:
+            rows = self._conn.execute(
+                f"SELECT {_COLS} FROM clientes ORDER BY rowid"
+            ).fetchall()
+            self._cache = {row[0]: _row_to_record(row) for row in rows}
+        return self._cache
+
+    # ========================= ESQUEMA / MIGRACIÓN =========================
+    def _init_schema(self, legacy_jsons: tuple):
+        with self._lock:
+            version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+            if version >= SCHEMA_VERSION:
+                return
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for stmt in filter(None, (s.strip() for s in _SCHEMA.split(';'))):
+                    self._conn.execute(stmt)
+                # v3: datos del peer (clave pública y dirección asignada); v5: vence (epoch)
+                columnas = {r[1] for r in self._conn.execute("PRAGMA table_info(clientes)")}
+                for col, tipo in (("public_key", "TEXT"), ("direccion", "TEXT"), ("vence", "INTEGER")):
+                    if col not in columnas:
+                        self._conn.execute(f"ALTER TABLE clientes ADD COLUMN {col} {tipo}")
+                # v1: clientes/configuraciones.json; v2: también data/configuraciones.json
+                pendientes = legacy_jsons[:1] if version == 0 else ()
+                if version < 2:
+                    pendientes += legacy_jsons[1:]
+                for legacy_json in pendientes:
+                    self._migrar_json(legacy_json)
+                # v5: las fechas de texto se decodifican aquí, una sola vez
+                sin_vence = self._conn.execute(
+                    "SELECT nombre, vencimiento FROM clientes WHERE vence IS NULL"
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE clientes SET vence = ? WHERE nombre = ?",
+                    [(_to_epoch(v), n) for n, v in sin_vence]
+                )
+                self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _migrar_json(self, legacy_json: str):
+        """
+        Importa (una sola vez) las entradas de un configuraciones.json heredado.
+        Si el cliente ya existe, gana el vencimiento más reciente.
+        """
+        if not os.path.isfile(legacy_json):
+            return
+        try:
+            with open(legacy_json, 'r') as f:
+                datos = json.load(f) or {}
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"[client_store] No se pudo migrar {legacy_json}: {e}")
+            return
+        filas = [
+            (nombre, info.get('plan'), info.get('vencimiento'), int(bool(info.get('activa', True))))
+            for nombre, info in datos.items()
+            if isinstance(info, dict)
+        ]
+        self._conn.executemany(
+            "INSERT INTO clientes(nombre, plan, vencimiento, activa) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(nombre) DO UPDATE SET plan = COALESCE(excluded.plan, plan), "
+            "vencimiento = excluded.vencimiento, activa = excluded.activa, vence = NULL "
+            "WHERE clientes.vencimiento IS NULL OR excluded.vencimiento > clientes.vencimiento",
+            filas
+        )
+        print(f"[client_store] Migrados {len(filas)} clientes desde {legacy_json}")
+
+    # ========================= LECTURA =========================
+    def get(self, nombre: str) -> dict | None:
+        with self._lock:
+            registro = self._cached().get(nombre)
+        return registro.as_dict() if registro else None
+
+    def record(self, nombre: str) -> ClientRecord | None:
+        with self._lock:
+            return self._cached().get(nombre)
+
+    def exists(self, nombre: str) -> bool:
+        with self._lock:
+            return nombre in self._cached()
+
+    def all(self) -> dict:
+        """Todos los clientes como {nombre: registro (dict)}, en orden de inserción."""
+        with self._lock:
+            return {n: r.as_dict() for n, r in self._cached().items()}
+
+    def records(self) -> dict[str, ClientRecord]:
+        """Todos los clientes como {nombre: ClientRecord}, sin copiar registros."""
+        with self._lock:
+            return dict(self._cached())
+
+    def nombres(self) -> list[str]:
+        with self._lock:
+            cache = self._cached()
+            if self._nombres is None:
+                self._nombres = sorted(cache)
+            return list(self._nombres)
+
+    def pagina(self, desde: int, limite: int, plan: str | None = None,
+               activa: bool | None = None) -> tuple[list[ClientRecord], int]:
+        """
+        Una página del listado ordenado por vencimiento (y nombre), opcionalmente
+        filtrado por plan o por activa. Devuelve ([ClientRecord], total filtrado).
+        """
+        where, args = [], []
+        if plan is not None:
+            where.append("plan = ?")
+            args.append(plan)
+        if activa is not None:
+            where.append("activa = ?")
+            args.append(int(activa))
+        filtro = f"WHERE {' AND '.join(where)} " if where else ""
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM clientes {filtro}", args).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT {_COLS} FROM clientes {filtro}ORDER BY vencimiento, nombre LIMIT ? OFFSET ?",
+                (*args, limite, desde)
+            ).fetchall()
+        return [_row_to_record(row) for row in rows], total
+
+    def rowids(self, nombres: list[str]) -> dict[str, int]:
+        """{nombre: rowid} (identificador corto y estable para callback_data)."""
+        if not nombres:
+            return {}
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT nombre, rowid FROM clientes WHERE nombre IN ({','.join('?' * len(nombres))})",
+                list(nombres)
+            ).fetchall()
+        return dict(rows)
+
+    def nombre_de_rowid(self, rowid: int) -> str | None:
+        with self._lock:
+            row = self._conn.execute("SELECT nombre FROM clientes WHERE rowid = ?", (rowid,)).fetchone()
+        return row[0] if row else None
+
+    # ========================= ESCRITURA =========================
+    def upsert(self, nombre: str, plan: str, vencimiento, activa: bool = True,
+               public_key: str | None = None, direccion: str | None = None) -> None:
+        """
+        Crea o actualiza la fila de *nombre* (una sola escritura).
+        public_key/direccion en None conservan los valores existentes.
+        """
+        venc, vence = _fmt_venc(vencimiento), _to_epoch(vencimiento)
+        with self._lock:
+            cache = self._cached()
+            self._conn.execute(_UPSERT, (nombre, plan, venc, vence, int(activa), public_key, direccion))
+            if nombre not in cache:
+                self._nombres = None
+            registro = cache[nombre] = _nuevo_registro(cache.get(nombre), nombre, plan, vence,
+                                                       activa, public_key, direccion)
+        self._notify('upsert', nombre, registro)
+
+    def upsert_many(self, filas: list[tuple]) -> None:
+        """
+        Alta/actualización en lote, en una sola transacción:
+        filas = [(nombre, plan, vencimiento, activa, public_key, direccion), ...]
+        """
+        filas = [(n, p, _fmt_venc(v), _to_epoch(v), int(a), k, d) for n, p, v, a, k, d in filas]
+        with self._lock:
+            cache = self._cached()
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(_UPSERT, filas)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            registros = []
+            for n, p, _, vence, a, k, d in filas:
+                if n not in cache:
+                    self._nombres = None
+                registro = cache[n] = _nuevo_registro(cache.get(n), n, p, vence, a, k, d)
+                registros.append((n, registro))
+        for n, registro in registros:
+            self._notify('upsert', n, registro)
+
+    def set_activa(self, nombre: str, activa: bool) -> bool:
+        with self._lock:
+            cache = self._cached()
+            cur = self._conn.execute(
+                "UPDATE clientes SET activa = ? WHERE nombre = ?", (int(activa), nombre)
+            )
+            registro = None
+            if nombre in cache:
+                registro = cache[nombre] = replace(cache[nombre], activa=bool(activa))
+        if registro is not None:
+            self._notify('activa', nombre, registro)
+        return cur.rowcount > 0
+
+    def delete(self, nombre: str) -> bool:
+        with self._lock:
+            cache = self._cached()
+            cur = self._conn.execute("DELETE FROM clientes WHERE nombre = ?", (nombre,))
+            if cache.pop(nombre, None) is not None:
+                self._nombres = None
+        if cur.rowcount > 0:
+            self._notify('delete', nombre, None)
+        return cur.rowcount > 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+# ========================= INSTANCIA COMPARTIDA =========================
+_client_store = None
+_client_store_lock = threading.Lock()
+
+def get_client_store() -> ClientStore:
+    """
+    Devuelve el ClientStore compartido (se abre y migra la primera vez).
+    """
+    global _client_store
+    if _client_store is None:
+        with _client_store_lock:
+            if _client_store is None:
+                _client_store = ClientStore()
+    return _client_store
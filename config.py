@@ -31,9 +31,105 @@ WG_CONFIG_DIR = '/etc/wireguard/configs'
 # Endpoint completo para el .conf de cliente
 SERVER_ENDPOINT = f'{SERVER_PUBLIC_IP}:{WG_PORT}'
 
-# Planes disponibles y su duración (para menús y cálculos de vencimiento)
+# Planes disponibles y su duración (para menús y cálculos de vencimiento).
+# Opcional: 'precio' (CUP) por plan, para los ingresos por día de 📊 Estadísticas,
+# y 'cuota_gb', datos (subida + bajada) por periodo (ver CUOTA_* más abajo),
+# p. ej. '30 días': {'dias': 30, 'precio': 500, 'cuota_gb': 100}
 PLANS = {
     'Free (5 horas)': {'horas': 5},
     '15 días':      {'dias': 15},
     '30 días':      {'dias': 30},
 }
+
+# Interfaz WireGuard del servidor y su fichero de configuración
+WG_INTERFACE = 'wg0'
+WG_CONF_PATH = f'/etc/wireguard/{WG_INTERFACE}.conf'
+
+# Binario `wg` (se puede apuntar a un sustituto para pruebas) y si se invoca con sudo
+WG_BIN = 'wg'
+WG_SUDO = True
+
+# Al llegar la fecha de vencimiento, revocar el peer (wg0 y wg0.conf)
+# y marcar la configuración como inactiva
+AUTO_DESACTIVAR_VENCIDAS = False
+
+# Cómo se crean los clientes: 'nativo' (claves y .conf en proceso) o 'script' (SCRIPT_PATH)
+GENERATOR_MODE = 'nativo'
+
+# Subred de los clientes (la primera IP es la del servidor) y DNS del .conf
+WG_CLIENT_SUBNET = '10.9.0.0/24'
+CLIENT_DNS = '1.1.1.1'
+
+# Cola de altas/renovaciones: hilos que ejecutan create_config fuera del polling
+# y máximo de trabajos en espera antes de rechazar nuevos
+PROVISION_WORKERS = 2
+PROVISION_MAX_PENDIENTES = 50
+
+# Códigos QR: versión fija (11 = hasta 321 bytes con corrección L, de sobra para
+# un .conf de cliente), nivel de corrección, máscara fija (None = elegir la mejor
+# de las 8, unas 5 veces más lento), tamaño de módulo, borde y compresión PNG (0-9)
+QR_VERSION = 11
+QR_CORRECCION = 'L'
+QR_MASCARA = 0
+QR_BOX_SIZE = 6
+QR_BORDE = 2
+QR_PNG_NIVEL = 1
+
+# Modo de ejecución del bot: 'polling' (TeleBot.infinity_polling), 'async'
+# (long polling con asyncio y handlers en paralelo, ver async_runtime.py) o
+# 'webhook' (servidor HTTP propio, ver webhook_server.py)
+BOT_MODE = 'polling'
+ASYNC_MAX_CONCURRENCIA = 32
+POLL_TIMEOUT = 20
+
+# Modo webhook: dirección de escucha, URL pública HTTPS (sin la ruta), ruta,
+# secreto de la cabecera X-Telegram-Bot-Api-Secret-Token ('' = uno aleatorio por
+# arranque), workers, máximo de updates en cola y certificado (si no hay proxy TLS)
+WEBHOOK_HOST = '0.0.0.0'
+WEBHOOK_PORT = 8443
+WEBHOOK_URL = ''
+WEBHOOK_PATH = '/telegram/webhook'
+WEBHOOK_SECRET = ''
+WEBHOOK_WORKERS = 8
+WEBHOOK_COLA_MAX = 1000
+WEBHOOK_SSL_CERT = None
+WEBHOOK_SSL_KEY = None
+
+# Envíos a Telegram (outbound.py): mensajes/s en total y por chat (con ráfaga),
+# reintentos ante 429/errores transitorios y ventana para agrupar avisos al ADMIN
+ENVIO_GLOBAL_POR_SEG = 25
+ENVIO_CHAT_POR_SEG = 1
+ENVIO_CHAT_RAFAGA = 3
+ENVIO_REINTENTOS = 4
+ALERTAS_VENTANA = 3.0
+
+# Pedidos de compra (payment_store.py): horas sin actividad hasta caducar un
+# pedido a medio rellenar o uno pendiente de revisión, y días que se conservan los cerrados
+PAGO_TTL_HORAS = 24
+PAGO_TTL_REVISION_HORAS = 72
+PAGO_RETENCION_DIAS = 30
+
+# Listado "🗂 Ver todas": clientes por página
+LISTADO_POR_PAGINA = 20
+
+# Selector de clientes (Renovar, Eliminar, Ver QR, Descargar .conf): resultados por página
+BUSQUEDA_POR_PAGINA = 8
+# ...y segundos que el texto escrito se sigue tomando como búsqueda
+BUSQUEDA_TTL = 600
+
+# Telemetría de peers (peer_telemetry.py): segundos entre muestras de
+# `wg show dump` (0 = desactivada), muestras que se conservan (288 * 5 min = 24 h;
+# 20 bytes por muestra y peer), segundos desde el último handshake para contar
+# como "en línea", zona horaria de "hoy" y fichero de dump falso (pruebas; None = wg)
+TELEMETRIA_INTERVALO = 300
+TELEMETRIA_MUESTRAS = 288
+TELEMETRIA_ONLINE_S = 180
+TELEMETRIA_ZONA = 'America/Havana'
+TELEMETRIA_DUMP = None
+
+# Cuotas de datos (quota_engine.py, necesita la telemetría): fracción de la cuota
+# a la que se avisa, si al agotarla se suspende el peer (fuera de la interfaz hasta
+# renovar) y cada cuántas líneas del log de consumo se escribe una instantánea
+CUOTA_AVISO = 0.8
+CUOTA_SUSPENDER = True
+CUOTA_COMPACTAR_CADA = 20000
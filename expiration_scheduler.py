@@ -0,0 +1,195 @@
+# expiration_scheduler.py
+#
+# Planificador de vencimientos ordenado por fecha límite.
+# - Min-heap de eventos (instante, nombre, tipo): el hilo duerme hasta el siguiente.
+# - Se actualiza incrementalmente desde el ClientStore (altas, renovaciones, bajas):
+#   O(log N) por cambio, sin releer el registro: usa el vencimiento ya decodificado
+#   (epoch) de cada ClientRecord.
+# - Eventos obsoletos (renovados o eliminados) se descartan al salir del heap.
+#
+# Tipos de evento:
+#   'alerta'      -> vencimiento - alerta_horas (aviso previo al admin)
+#   'vencimiento' -> instante exacto del vencimiento
+#
+# Los vencimientos que coinciden en un mismo despertar (p. ej. tras un reinicio)
+# se entregan juntos a on_expire para poder aplicarlos en lote.
+#
+# run() bloquea un hilo; run_async() hace lo mismo como tarea de asyncio
+# (modo BOT_MODE = 'async'), con los callbacks en el executor del bucle.
+
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from datetime import datetime
+
+from client_store import ClientRecord
+
+
+class ExpirationScheduler:
+    """
+    on_alert(nombre, vencimiento: datetime) y on_expire([(nombre, vencimiento), ...])
+    se ejecutan en el hilo de run(), en el momento de cada evento.
+    """
+
+    def __init__(self, on_alert=None, on_expire=None, alerta_horas: float = 1.0):
+        self.on_alert = on_alert
+        self.on_expire = on_expire
+        self.alerta_s = alerta_horas * 3600
+        self._heap = []
+        self._seq = itertools.count()
+        # Vencimiento vigente por cliente: un evento solo es válido si coincide
+        self._vigente = {}
+        self._cond = threading.Condition()
+        self._stop = False
+        # Aviso de cambios para run_async() (lo instala el propio bucle)
+        self._avisar = None
+
+    # ========================= CARGA / CAMBIOS =========================
+    def load(self, registros: dict[str, ClientRecord]) -> None:
+        """Carga inicial desde {nombre: ClientRecord} (un único heapify)."""
+        with self._cond:
+            self._heap.clear()
+            self._vigente.clear()
+            for nombre, rec in registros.items():
+                self._push_eventos(nombre, rec, heapify=False)
+            heapq.heapify(self._heap)
+            self._cond.notify()
+        self._despertar()
+
+    def schedule(self, nombre: str, rec: ClientRecord) -> None:
+        """Programa (o reprograma) los eventos de *nombre*."""
+        with self._cond:
+            self._push_eventos(nombre, rec)
+            self._compact()
+            self._cond.notify()
+        self._despertar()
+
+    def cancel(self, nombre: str) -> None:
+        """Anula los eventos de *nombre* (se descartan al salir del heap)."""
+        with self._cond:
+            self._vigente.pop(nombre, None)
+
+    def on_store_event(self, evento: str, nombre: str, registro: ClientRecord | None) -> None:
+        """Oyente para ClientStore.add_listener."""
+        if evento == 'delete':
+            self.cancel(nombre)
+        elif evento == 'upsert':
+            self.schedule(nombre, registro)
+
+    def _push_eventos(self, nombre: str, rec: ClientRecord, heapify: bool = True) -> None:
+        venc_ts = rec.vence
+        if not venc_ts:
+            # Sin fecha (o fecha inválida en el registro): nada que programar
+            self._vigente.pop(nombre, None)
+            return
+        ahora = time.time()
+        if venc_ts <= ahora and not rec.activa:
+            # Ya vencida y desactivada: nada que hacer
+            self._vigente.pop(nombre, None)
+            return
+        self._vigente[nombre] = venc_ts
+        push = heapq.heappush if heapify else (lambda h, e: h.append(e))
+        if venc_ts > ahora:
+            push(self._heap, (max(venc_ts - self.alerta_s, ahora), next(self._seq), nombre, venc_ts, 'alerta'))
+        push(self._heap, (venc_ts, next(self._seq), nombre, venc_ts, 'vencimiento'))
+
+    def _compact(self) -> None:
+        """Purga eventos obsoletos si dominan el heap (muchas renovaciones)."""
+        if len(self._heap) <= 4 * len(self._vigente) + 64:
+            return
+        self._heap = [e for e in self._heap if self._vigente.get(e[2]) == e[3]]
+        heapq.heapify(self._heap)
+
+    # ========================= BUCLE =========================
+    def next_deadline(self) -> float | None:
+        with self._cond:
+            return self._heap[0][0] if self._heap else None
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+        self._despertar()
+
+    def _despertar(self) -> None:
+        avisar = self._avisar
+        if avisar is not None:
+            try:
+                avisar()
+            except RuntimeError:  # bucle ya cerrado
+                pass
+
+    def run(self) -> None:
+        """Duerme hasta el próximo evento y lo dispara; bloquea hasta stop()."""
+        while True:
+            with self._cond:
+                while not self._stop:
+                    if self._heap:
+                        espera = self._heap[0][0] - time.time()
+                        if espera <= 0:
+                            break
+                        self._cond.wait(espera)
+                    else:
+                        self._cond.wait()
+                if self._stop:
+                    return
+                alertas, vencidos = self._pop_due(time.time())
+            self._entregar(alertas, vencidos)
+
+    async def run_async(self) -> None:
+        """Como run(), pero como tarea de asyncio; termina con stop()."""
+        loop = asyncio.get_running_loop()
+        cambio = asyncio.Event()
+        self._avisar = lambda: loop.call_soon_threadsafe(cambio.set)
+        try:
+            while True:
+                cambio.clear()
+                with self._cond:
+                    if self._stop:
+                        return
+                    ahora = time.time()
+                    if self._heap and self._heap[0][0] <= ahora:
+                        alertas, vencidos = self._pop_due(ahora)
+                    else:
+                        espera = self._heap[0][0] - ahora if self._heap else None
+                        alertas = vencidos = None
+                if alertas is None:
+                    try:
+                        await asyncio.wait_for(cambio.wait(), espera)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                # Los callbacks bloquean (Telegram, wg): fuera del bucle
+                await loop.run_in_executor(None, self._entregar, alertas, vencidos)
+        finally:
+            self._avisar = None
+
+    def _entregar(self, alertas: list, vencidos: list) -> None:
+        for nombre, venc_ts in alertas:
+            self._fire(self.on_alert, nombre, datetime.fromtimestamp(venc_ts))
+        if vencidos:
+            self._fire(self.on_expire, [(n, datetime.fromtimestamp(v)) for n, v in vencidos])
+
+    def _pop_due(self, ahora: float) -> tuple[list, list]:
+        """Saca del heap todos los eventos vencidos y válidos (bajo self._cond)."""
+        alertas, vencidos = [], []
+        while self._heap and self._heap[0][0] <= ahora:
+            _, _, nombre, venc_ts, tipo = heapq.heappop(self._heap)
+            if self._vigente.get(nombre) != venc_ts:
+                continue  # renovado o eliminado desde que se programó
+            if tipo == 'alerta':
+                alertas.append((nombre, venc_ts))
+            else:
+                self._vigente.pop(nombre, None)
+                vencidos.append((nombre, venc_ts))
+        return alertas, vencidos
+
+    def _fire(self, callback, *args) -> None:
+        if callback is None:
+            return
+        try:
+            callback(*args)
+        except Exception as e:
+            print(f"[expiration_scheduler] error en evento {args[0]!r}: {e}")
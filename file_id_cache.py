@@ -0,0 +1,133 @@
+# file_id_cache.py
+#
+# Reutilización de file_id de Telegram para no volver a subir .conf y QR.
+# - Tras la primera subida, Telegram devuelve un file_id que se puede reenviar
+#   gratis (a cualquier chat del mismo bot).
+# - Se guarda por fichero: {clave: {'hash': sha256 del contenido, 'file_id': ..., 'tipo': ...}}
+#   en FILE_IDS_FILE (JSON, escrituras agrupadas con save_json_later).
+# - Si el contenido cambió (otro hash) o Telegram rechaza el file_id, se sube
+#   de nuevo y se actualiza la entrada.
+#
+# Uso:
+#   enviar_documento(bot, chat_id, ruta, caption=..., parse_mode=...)
+#   enviar_foto(bot, chat_id, ruta, caption=...)
+#   enviar_foto_bytes(bot, chat_id, clave, datos_png, caption=...)
+
+import os
+import io
+import hashlib
+import threading
+
+from telebot.apihelper import ApiTelegramException
+
+from config import CLIENTS_DIR
+from storage import load_json, save_json_later
+
+FILE_IDS_FILE = os.path.join(CLIENTS_DIR, 'file_ids.json')
+
+
+class FileIdCache:
+
+    def __init__(self, path: str = FILE_IDS_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._datos = None
+        self.hits = 0
+        self.misses = 0
+
+    def _cargar(self) -> dict:
+        if self._datos is None:
+            self._datos = load_json(self.path)
+        return self._datos
+
+    def get(self, clave: str, hash_: str, tipo: str) -> str | None:
+        with self._lock:
+            entrada = self._cargar().get(clave)
+            if entrada and entrada.get('hash') == hash_ and entrada.get('tipo') == tipo:
+                self.hits += 1
+                return entrada['file_id']
+            self.misses += 1
+            return None
+
+    def put(self, clave: str, hash_: str, tipo: str, file_id: str) -> None:
+        with self._lock:
+            datos = self._cargar()
+            datos[clave] = {'hash': hash_, 'file_id': file_id, 'tipo': tipo}
+            save_json_later(self.path, dict(datos))
+
+    def forget(self, clave: str) -> None:
+        with self._lock:
+            if self._cargar().pop(clave, None) is not None:
+                save_json_later(self.path, dict(self._datos))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entradas': len(self._cargar())}
+
+    # ========================= ENVÍO =========================
+    def enviar(self, bot, tipo: str, chat_id, clave: str, datos: bytes, nombre: str, **kwargs):
+        """
+        Envía *datos* como 'document' o 'photo' reutilizando el file_id si el
+        contenido no cambió; si no, lo sube y guarda el nuevo file_id.
+        """
+        metodo = bot.send_document if tipo == 'document' else bot.send_photo
+        hash_ = hashlib.sha256(datos).hexdigest()
+
+        file_id = self.get(clave, hash_, tipo)
+        if file_id:
+            try:
+                return metodo(chat_id, file_id, **kwargs)
+            except ApiTelegramException as e:
+                if e.error_code != 400:
+                    raise
+                print(f"[file_id_cache] file_id rechazado para {clave}, se sube de nuevo: {e}")
+                self.forget(clave)
+
+        archivo = io.BytesIO(datos)
+        archivo.name = nombre
+        msg = metodo(chat_id, archivo, **kwargs)
+        nuevo = _file_id_de(msg, tipo)
+        if nuevo:
+            self.put(clave, hash_, tipo, nuevo)
+        return msg
+
+
+def _file_id_de(msg, tipo: str) -> str | None:
+    if tipo == 'document':
+        return msg.document.file_id if getattr(msg, 'document', None) else None
+    fotos = getattr(msg, 'photo', None)
+    return fotos[-1].file_id if fotos else None
+
+
+# ========================= INSTANCIA COMPARTIDA =========================
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_file_id_cache() -> FileIdCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = FileIdCache()
+    return _cache
+
+
+def enviar_documento(bot, chat_id, ruta: str, **kwargs):
+    """send_document de *ruta* reutilizando su file_id si el fichero no cambió."""
+    with open(ruta, 'rb') as f:
+        datos = f.read()
+    return get_file_id_cache().enviar(bot, 'document', chat_id, os.path.abspath(ruta),
+                                      datos, os.path.basename(ruta), **kwargs)
+
+
+def enviar_foto(bot, chat_id, ruta: str, **kwargs):
+    """send_photo de *ruta* reutilizando su file_id si el fichero no cambió."""
+    with open(ruta, 'rb') as f:
+        datos = f.read()
+    return get_file_id_cache().enviar(bot, 'photo', chat_id, os.path.abspath(ruta),
+                                      datos, os.path.basename(ruta), **kwargs)
+
+
+def enviar_foto_bytes(bot, chat_id, clave: str, datos: bytes, nombre: str = 'qr.png', **kwargs):
+    """send_photo de un PNG en memoria (p. ej. desde qr_cache), con *clave* estable."""
+    return get_file_id_cache().enviar(bot, 'photo', chat_id, clave, datos, nombre, **kwargs)
@@ -1,25 +1,78 @@
 # generator.py
 #
 # Generador de configuraciones WireGuard para clientes.
-# - Ejecuta el script bash declarado en config.SCRIPT_PATH para crear el .conf
+# - Modo 'nativo' (por defecto): genera las claves Curve25519 (wireguard.py), renderiza
+#   el .conf a partir de config.SERVER_PUBLIC_KEY/SERVER_ENDPOINT y solo cruza a
+#   código privilegiado para aplicar el peer (wg_server_config.add_peer).
+# - Modo 'script': ejecuta el script bash declarado en config.SCRIPT_PATH (legado).
+# - create_configs_bulk(): alta masiva (un solo apply de peers, una sola
+#   escritura del registro y un ZIP con todo; si el apply falla no quedan
+#   .conf ni QR del lote).
 # - Genera el código QR si no existe
-# - Registra/actualiza la metadata de la configuración en configuraciones.json
+# - Registra/actualiza la metadata de la configuración en el registro de clientes (SQLite)
 #
 # Retorno de create_config(cliente, plan, vencimiento):
 #   (True, ruta_conf, ruta_qr)    en éxito
 #   (False, mensaje_error, None)  en error
 
 import os
+import re
+import time
+import zipfile
 import subprocess
 from datetime import datetime
 
-from config import SCRIPT_PATH, CLIENTS_DIR
+from config import (
+    PLANS,
+    SCRIPT_PATH,
+    CLIENTS_DIR,
+    GENERATOR_MODE,
+    SERVER_PUBLIC_KEY,
+    SERVER_ENDPOINT,
+    WG_NETWORK_RANGE,
+    CLIENT_DNS,
+)
+from client_store import get_client_store
+from ip_allocator import get_ip_allocator
 from utils import (
     ruta_conf_cliente,
     ruta_qr_cliente,
     generate_qr,
     registrar_config,  # Debe existir en utils.py
+    calcular_nuevo_vencimiento,
 )
+from wireguard import generar_par_claves
+from wg_server_config import add_peer, add_peers, remove_peer, depurar, cargar
+from qr_cache import get_qr_cache
+from qr_engine import render_png
+
+# Nombres válidos para un cliente (se usan como nombre de archivo)
+NOMBRE_VALIDO = re.compile(r'^[\w.\-]{1,64}$')
+
+# Carpeta de los ZIP de altas masivas
+LOTES_DIR = os.path.join(CLIENTS_DIR, 'lotes')
+
+
+def render_client_conf(private_key: str, direccion: str) -> str:
+    """Texto del .conf de cliente (mismo formato que crear_cliente.sh)."""
+    return (
+        "[Interface]\n"
+        f"PrivateKey = {private_key}\n"
+        f"Address = {direccion}\n"
+        f"DNS = {CLIENT_DNS}\n"
+        "\n"
+        "[Peer]\n"
+        f"PublicKey = {SERVER_PUBLIC_KEY}\n"
+        f"Endpoint = {SERVER_ENDPOINT}\n"
+        f"AllowedIPs = {WG_NETWORK_RANGE}\n"
+        "PersistentKeepalive = 25\n"
+    )
+
+
+def _escribir_conf(conf_path: str, texto: str) -> None:
+    fd = os.open(conf_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        f.write(texto)
 
 
 def create_config(cliente: str, plan: str, vencimiento: datetime):
@@ -27,9 +80,9 @@ def create_config(cliente: str, plan: str, vencimiento: datetime):
     Crea una configuración WireGuard para un cliente.
 
     Pasos:
-      1) Ejecuta el script bash (SCRIPT_PATH) que debe generar el archivo .conf
+      1) Crea el archivo .conf (en proceso, o con el script si GENERATOR_MODE == 'script')
       2) Comprueba la existencia del .conf y genera el QR si no existe
-      3) Registra la configuración (plan, vencimiento, activa) en configuraciones.json
+      3) Registra la configuración (plan, vencimiento, activa) en el registro de clientes
 
     Args:
         cliente (str): nombre/identificador del cliente (se usa para el nombre de archivo)
@@ -41,6 +94,71 @@ def create_config(cliente: str, plan: str, vencimiento: datetime):
             (True, conf_path, qr_path)              si todo salió bien
             (False, mensaje_error, None)            si hubo error
     """
+    if GENERATOR_MODE == 'script':
+        return create_config_script(cliente, plan, vencimiento)
+    return create_config_native(cliente, plan, vencimiento)
+
+
+def create_config_native(cliente: str, plan: str, vencimiento: datetime):
+    """create_config sin procesos auxiliares salvo el paso privilegiado del peer."""
+    # El nombre va al comentario "# nombre" de wg0.conf y a las rutas del cliente
+    if not NOMBRE_VALIDO.fullmatch(cliente or ''):
+        return False, "Nombre inválido: solo letras, números, '.', '-' y '_' (máx. 64).", None
+    try:
+        os.makedirs(CLIENTS_DIR, exist_ok=True)
+
+        # Un nombre en uso no se recrea: el .conf, el peer y el registro son
+        # del cliente actual y un fallo a mitad de camino lo dejaría sin nada
+        if get_client_store().exists(cliente) or cargar().clave_de(cliente):
+            return False, f"Ya existe un cliente llamado {cliente}.", None
+
+        # 1) Claves, dirección (sin colisiones) y .conf en proceso
+        private_key, public_key = generar_par_claves()
+        allocator = get_ip_allocator()
+        direccion = allocator.allocate()
+        conf_path = ruta_conf_cliente(cliente)
+        qr_path = ruta_qr_cliente(cliente)
+        _escribir_conf(conf_path, render_client_conf(private_key, direccion))
+
+        # 2) Único paso privilegiado: wg0.conf + interfaz en vivo
+        ok, aviso = add_peer(cliente, public_key, direccion)
+        if not ok:
+            os.remove(conf_path)
+            allocator.free(direccion)
+            return False, f"Error al aplicar el peer: {aviso}", None
+        if aviso:
+            print(f"[generator] {aviso}")
+
+        # 3) QR (siempre se regenera: el .conf es nuevo) y 4) registro
+        try:
+            generate_qr(conf_path)
+        except Exception as e:
+            _deshacer_alta(public_key, direccion, conf_path)
+            return False, f"Error al generar el QR: {e}", None
+        try:
+            registrar_config(cliente, plan, vencimiento, public_key=public_key, direccion=direccion)
+        except Exception as e:
+            _deshacer_alta(public_key, direccion, conf_path)
+            return False, f"Error al registrar la configuración: {e}", None
+
+        return True, conf_path, qr_path
+
+    except Exception as e:
+        return False, f"Excepción no controlada en create_config: {e}", None
+
+
+def _deshacer_alta(public_key: str, direccion: str, conf_path: str) -> None:
+    """Quita el peer recién aplicado, libera su dirección y borra su .conf."""
+    ok, aviso = remove_peer(public_key)
+    if not ok:
+        print(f"[generator] no se pudo quitar el peer de un alta fallida: {aviso}")
+    get_ip_allocator().free(direccion)
+    if os.path.exists(conf_path):
+        os.remove(conf_path)
+
+
+def create_config_script(cliente: str, plan: str, vencimiento: datetime):
+    """create_config mediante el script bash (SCRIPT_PATH). Se mantiene como referencia."""
     try:
         # Asegurar carpeta de clientes
         os.makedirs(CLIENTS_DIR, exist_ok=True)
@@ -58,6 +176,12 @@ def create_config(cliente: str, plan: str, vencimiento: datetime):
             # stderr suele contener el motivo del fallo
             return False, (result.stderr or "Error desconocido al ejecutar el script"), None
 
+        # El script añade el [Peer] con `echo >>`: quitar del fichero y de la
+        # interfaz el peer anterior si el cliente se recreó con el mismo nombre
+        ok, aviso = depurar()
+        if aviso:
+            print(f"[generator] {aviso}")
+
         # 2) Verificar rutas generadas por el script
         conf_path = ruta_conf_cliente(cliente)
         qr_path = ruta_qr_cliente(cliente)
@@ -72,11 +196,11 @@ def create_config(cliente: str, plan: str, vencimiento: datetime):
             except Exception as e:
                 return False, f"Error al generar el QR: {e}", None
 
-        # 3) Registrar/actualizar en configuraciones.json (fuente de verdad)
+        # 3) Registrar/actualizar en el registro de clientes (fuente de verdad)
         try:
             registrar_config(cliente, plan, vencimiento)
         except Exception as e:
-            return False, f"Error al registrar la configuración en JSON: {e}", None
+            return False, f"Error al registrar la configuración: {e}", None
 
         # Éxito
         return True, conf_path, qr_path
@@ -84,3 +208,151 @@ def create_config(cliente: str, plan: str, vencimiento: datetime):
     except Exception as e:
         # Cualquier otra excepción no controlada
         return False, f"Excepción no controlada en create_config: {e}", None
+
+
+# ========================= ALTA MASIVA =========================
+def _preparar_cliente(nombre: str, direccion: str):
+    """
+    Trabajo por cliente del lote: claves y .conf.
+    Devuelve (nombre, public_key, direccion, conf_path, texto_conf, error).
+    """
+    try:
+        private_key, public_key = generar_par_claves()
+        conf_path = ruta_conf_cliente(nombre)
+        texto = render_client_conf(private_key, direccion)
+        _escribir_conf(conf_path, texto)
+        return nombre, public_key, direccion, conf_path, texto, None
+    except Exception as e:
+        return nombre, None, direccion, None, None, str(e)
+
+
+def _borrar_ficheros(*rutas: str) -> None:
+    for ruta in rutas:
+        if os.path.exists(ruta):
+            os.remove(ruta)
+
+
+def create_configs_bulk(clientes: list[tuple[str, str]]) -> dict:
+    """
+    Crea muchas configuraciones de una vez.
+
+    Args:
+        clientes: [(nombre, plan), ...]
+
+    Returns:
+        dict con:
+            'creados': [(nombre, conf_path, qr_path), ...]
+            'errores': [(nombre, mensaje), ...]
+            'zip': ruta del ZIP con los .conf y .png (o None)
+            'tiempos': {fase: segundos}
+            'por_segundo': clientes creados por segundo
+    """
+    t_inicio = time.perf_counter()
+    tiempos = {}
+    errores = []
+    os.makedirs(CLIENTS_DIR, exist_ok=True)
+
+    # 0) Validación: nombres válidos, sin repetir y no registrados
+    store = get_client_store()
+    en_wg0 = cargar().claves_por_nombre()
+    vistos = set()
+    pedidos = []
+    for nombre, plan in clientes:
+        nombre = (nombre or '').strip()
+        if not NOMBRE_VALIDO.fullmatch(nombre):
+            errores.append((nombre, "Nombre inválido"))
+        elif nombre in vistos or store.exists(nombre) or nombre in en_wg0:
+            errores.append((nombre, "Nombre repetido o ya registrado"))
+        elif plan not in PLANS:
+            errores.append((nombre, f"Plan inválido: {plan}"))
+        else:
+            vistos.add(nombre)
+            pedidos.append((nombre, plan))
+    planes = dict(pedidos)
+    resultado = {'creados': [], 'errores': errores, 'zip': None, 'tiempos': tiempos, 'por_segundo': 0.0}
+    if not pedidos:
+        return resultado
+
+    # 1) Direcciones (una escritura del bitmap)
+    t = time.perf_counter()
+    allocator = get_ip_allocator()
+    try:
+        direcciones = allocator.allocate_many(len(pedidos))
+    except RuntimeError as e:
+        errores.extend((n, str(e)) for n, _ in pedidos)
+        return resultado
+    tiempos['direcciones'] = time.perf_counter() - t
+
+    # 2) Claves y .conf; 3) QR. En el hilo que llama (un hilo de la cola de
+    #    aprovisionamiento): un pool de procesos hecho con fork desde un hilo
+    #    puede heredar locks tomados y bloquearse, y el lote no lo necesita.
+    t = time.perf_counter()
+    listos = []
+    for nombre, direccion in zip((n for n, _ in pedidos), direcciones):
+        nombre, pub, direccion, conf_path, texto, error = _preparar_cliente(nombre, direccion)
+        if error:
+            errores.append((nombre, error))
+            allocator.free(direccion)
+        else:
+            listos.append((nombre, pub, direccion, conf_path, texto))
+    tiempos['claves'] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    con_qr = []
+    pngs = []
+    for nombre, pub, direccion, conf_path, texto in listos:
+        qr_path = ruta_qr_cliente(nombre)
+        try:
+            png = render_png(texto)
+            with open(qr_path, 'wb') as f:
+                f.write(png)
+        except Exception as e:
+            errores.append((nombre, f"Error al generar el QR: {e}"))
+            _borrar_ficheros(conf_path, qr_path)
+            allocator.free(direccion)
+            continue
+        con_qr.append((nombre, pub, direccion, conf_path, qr_path))
+        pngs.append((texto, png))
+    listos = con_qr
+    tiempos['qr'] = time.perf_counter() - t
+
+    # 4) Un solo apply de todos los peers
+    t = time.perf_counter()
+    ok, aviso = add_peers([(n, k, d) for n, k, d, _, _ in listos])
+    if not ok:
+        allocator.free_many(d for _, _, d, _, _ in listos)
+        for _, _, _, conf_path, qr_path in listos:
+            _borrar_ficheros(conf_path, qr_path)
+        errores.extend((n, f"Error al aplicar los peers: {aviso}") for n, *_ in listos)
+        return resultado
+    if aviso:
+        print(f"[generator] {aviso}")
+    cache = get_qr_cache()
+    for texto, png in pngs:
+        cache.guardar(texto.encode('utf-8'), png)
+    tiempos['aplicar'] = time.perf_counter() - t
+
+    # 5) Una sola escritura del registro
+    t = time.perf_counter()
+    store.upsert_many([
+        (n, planes[n], calcular_nuevo_vencimiento(planes[n]), True, k, d)
+        for n, k, d, _, _ in listos
+    ])
+    tiempos['registro'] = time.perf_counter() - t
+
+    # 6) ZIP con los .conf y QR
+    t = time.perf_counter()
+    os.makedirs(LOTES_DIR, exist_ok=True)
+    zip_path = os.path.join(LOTES_DIR, f"lote_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip")
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for _, _, _, conf_path, qr_path in listos:
+            zf.write(conf_path, os.path.basename(conf_path))
+            zf.write(qr_path, os.path.basename(qr_path), compress_type=zipfile.ZIP_STORED)
+    tiempos['zip'] = time.perf_counter() - t
+
+    total = time.perf_counter() - t_inicio
+    tiempos['total'] = total
+    resultado['creados'] = [(n, c, q) for n, _, _, c, q in listos]
+    resultado['zip'] = zip_path
+    resultado['por_segundo'] = len(listos) / total if total > 0 else 0.0
+    return resultado
@@ -0,0 +1,253 @@
+# ip_allocator.py
+#
+# Asignador de direcciones de clientes sin colisiones.
+# - Bitmap persistente de direcciones ocupadas (1 bit por dirección) sobre
+#   WG_CLIENT_SUBNET: /24, /16 o IPv6 (el pool IPv6 se limita a MAX_POOL hosts).
+# - allocate/free en O(1): pila de direcciones liberadas + puntero de "marea alta"
+#   que avanza sobre el bitmap (amortizado).
+# - reconcile() reconstruye el índice a partir de wg0.conf y del registro
+#   (se hace al arrancar, en get_ip_allocator()).
+#
+# Reservadas: la dirección de red, la primera (servidor) y, en IPv4, broadcast.
+
+import os
+import json
+import ipaddress
+import tempfile
+import threading
+
+from config import CLIENTS_DIR, WG_CLIENT_SUBNET
+from storage import locked
+
+POOL_FILE = os.path.join(CLIENTS_DIR, 'ip_pool.bin')
+
+# Tamaño máximo del pool (IPv6 o redes enormes): 2**20 direcciones = 128 KiB de bitmap
+MAX_POOL = 1 << 20
+
+
+class IpAllocator:
+
+    def __init__(self, subnet: str = WG_CLIENT_SUBNET, path: str | None = POOL_FILE):
+        self.red = ipaddress.ip_network(subnet)
+        self.path = path
+        self.tam = min(self.red.num_addresses, MAX_POOL)
+        self._lock = threading.RLock()
+        self._bits = bytearray((self.tam + 7) // 8)
+        self._libres = []      # índices liberados, reutilizables en O(1)
+        self._siguiente = 0    # primer índice nunca asignado aún
+        self._usados = 0
+        if not (path and self._cargar()):
+            self._reset()
+
+    # ========================= BITMAP =========================
+    def _get(self, i: int) -> bool:
+        return bool(self._bits[i >> 3] & (1 << (i & 7)))
+
+    def _set(self, i: int, valor: bool) -> None:
+        if valor:
+            self._bits[i >> 3] |= 1 << (i & 7)
+        else:
+            self._bits[i >> 3] &= ~(1 << (i & 7)) & 0xFF
+
+    def _reservadas(self) -> list[int]:
+        reservadas = [0, 1]
+        if self.red.version == 4 and self.tam == self.red.num_addresses and self.tam > 2:
+            reservadas.append(self.tam - 1)
+        return [i for i in reservadas if i < self.tam]
+
+    def _reset(self) -> None:
+        self._bits = bytearray((self.tam + 7) // 8)
+        for i in self._reservadas():
+            self._set(i, True)
+        self._libres = []
+        self._siguiente = 0
+        self._usados = 0
+
+    def _indice(self, direccion: str) -> int | None:
+        try:
+            ip = ipaddress.ip_address(direccion.split('/')[0].strip())
+        except ValueError:
+            return None
+        if ip.version != self.red.version:
+            return None
+        i = int(ip) - int(self.red.network_address)
+        return i if 0 <= i < self.tam else None
+
+    def _direccion(self, i: int) -> str:
+        ip = self.red.network_address + i
+        return f"{ip}/{self.red.max_prefixlen}"
+
+    # ========================= API =========================
+    def allocate(self) -> str:
+        """Devuelve una dirección libre (con /32 o /128) y la marca ocupada."""
+        with self._lock:
+            direccion = self._allocate()
+            self._guardar()
+            return direccion
+
+    def allocate_many(self, n: int) -> list[str]:
+        """Asigna *n* direcciones con una sola escritura del bitmap."""
+        with self._lock:
+            asignadas = []
+            try:
+                for _ in range(n):
+                    asignadas.append(self._allocate())
+            except RuntimeError:
+                for d in asignadas:
+                    self._free(d)
+                raise
+            self._guardar()
+            return asignadas
+
+    def _allocate(self) -> str:
+        while self._libres:
+            i = self._libres.pop()
+            if not self._get(i):
+                break
+        else:
+            while self._siguiente < self.tam and self._get(self._siguiente):
+                self._siguiente += 1
+            if self._siguiente >= self.tam:
+                raise RuntimeError(f"No quedan direcciones libres en {self.red}")
+            i = self._siguiente
+            self._siguiente += 1
+        self._set(i, True)
+        self._usados += 1
+        return self._direccion(i)
+
+    def free(self, direccion: str | None) -> bool:
+        """Libera *direccion*; True si estaba ocupada."""
+        if not direccion:
+            return False
+        with self._lock:
+            if not self._free(direccion):
+                return False
+            self._guardar()
+            return True
+
+    def free_many(self, direcciones) -> int:
+        with self._lock:
+            liberadas = sum(1 for d in direcciones if d and self._free(d))
+            if liberadas:
+                self._guardar()
+            return liberadas
+
+    def _free(self, direccion: str) -> bool:
+        i = self._indice(direccion)
+        if i is None or i in self._reservadas() or not self._get(i):
+            return False
+        self._set(i, False)
+        self._libres.append(i)
+        self._usados -= 1
+        return True
+
+    def mark_used(self, direccion: str) -> bool:
+        with self._lock:
+            i = self._indice(direccion)
+            if i is None or self._get(i):
+                return False
+            self._set(i, True)
+            self._usados += 1
+            self._guardar()
+            return True
+
+    def is_used(self, direccion: str) -> bool:
+        with self._lock:
+            i = self._indice(direccion)
+            return i is not None and self._get(i)
+
+    def reconcile(self, direcciones) -> int:
+        """
+        Reconstruye el índice desde cero con *direcciones* ocupadas (wg0.conf +
+        registro). Devuelve cuántas quedan ocupadas (sin contar reservadas).
+        """
+        with self._lock:
+            self._reset()
+            for d in direcciones:
+                i = self._indice(d) if d else None
+                if i is not None and not self._get(i):
+                    self._set(i, True)
+                    self._usados += 1
+            self._guardar()
+            return self._usados
+
+    def stats(self) -> tuple[int, int]:
+        """(ocupadas, capacidad) sin contar reservadas."""
+        with self._lock:
+            return self._usados, self.tam - len(self._reservadas())
+
+    # ========================= PERSISTENCIA =========================
+    # Formato: una línea JSON de cabecera + el bitmap en bruto.
+    def _cargar(self) -> bool:
+        if not os.path.isfile(self.path):
+            return False
+        try:
+            with open(self.path, 'rb') as f:
+                cabecera = json.loads(f.readline())
+                bits = f.read()
+        except (OSError, ValueError) as e:
+            print(f"[ip_allocator] No se pudo leer {self.path}: {e}")
+            return False
+        if cabecera.get('red') != str(self.red) or cabecera.get('tam') != self.tam \
+                or len(bits) != len(self._bits):
+            return False  # cambió la subred: se reconstruye
+        self._bits = bytearray(bits)
+        self._usados = sum(bin(b).count('1') for b in self._bits) - len(self._reservadas())
+        self._libres = []
+        self._siguiente = 0
+        return True
+
+    def _guardar(self) -> None:
+        if not self.path:
+            return
+        folder = os.path.dirname(self.path) or '.'
+        os.makedirs(folder, exist_ok=True)
+        cabecera = json.dumps({'red': str(self.red), 'tam': self.tam}).encode() + b'\n'
+        with locked(self.path):
+            fd, tmp = tempfile.mkstemp(prefix='.ip_pool.', dir=folder)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(cabecera)
+                    f.write(self._bits)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, self.path)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.unlink(tmp)
+                raise
+
+
+# ========================= INSTANCIA COMPARTIDA =========================
+_allocator = None
+_allocator_lock = threading.Lock()
+
+def direcciones_en_uso() -> set[str]:
+    """Direcciones ocupadas según wg0.conf y los clientes activos del registro."""
+    from client_store import get_client_store
+    from wg_server_config import cargar
+
+    usadas = {
+        rec.direccion for rec in get_client_store().records().values()
+        if rec.direccion and rec.activa
+    }
+    try:
+        usadas |= cargar().direcciones()
+    except Exception as e:
+        print(f"[ip_allocator] No se pudo leer wg0.conf al reconciliar: {e}")
+    return usadas
+
+def get_ip_allocator() -> IpAllocator:
+    """
+    Devuelve el asignador compartido. La primera vez reconcilia el bitmap
+    con wg0.conf y el registro (arranque).
+    """
+    global _allocator
+    if _allocator is None:
+        with _allocator_lock:
+            if _allocator is None:
+                allocator = IpAllocator()
+                ocupadas = allocator.reconcile(direcciones_en_uso())
+                print(f"[ip_allocator] {ocupadas} direcciones ocupadas en {allocator.red}")
+                _allocator = allocator
+    return _allocator
@@ -2,7 +2,6 @@
 
 import os
 import threading
-import time
 from datetime import datetime
 from telebot import TeleBot
 
@@ -10,65 +9,126 @@ from config import (
     BOT_TOKEN,
     ADMIN_ID,
     SCRIPT_PATH,
-    CLIENTS_DIR
+    CLIENTS_DIR,
+    AUTO_DESACTIVAR_VENCIDAS,
+    BOT_MODE,
+    TELEMETRIA_INTERVALO
 )
-from storage import load_json  # para leer configuraciones
+from client_store import get_client_store  # registro de clientes
+from expiration_scheduler import ExpirationScheduler
+from revocation import RevocationEngine, formatear_informe
+from ip_allocator import get_ip_allocator
+from peer_telemetry import get_peer_telemetry, formatear_bytes
+from quota_engine import get_quota_engine, hay_cuotas
+from outbound import instalar as instalar_outbound, avisar_admin
 from admin_handlers import register_admin_handlers  # tus handlers de admin
 from payments_handlers import register_payments_handlers  # ⬅️ agrega /planes y flujo de pagos
+from client_handlers import register_client_handlers  # panel de cliente (/start de no-admins)
+from utils import usuario_de_cliente
 
-# Ruta al JSON donde guardas tus metadatos de clientes
-CONFIGS_FILE = os.path.join(CLIENTS_DIR, "configuraciones.json")
 # Umbral en horas para disparar la notificación antes de expirar
 ALERT_THRESHOLD_HOURS = 1.0
 
-bot = TeleBot(BOT_TOKEN)
+# En modo async/webhook los handlers se ejecutan en los workers de
+# async_runtime/webhook_server: el TeleBot no debe lanzar sus propios hilos
+bot = TeleBot(BOT_TOKEN, threaded=(BOT_MODE == 'polling'))
+
+# Todos los envíos (handlers, vigilante, cola) pasan por el despachador con límites
+instalar_outbound(bot)
 
 def is_admin(user_id):
     return user_id == ADMIN_ID
 
-def expiration_watcher():
+def _alertar_vencimiento(client, venc):
+    hours_left = max((venc - datetime.now()).total_seconds() / 3600, 0)
+    avisar_admin(
+        f"⚠️ La configuración *{client}* vencerá en aproximadamente "
+        f"*{hours_left:.1f}* horas (vence {venc.strftime('%d/%m/%Y %I:%M %p')}).",
+        bot=bot
+    )
+
+def _al_vencer(vencidos):
+    """Revoca en lote los peers vencidos en este despertar e informa al ADMIN."""
+    if not AUTO_DESACTIVAR_VENCIDAS:
+        return
+    informe = RevocationEngine().revoke([client for client, _ in vencidos])
+    avisar_admin(formatear_informe(informe), bot=bot)
+
+def _avisar_cuota(avisos):
+    """Clientes que pasaron CUOTA_AVISO de su cuota en esta muestra (un aviso agrupado)."""
+    lines = ["📶 *Cuota de datos casi agotada:*"]
+    for client, uso, cuota in avisos:
+        lines.append(f"• {client}: {formatear_bytes(uso)} de {formatear_bytes(cuota)}")
+        uid = usuario_de_cliente(client)
+        if uid:
+            bot.send_message(uid, f"⚠️ Has usado {formatear_bytes(uso)} de los "
+                                  f"{formatear_bytes(cuota)} de tu plan.")
+    avisar_admin("\n".join(lines), bot=bot)
+
+def _informar_suspension(excedidos, error):
+    """Resultado de suspender en lote los clientes que agotaron su cuota."""
+    nombres = ", ".join(client for client, _, _ in excedidos)
+    if error:
+        return avisar_admin(f"⚠️ No se pudo suspender por cuota a {nombres}: {error}", bot=bot)
+    avisar_admin(f"🚫 *Suspendidos por cuota agotada* ({len(excedidos)}): {nombres}", bot=bot)
+    for client, _, _ in excedidos:
+        uid = usuario_de_cliente(client)
+        if uid:
+            bot.send_message(uid, "🚫 Has agotado los datos de tu plan. "
+                                  "Tu conexión se reactivará al renovar.")
+
+def crear_scheduler() -> ExpirationScheduler:
     """
-    Hilo en segundo plano que cada hora revisa todas las configuraciones
-    y alerta al ADMIN si alguna vence en las próximas ALERT_THRESHOLD_HOURS.
+    Planificador de vencimientos (min-heap): alerta al ADMIN ALERT_THRESHOLD_HOURS
+    antes de que venza cada configuración y, con AUTO_DESACTIVAR_VENCIDAS, al
+    vencer revoca los peers en lote. Las altas, renovaciones y bajas le llegan
+    como eventos del ClientStore.
     """
-    notified = set()
-    while True:
-        try:
-            if os.path.exists(CONFIGS_FILE):
-                data = load_json(CONFIGS_FILE)
-            else:
-                data = {}
-            now = datetime.now()
-            for client, info in data.items():
-                venc_str = info.get('vencimiento')
-                if not venc_str:
-                    continue
-                # Ajusta el formato según cómo lo guardas en tu JSON
-                venc = datetime.strptime(venc_str, "%Y-%m-%d %H:%M")
-                hours_left = (venc - now).total_seconds() / 3600
-                key = (client, venc_str)
-                if 0 < hours_left <= ALERT_THRESHOLD_HOURS and key not in notified:
-                    bot.send_message(
-                        ADMIN_ID,
-                        f"⚠️ La configuración *{client}* vencerá en aproximadamente "
-                        f"*{hours_left:.1f}* horas (vence {venc.strftime('%d/%m/%Y %I:%M %p')}).",
-                        parse_mode="Markdown"
-                    )
-                    notified.add(key)
-        except Exception as e:
-            # En caso de error lo mostramos por consola y seguimos
-            print(f"[expiration_watcher] error: {e}")
-        # Espera una hora antes de la próxima comprobación
-        time.sleep(3600)
+    store = get_client_store()
+    scheduler = ExpirationScheduler(
+        on_alert=_alertar_vencimiento,
+        on_expire=_al_vencer,
+        alerta_horas=ALERT_THRESHOLD_HOURS
+    )
+    store.add_listener(scheduler.on_store_event)
+    scheduler.load(store.records())
+    return scheduler
+
+def expiration_watcher():
+    """Hilo en segundo plano que duerme hasta el próximo vencimiento programado."""
+    crear_scheduler().run()
 
 if __name__ == '__main__':
-    # Inicia el hilo que vigila vencimientos
-    watcher_thread = threading.Thread(target=expiration_watcher, daemon=True)
-    watcher_thread.start()
+    # Reconciliar el índice de direcciones con wg0.conf y el registro
+    get_ip_allocator()
 
     # Registra tus handlers
     register_admin_handlers(bot)
     register_payments_handlers(bot)  # ⬅️ habilita /planes y el flujo de compra
+    register_client_handlers(bot)
+
+    # Telemetría de peers: una muestra de `wg show dump` cada TELEMETRIA_INTERVALO s
+    if TELEMETRIA_INTERVALO > 0:
+        if hay_cuotas():
+            # Cuotas por plan: consumo sumado en cada muestra, avisos y suspensiones en lote
+            motor = get_quota_engine()
+            motor.on_aviso = _avisar_cuota
+            motor.on_suspension = _informar_suspension
+        threading.Thread(target=get_peer_telemetry().run, daemon=True).start()
+
+    if BOT_MODE == 'async':
+        # Long polling en asyncio; el vigilante de vencimientos es una tarea más
+        from async_runtime import run_async_bot
+        run_async_bot(bot, crear_scheduler())
+    else:
+        # Inicia el hilo que vigila vencimientos
+        watcher_thread = threading.Thread(target=expiration_watcher, daemon=True)
+        watcher_thread.start()
 
-    # Iniciar el polling infinito para escuchar mensajes
-    bot.infinity_polling()
+        if BOT_MODE == 'webhook':
+            # Telegram nos envía los updates; se procesan en los workers del servidor
+            from webhook_server import run_webhook_bot
+            run_webhook_bot(bot)
+        else:
+            # Iniciar el polling infinito para escuchar mensajes
+            bot.infinity_polling()
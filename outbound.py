@@ -0,0 +1,249 @@
+# outbound.py
+#
+# Despachador central de envíos a Telegram.
+# - instalar(bot) envuelve bot.send_message/send_photo/send_document/edit_*/
+#   answer_callback_query: todo envío (handlers, vigilante, cola de
+#   aprovisionamiento) pasa por aquí sin cambiar las llamadas existentes.
+# - Límites con cubetas de tokens: una global (ENVIO_GLOBAL_POR_SEG) y una por
+#   chat (ENVIO_CHAT_POR_SEG, con ráfaga ENVIO_CHAT_RAFAGA). El hilo que envía
+#   espera su turno; el valor de retorno (Message) no cambia.
+# - 429: espera el retry_after que indica Telegram y reintenta (y frena ese chat).
+#   Errores transitorios (5xx, conexión, timeout): reintento con backoff
+#   exponencial y jitter, hasta ENVIO_REINTENTOS veces. Otros 4xx se propagan.
+# - avisar_admin(texto): agrupa los avisos al ADMIN que llegan dentro de
+#   ALERTAS_VENTANA segundos en un solo mensaje.
+
+import random
+import threading
+import time
+from functools import wraps
+
+import requests
+from telebot import TeleBot
+from telebot.apihelper import ApiTelegramException
+
+from config import (
+    ADMIN_ID,
+    ENVIO_GLOBAL_POR_SEG,
+    ENVIO_CHAT_POR_SEG,
+    ENVIO_CHAT_RAFAGA,
+    ENVIO_REINTENTOS,
+    ALERTAS_VENTANA,
+)
+
+# Métodos que envían a un chat (primer argumento chat_id) y los que solo reintentan
+METODOS_CHAT = ('send_message', 'send_photo', 'send_document', 'edit_message_text', 'edit_message_reply_markup')
+METODOS_SIN_CHAT = ('answer_callback_query',)
+
+# Longitud máxima de un mensaje de Telegram
+MAX_TEXTO = 4096
+
+
+class TokenBucket:
+    """Cubeta de tokens; reservar() devuelve cuántos segundos hay que esperar."""
+
+    def __init__(self, por_segundo: float, capacidad: float):
+        self.rate = por_segundo
+        self.capacidad = capacidad
+        self.tokens = capacidad
+        self.t = time.monotonic()
+        self.bloqueado_hasta = 0.0
+
+    def reservar(self, ahora: float) -> float:
+        self.tokens = min(self.capacidad, self.tokens + (ahora - self.t) * self.rate)
+        self.t = ahora
+        self.tokens -= 1
+        espera = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+        return max(espera, self.bloqueado_hasta - ahora)
+
+    def lleno(self, ahora: float) -> bool:
+        return (self.tokens + (ahora - self.t) * self.rate >= self.capacidad
+                and ahora >= self.bloqueado_hasta)
+
+
+class OutboundDispatcher:
+
+    def __init__(self, bot: TeleBot, global_por_seg: float = ENVIO_GLOBAL_POR_SEG,
+                 chat_por_seg: float = ENVIO_CHAT_POR_SEG, chat_rafaga: float = ENVIO_CHAT_RAFAGA,
+                 reintentos: int = ENVIO_REINTENTOS, ventana_alertas: float = ALERTAS_VENTANA):
+        self.bot = bot
+        self.chat_por_seg = chat_por_seg
+        self.chat_rafaga = chat_rafaga
+        self.reintentos = reintentos
+        self.ventana_alertas = ventana_alertas
+        self._lock = threading.Lock()
+        self._global = TokenBucket(global_por_seg, global_por_seg)
+        self._chats = {}
+        self._alertas = {}          # parse_mode -> [textos]
+        self._timer = None
+        self.enviados = 0
+        self.limitados = 0          # 429 recibidos
+        self.reintentados = 0
+        self.espera_total = 0.0
+        self.alertas_agrupadas = 0
+
+    # ========================= INSTALACIÓN =========================
+    def instalar(self) -> 'OutboundDispatcher':
+        for nombre in METODOS_CHAT + METODOS_SIN_CHAT:
+            original = getattr(self.bot, nombre)
+            setattr(self.bot, nombre, self._envolver(original, nombre in METODOS_CHAT))
+        return self
+
+    def _envolver(self, original, por_chat: bool):
+        @wraps(original)
+        def envio(*args, **kwargs):
+            chat_id = (args[0] if args else kwargs.get('chat_id')) if por_chat else None
+            return self._enviar(original, chat_id, args, kwargs)
+        return envio
+
+    # ========================= LÍMITES =========================
+    def _esperar_turno(self, chat_id) -> None:
+        with self._lock:
+            ahora = time.monotonic()
+            espera = self._global.reservar(ahora)
+            if chat_id is not None:
+                cubeta = self._chats.get(chat_id)
+                if cubeta is None:
+                    if len(self._chats) > 10000:
+                        self._purgar(ahora)
+                    cubeta = self._chats[chat_id] = TokenBucket(self.chat_por_seg, self.chat_rafaga)
+                espera = max(espera, cubeta.reservar(ahora))
+            if espera > 0:
+                self.espera_total += espera
+        if espera > 0:
+            time.sleep(espera)
+
+    def _purgar(self, ahora: float) -> None:
+        """Olvida las cubetas de chats inactivos (bajo self._lock)."""
+        self._chats = {c: b for c, b in self._chats.items() if not b.lleno(ahora)}
+
+    def _frenar_chat(self, chat_id, segundos: float) -> None:
+        with self._lock:
+            cubeta = self._chats.get(chat_id)
+            if cubeta is not None:
+                cubeta.bloqueado_hasta = max(cubeta.bloqueado_hasta, time.monotonic() + segundos)
+
+    # ========================= ENVÍO =========================
+    def _enviar(self, original, chat_id, args, kwargs):
+        posiciones = _posiciones(args, kwargs)
+        intento = 0
+        while True:
+            self._esperar_turno(chat_id)
+            _rebobinar(posiciones)
+            try:
+                resultado = original(*args, **kwargs)
+                with self._lock:
+                    self.enviados += 1
+                return resultado
+            except ApiTelegramException as e:
+                if intento >= self.reintentos or (e.error_code < 500 and e.error_code != 429):
+                    raise
+                if e.error_code == 429:
+                    retry_after = _retry_after(e)
+                    with self._lock:
+                        self.limitados += 1
+                    print(f"[outbound] 429 en chat {chat_id}: espero {retry_after}s")
+                    if chat_id is None:
+                        time.sleep(retry_after)
+                    else:
+                        self._frenar_chat(chat_id, retry_after)
+                else:
+                    _backoff(intento)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if intento >= self.reintentos:
+                    raise
+                _backoff(intento)
+            intento += 1
+            with self._lock:
+                self.reintentados += 1
+
+    # ========================= ALERTAS AL ADMIN =========================
+    def avisar_admin(self, texto: str, parse_mode: str | None = "Markdown") -> None:
+        """Encola un aviso para el ADMIN; los de la misma ventana salen juntos."""
+        with self._lock:
+            self._alertas.setdefault(parse_mode, []).append(texto)
+            if self._timer is None:
+                self._timer = threading.Timer(self.ventana_alertas, self.flush_alertas)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush_alertas(self) -> None:
+        with self._lock:
+            pendientes, self._alertas = self._alertas, {}
+            self._timer = None
+        for parse_mode, textos in pendientes.items():
+            if len(textos) > 1:
+                with self._lock:
+                    self.alertas_agrupadas += len(textos) - 1
+            for bloque in _agrupar(textos):
+                try:
+                    self.bot.send_message(ADMIN_ID, bloque, parse_mode=parse_mode)
+                except Exception as e:
+                    print(f"[outbound] no se pudo avisar al admin: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'enviados': self.enviados,
+                'limitados': self.limitados,
+                'reintentados': self.reintentados,
+                'espera_total': self.espera_total,
+                'alertas_agrupadas': self.alertas_agrupadas,
+            }
+
+
+def _backoff(intento: int) -> None:
+    time.sleep(min(30.0, 0.5 * 2 ** intento) * random.uniform(0.5, 1.5))
+
+
+def _retry_after(e: ApiTelegramException) -> float:
+    try:
+        return float(e.result_json['parameters']['retry_after'])
+    except (KeyError, TypeError, ValueError):
+        return 1.0
+
+
+def _posiciones(args, kwargs) -> list:
+    """(fichero, posición) de los argumentos que son ficheros (para reintentar)."""
+    return [(a, a.tell()) for a in list(args) + list(kwargs.values())
+            if hasattr(a, 'seek') and hasattr(a, 'tell')]
+
+
+def _rebobinar(posiciones: list) -> None:
+    for f, pos in posiciones:
+        f.seek(pos)
+
+
+def _agrupar(textos: list[str]) -> list[str]:
+    """Une los textos en mensajes de hasta MAX_TEXTO caracteres."""
+    bloques, actual = [], ""
+    for texto in textos:
+        texto = texto[:MAX_TEXTO]
+        if actual and len(actual) + 2 + len(texto) > MAX_TEXTO:
+            bloques.append(actual)
+            actual = texto
+        else:
+            actual = f"{actual}\n\n{texto}" if actual else texto
+    if actual:
+        bloques.append(actual)
+    return bloques
+
+
+# ========================= INSTANCIA COMPARTIDA =========================
+_dispatcher = None
+
+def instalar(bot: TeleBot) -> OutboundDispatcher:
+    """Instala el despachador sobre *bot* (una vez, al arrancar)."""
+    global _dispatcher
+    _dispatcher = OutboundDispatcher(bot).instalar()
+    return _dispatcher
+
+def get_outbound() -> OutboundDispatcher | None:
+    return _dispatcher
+
+def avisar_admin(texto: str, parse_mode: str | None = "Markdown", bot: TeleBot | None = None) -> None:
+    """Aviso agrupado al ADMIN; sin despachador instalado, envío directo con *bot*."""
+    if _dispatcher is not None:
+        _dispatcher.avisar_admin(texto, parse_mode)
+    elif bot is not None:
+        bot.send_message(ADMIN_ID, texto, parse_mode=parse_mode)
@@ -0,0 +1,305 @@
+# payment_store.py
+#
+# Pedidos de compra (flujo /planes) en SQLite, en lugar del dict PENDIENTES.
+# - Un pedido por fila con estado explícito; sobrevive a reinicios.
+# - Como mucho un pedido abierto por usuario (índice único parcial); los abiertos
+#   se cachean en memoria por user_id, así los filtros de los handlers hacen una
+#   sola búsqueda en un dict por mensaje.
+# - Transiciones con compare-and-set (UPDATE ... WHERE estado IN (...)): aprobar o
+#   rechazar dos veces el mismo pedido no tiene efecto la segunda vez.
+# - Caducidad: los pedidos abandonados pasan a 'caducado' tras PAGO_TTL_HORAS sin
+#   cambios (PAGO_TTL_REVISION_HORAS si esperan al admin); los cerrados se borran
+#   tras PAGO_RETENCION_DIAS.
+#
+# Estados:
+#   plan -> metodo -> comprobante -> [confirmacion (CUP)] -> revision
+#        -> aprobando -> aprobado | fallido
+#   revision -> rechazado;  cualquiera abierto -> cancelado | caducado
+#
+# Ventas: al pasar un pedido a 'aprobado' se suma, en la misma transacción, una
+# venta (y el 'precio' del plan en PLANS, si lo tiene) a ventas_dia(dia, plan).
+
+import os
+import sqlite3
+import threading
+import time
+
+from config import CLIENTS_DIR, PLANS, PAGO_TTL_HORAS, PAGO_TTL_REVISION_HORAS, PAGO_RETENCION_DIAS
+
+DB_FILE = os.path.join(CLIENTS_DIR, 'pagos.db')
+
+SCHEMA_VERSION = 2
+
+# Estados
+PLAN = 'plan'
+METODO = 'metodo'
+COMPROBANTE = 'comprobante'
+CONFIRMACION = 'confirmacion'
+REVISION = 'revision'
+APROBANDO = 'aprobando'
+APROBADO = 'aprobado'
+FALLIDO = 'fallido'
+RECHAZADO = 'rechazado'
+CANCELADO = 'cancelado'
+CADUCADO = 'caducado'
+
+ABIERTOS = (PLAN, METODO, COMPROBANTE, CONFIRMACION, REVISION, APROBANDO)
+EN_CURSO = (PLAN, METODO, COMPROBANTE, CONFIRMACION)   # todavía los rellena el cliente
+
+# Cada cuánto se revisan caducidades como mucho (segundos)
+INTERVALO_CADUCIDAD = 60
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS pedidos (
+    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id         INTEGER NOT NULL,
+    estado          TEXT NOT NULL,
+    plan            TEXT,
+    metodo          TEXT,
+    receipt_file_id TEXT,
+    confirmacion    TEXT,
+    first_name      TEXT,
+    username        TEXT,
+    cliente         TEXT,
+    creado          REAL NOT NULL,
+    actualizado     REAL NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_pedidos_abierto ON pedidos(user_id)
+    WHERE estado IN {ABIERTOS!r};
+CREATE INDEX IF NOT EXISTS idx_pedidos_estado ON pedidos(estado, actualizado);
+CREATE TABLE IF NOT EXISTS ventas_dia (
+    dia     TEXT NOT NULL,
+    plan    TEXT NOT NULL,
+    ventas  INTEGER NOT NULL DEFAULT 0,
+    importe REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (dia, plan)
+);
+"""
+
+_COLS = ("id", "user_id", "estado", "plan", "metodo", "receipt_file_id", "confirmacion",
+         "first_name", "username", "cliente", "creado", "actualizado")
+_CAMPOS = set(_COLS) - {"id", "user_id", "creado", "actualizado", "estado"}
+
+
+def _row_to_dict(row) -> dict:
+    return dict(zip(_COLS, row))
+
+
+class PaymentStore:
+    """Pedidos de compra. Seguro entre hilos (una conexión protegida por un lock)."""
+
+    def __init__(self, path: str = DB_FILE):
+        folder = os.path.dirname(path)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder, exist_ok=True)
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._init_schema()
+        self._ultima_caducidad = 0.0
+        # Caché de pedidos abiertos: {user_id: pedido}
+        self._abiertos = {}
+        self.caducar()
+        self._cargar_abiertos()
+
+    def _init_schema(self) -> None:
+        with self._lock:
+            version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < SCHEMA_VERSION:
+                self._conn.executescript(_SCHEMA)
+                self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _cargar_abiertos(self) -> None:
+        marcas = ",".join("?" * len(ABIERTOS))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(_COLS)} FROM pedidos WHERE estado IN ({marcas})", ABIERTOS
+            ).fetchall()
+            self._abiertos = {r[1]: _row_to_dict(r) for r in rows}
+
+    # ========================= LECTURA =========================
+    def abierto(self, user_id: int) -> dict | None:
+        """Pedido abierto de *user_id* (copia) o None. Sin tocar la base."""
+        self._caducar_si_toca()
+        pedido = self._abiertos.get(user_id)
+        return dict(pedido) if pedido else None
+
+    def estado(self, user_id: int) -> str | None:
+        """Estado del pedido abierto de *user_id*: una búsqueda en un dict."""
+        pedido = self._abiertos.get(user_id)
+        return pedido['estado'] if pedido else None
+
+    def get(self, pedido_id: int) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(_COLS)} FROM pedidos WHERE id = ?", (pedido_id,)
+            ).fetchone()
+        return _row_to_dict(row) if row else None
+
+    def en_estado(self, *estados: str) -> list[dict]:
+        marcas = ",".join("?" * len(estados))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(_COLS)} FROM pedidos WHERE estado IN ({marcas}) ORDER BY id", estados
+            ).fetchall()
+        return [_row_to_dict(r) for r in rows]
+
+    # ========================= ESCRITURA =========================
+    def abrir(self, user_id: int, first_name: str = '', username: str = '') -> tuple[bool, dict]:
+        """
+        Abre un pedido nuevo en estado 'plan', cancelando el que el usuario
+        estuviera rellenando. Si tiene uno en revisión o aprobándose devuelve
+        (False, ese pedido).
+        """
+        self._caducar_si_toca()
+        ahora = time.time()
+        with self._lock:
+            actual = self._abiertos.get(user_id)
+            if actual and actual['estado'] not in EN_CURSO:
+                return False, dict(actual)
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if actual:
+                    self._conn.execute("UPDATE pedidos SET estado = ?, actualizado = ? WHERE id = ?",
+                                       (CANCELADO, ahora, actual['id']))
+                cur = self._conn.execute(
+                    "INSERT INTO pedidos (user_id, estado, first_name, username, creado, actualizado) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (user_id, PLAN, first_name, username, ahora, ahora)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            pedido = {c: None for c in _COLS}
+            pedido.update(id=cur.lastrowid, user_id=user_id, estado=PLAN, first_name=first_name,
+                          username=username, creado=ahora, actualizado=ahora)
+            self._abiertos[user_id] = pedido
+            return True, dict(pedido)
+
+    def transicion(self, pedido_id: int, desde: tuple, hacia: str, **campos) -> dict | None:
+        """
+        Pasa el pedido de cualquiera de los estados *desde* a *hacia* (y actualiza
+        *campos*) de forma atómica. Devuelve el pedido actualizado, o None si ya
+        no estaba en *desde* (p. ej. doble pulsación de Aprobar).
+        """
+        desconocidos = set(campos) - _CAMPOS
+        if desconocidos:
+            raise ValueError(f"Campos desconocidos: {desconocidos}")
+        ahora = time.time()
+        sets = ", ".join(f"{c} = ?" for c in campos)
+        marcas = ",".join("?" * len(desde))
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                cur = self._conn.execute(
+                    f"UPDATE pedidos SET estado = ?, actualizado = ?{', ' if sets else ''}{sets} "
+                    f"WHERE id = ? AND estado IN ({marcas})",
+                    (hacia, ahora, *campos.values(), pedido_id, *desde)
+                )
+                if cur.rowcount and hacia == APROBADO:
+                    self._sumar_venta(pedido_id, ahora)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            if cur.rowcount == 0:
+                return None
+            pedido = self.get(pedido_id)
+            if pedido['estado'] in ABIERTOS:
+                self._abiertos[pedido['user_id']] = pedido
+            elif self._abiertos.get(pedido['user_id'], {}).get('id') == pedido_id:
+                del self._abiertos[pedido['user_id']]
+            return dict(pedido)
+
+    def _sumar_venta(self, pedido_id: int, ahora: float) -> None:
+        """Suma la venta del pedido a ventas_dia (dentro de la transacción de transicion)."""
+        plan = self._conn.execute("SELECT plan FROM pedidos WHERE id = ?", (pedido_id,)).fetchone()[0]
+        precio = PLANS.get(plan, {}).get('precio', 0)
+        self._conn.execute(
+            "INSERT INTO ventas_dia (dia, plan, ventas, importe) VALUES (?, ?, 1, ?) "
+            "ON CONFLICT(dia, plan) DO UPDATE SET ventas = ventas + 1, importe = importe + excluded.importe",
+            (time.strftime('%Y-%m-%d', time.localtime(ahora)), plan, precio)
+        )
+
+    def cancelar(self, user_id: int) -> dict | None:
+        """Cancela el pedido abierto de *user_id* (salvo si ya se está aprobando)."""
+        pedido = self._abiertos.get(user_id)
+        if not pedido:
+            return None
+        return self.transicion(pedido['id'], EN_CURSO + (REVISION,), CANCELADO)
+
+    # ========================= CADUCIDAD =========================
+    def _caducar_si_toca(self) -> None:
+        if time.time() - self._ultima_caducidad >= INTERVALO_CADUCIDAD:
+            self.caducar()
+
+    def caducar(self) -> int:
+        """Marca como 'caducado' lo abandonado y borra lo cerrado antiguo. Devuelve cuántos caducaron."""
+        ahora = time.time()
+        self._ultima_caducidad = ahora
+        marcas = ",".join("?" * len(EN_CURSO))
+        cerrados = (APROBADO, FALLIDO, RECHAZADO, CANCELADO, CADUCADO)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                n = self._conn.execute(
+                    f"UPDATE pedidos SET estado = ?, actualizado = ? "
+                    f"WHERE estado IN ({marcas}) AND actualizado < ?",
+                    (CADUCADO, ahora, *EN_CURSO, ahora - PAGO_TTL_HORAS * 3600)
+                ).rowcount
+                n += self._conn.execute(
+                    "UPDATE pedidos SET estado = ?, actualizado = ? WHERE estado = ? AND actualizado < ?",
+                    (CADUCADO, ahora, REVISION, ahora - PAGO_TTL_REVISION_HORAS * 3600)
+                ).rowcount
+                self._conn.execute(
+                    f"DELETE FROM pedidos WHERE estado IN ({','.join('?' * len(cerrados))}) AND actualizado < ?",
+                    (*cerrados, ahora - PAGO_RETENCION_DIAS * 86400)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            if n:
+                self._abiertos = {uid: p for uid, p in self._abiertos.items()
+                                  if not _caducado(p, ahora)}
+        if n:
+            print(f"[payment_store] {n} pedidos caducados")
+        return n
+
+    # ========================= VENTAS =========================
+    def ventas_por_dia(self, dias: int = 7) -> list[tuple[str, int, float]]:
+        """[(dia, ventas, importe)] de los últimos *dias* días con ventas, del más reciente."""
+        desde = time.strftime('%Y-%m-%d', time.localtime(time.time() - (dias - 1) * 86400))
+        with self._lock:
+            return self._conn.execute(
+                "SELECT dia, SUM(ventas), SUM(importe) FROM ventas_dia WHERE dia >= ? "
+                "GROUP BY dia ORDER BY dia DESC", (desde,)
+            ).fetchall()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _caducado(pedido: dict, ahora: float) -> bool:
+    if pedido['estado'] in EN_CURSO:
+        return pedido['actualizado'] < ahora - PAGO_TTL_HORAS * 3600
+    if pedido['estado'] == REVISION:
+        return pedido['actualizado'] < ahora - PAGO_TTL_REVISION_HORAS * 3600
+    return False
+
+
+# ========================= INSTANCIA COMPARTIDA =========================
+_store = None
+_store_lock = threading.Lock()
+
+def get_payment_store() -> PaymentStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = PaymentStore()
+    return _store
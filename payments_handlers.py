@@ -2,7 +2,6 @@
 
 import os
 import re
-import json
 from datetime import datetime
 from telebot import TeleBot
 from telebot.types import (
@@ -11,10 +10,15 @@ from telebot.types import (
     ReplyKeyboardRemove, Message, CallbackQuery
 )
 
-from config import ADMIN_ID, PLANS, CLIENTS_DIR
-from generator import create_config
-from utils import calcular_nuevo_vencimiento
-from storage import load_json, save_json
+from config import ADMIN_ID, PLANS
+from provisioning_queue import get_provisioning_queue
+from file_id_cache import enviar_documento, enviar_foto
+from outbound import avisar_admin
+from client_store import get_client_store
+from utils import calcular_nuevo_vencimiento, ruta_conf_cliente, ruta_qr_cliente
+import payment_store as ps
+from payment_store import get_payment_store
+from router import get_router
 
 # =========================
 # Config de pagos
@@ -26,22 +30,11 @@ SALDO_NUMBER = "56246700"
 # que envíe el "número de confirmación" del comprobante.
 CUP_CARD = "9204 1299 7691 8161"
 
-# Ruta del JSON global de configuraciones (mismo dir que usas para .conf/.png)
-CONFIGS_FILE = os.path.join(CLIENTS_DIR, 'configuraciones.json')
-
 # =========================
-# Estado temporal de compras
+# Estado de compras
 # =========================
-# Estructura:
-# PENDIENTES[user_id] = {
-#   'plan': <str>,
-#   'metodo': 'saldo' | 'cup',
-#   'receipt_file_id': <str|None>,
-#   'confirmacion': <str|None>,
-#   'first_name': <str|None>,
-#   'username': <str|None>,
-# }
-PENDIENTES = {}
+# Los pedidos viven en payment_store (SQLite, con estados explícitos y caducidad):
+# sobreviven a reinicios y aprobar/rechazar es idempotente.
 
 # =========================
 # Helpers UI
@@ -67,21 +60,26 @@ def _sanitize_name(s: str) -> str:
 # Registro de handlers
 # =========================
 def register_payments_handlers(bot: TeleBot):
+    pedidos = get_payment_store()
+    router = get_router(bot)
+    _recuperar_pedidos(bot)
 
     # -------------------------
     # /planes — inicio
     # -------------------------
-    @bot.message_handler(commands=['planes'])
+    @router.comando('planes')
     def planes_cmd(message: Message):
-        user_id = message.from_user.id
-        PENDIENTES[user_id] = {
-            'plan': None,
-            'metodo': None,
-            'receipt_file_id': None,
-            'confirmacion': None,
-            'first_name': message.from_user.first_name or '',
-            'username': message.from_user.username or ''
-        }
+        ok, pedido = pedidos.abrir(
+            message.from_user.id,
+            message.from_user.first_name or '',
+            message.from_user.username or ''
+        )
+        if not ok:
+            return bot.send_message(
+                message.chat.id,
+                "🕒 Ya tienes un pago en *revisión*. Te avisamos en cuanto el administrador lo revise.",
+                parse_mode="Markdown"
+            )
         texto = (
             "🗂 *Planes disponibles*\n\n"
             "• Free (5 horas)\n"
@@ -99,29 +97,30 @@ def register_payments_handlers(bot: TeleBot):
     # -------------------------
     # Selección de plan
     # -------------------------
-    @bot.message_handler(func=lambda m: m.text in list(PLANS.keys()) + ['🔙 Cancelar'])
+    @router.texto(*PLANS, '🔙 Cancelar')
     def seleccionar_plan(message: Message):
         user_id = message.from_user.id
 
         if message.text == '🔙 Cancelar':
-            PENDIENTES.pop(user_id, None)
+            pedidos.cancelar(user_id)
             return bot.send_message(
                 message.chat.id,
                 "✅ Operación cancelada.",
                 reply_markup=ReplyKeyboardRemove()
             )
 
-        if user_id not in PENDIENTES:
+        pedido = pedidos.abierto(user_id)
+        if pedido is None:
             # flujo no iniciado
-            PENDIENTES[user_id] = {
-                'first_name': message.from_user.first_name or '',
-                'username': message.from_user.username or ''
-            }
+            ok, pedido = pedidos.abrir(user_id, message.from_user.first_name or '',
+                                       message.from_user.username or '')
+            if not ok:
+                return bot.send_message(message.chat.id, "🕒 Ya tienes un pago en revisión.")
+        elif pedido['estado'] not in ps.EN_CURSO:
+            return bot.send_message(message.chat.id, "🕒 Ya tienes un pago en revisión.")
 
-        PENDIENTES[user_id]['plan'] = message.text
-        PENDIENTES[user_id]['metodo'] = None
-        PENDIENTES[user_id]['receipt_file_id'] = None
-        PENDIENTES[user_id]['confirmacion'] = None
+        pedidos.transicion(pedido['id'], ps.EN_CURSO, ps.METODO, plan=message.text,
+                           metodo=None, receipt_file_id=None, confirmacion=None)
 
         texto = (
             "💰 *Selecciona un método de pago:*\n\n"
@@ -138,15 +137,24 @@ def register_payments_handlers(bot: TeleBot):
     # -------------------------
     # Selección de método de pago
     # -------------------------
-    @bot.message_handler(func=lambda m: m.text in ['💳 Saldo', '🏦 Transferencia CUP'])
+    @router.texto('💳 Saldo', '🏦 Transferencia CUP')
     def seleccionar_metodo(message: Message):
         user_id = message.from_user.id
-        if user_id not in PENDIENTES or not PENDIENTES[user_id].get('plan'):
+        pedido = pedidos.abierto(user_id)
+        if not pedido or not pedido.get('plan') or pedido['estado'] not in ps.EN_CURSO:
             return bot.send_message(message.chat.id, "Primero elige un plan con /planes.")
 
         metodo = 'saldo' if message.text == '💳 Saldo' else 'cup'
-        PENDIENTES[user_id]['metodo'] = metodo
-
+        pedidos.transicion(pedido['id'], ps.EN_CURSO, ps.COMPROBANTE, metodo=metodo,
+                           receipt_file_id=None, confirmacion=None)
+
+        markup = InlineKeyboardMarkup()
+        markup.add(
+            InlineKeyboardButton(
+                "❌ Cancelar transacción",
+                callback_data=f"pago_cancelar:{user_id}"
+            )
+        )
         if metodo == 'saldo':
             # SIN pedir número de confirmación
             texto_saldo = (
@@ -155,13 +163,6 @@ def register_payments_handlers(bot: TeleBot):
                 "2) Envía aquí la *captura del comprobante*.\n\n"
                 "🕒 El administrador revisará tu pago y, si todo está bien, recibirás tu archivo y QR automáticamente."
             )
-            markup = InlineKeyboardMarkup()
-            markup.add(
-                InlineKeyboardButton(
-                    "❌ Cancelar transacción",
-                    callback_data=f"pago_cancelar:{user_id}"
-                )
-            )
             bot.send_message(
                 message.chat.id,
                 texto_saldo,
@@ -176,13 +177,6 @@ def register_payments_handlers(bot: TeleBot):
                 "3) Luego te pediré el número de confirmación de Transfermóvil.\n\n"
                 "🕒 El administrador revisará tu pago y, si todo está bien, recibirás tu archivo y QR automáticamente."
             )
-            markup = InlineKeyboardMarkup()
-            markup.add(
-                InlineKeyboardButton(
-                    "❌ Cancelar transacción",
-                    callback_data=f"pago_cancelar:{user_id}"
-                )
-            )
             bot.send_message(
                 message.chat.id,
                 texto_cup,
@@ -192,18 +186,20 @@ def register_payments_handlers(bot: TeleBot):
     # -------------------------
     # Recibo (foto) del cliente
     # -------------------------
-    @bot.message_handler(content_types=['photo'])
+    @router.contenido('photo')
     def recibir_captura(message: Message):
         user_id = message.from_user.id
-        if user_id not in PENDIENTES or not PENDIENTES[user_id].get('metodo'):
+        pedido = pedidos.abierto(user_id)
+        if not pedido or pedido['estado'] not in (ps.COMPROBANTE, ps.CONFIRMACION):
             return bot.send_message(message.chat.id, "Primero selecciona plan y método con /planes.")
 
         # Guardamos el file_id de la imagen de mayor resolución
         file_id = message.photo[-1].file_id
-        PENDIENTES[user_id]['receipt_file_id'] = file_id
 
-        if PENDIENTES[user_id]['metodo'] == 'cup':
+        if pedido['metodo'] == 'cup':
             # pedir número de confirmación
+            pedidos.transicion(pedido['id'], (ps.COMPROBANTE, ps.CONFIRMACION), ps.CONFIRMACION,
+                               receipt_file_id=file_id)
             bot.send_message(
                 message.chat.id,
                 "🔢 Envía ahora el *número de confirmación* de Transfermóvil:",
@@ -212,29 +208,26 @@ def register_payments_handlers(bot: TeleBot):
             return
 
         # Para SALDO, podemos enviar al admin sin pedir confirmación
-        _enviar_solicitud_al_admin(bot, message, require_confirm=False)
+        pedido = pedidos.transicion(pedido['id'], (ps.COMPROBANTE,), ps.COMPROBANTE, receipt_file_id=file_id)
+        _enviar_solicitud_al_admin(bot, message, pedido)
 
     # -------------------------
     # Número de confirmación (solo CUP)
     # -------------------------
-    @bot.message_handler(
-        func=lambda m: (
-            m.from_user.id in PENDIENTES
-            and PENDIENTES[m.from_user.id].get('metodo') == 'cup'
-            and PENDIENTES[m.from_user.id].get('receipt_file_id') is not None
-            and not PENDIENTES[m.from_user.id].get('confirmacion')
-            and m.text is not None
-        )
-    )
+    @router.predicado(lambda m: pedidos.estado(m.from_user.id) == ps.CONFIRMACION)
     def recibir_confirmacion_cup(message: Message):
-        user_id = message.from_user.id
-        PENDIENTES[user_id]['confirmacion'] = message.text.strip()
-        _enviar_solicitud_al_admin(bot, message, require_confirm=True)
+        pedido = pedidos.abierto(message.from_user.id)
+        if not pedido or not pedido.get('receipt_file_id'):
+            return
+        pedido = pedidos.transicion(pedido['id'], (ps.CONFIRMACION,), ps.CONFIRMACION,
+                                    confirmacion=message.text.strip())
+        if pedido:
+            _enviar_solicitud_al_admin(bot, message, pedido)
 
     # -------------------------
     # Callbacks del admin (Aprobar / Rechazar) y Cancelar del cliente
     # -------------------------
-    @bot.callback_query_handler(func=lambda c: c.data.startswith('pago_aprobar:') or c.data.startswith('pago_rechazar:') or c.data.startswith('pago_cancelar:'))
+    @router.callback('pago_aprobar', 'pago_rechazar', 'pago_cancelar')
     def callbacks_pago(call: CallbackQuery):
         # Cancelación por parte del cliente (botón inline)
         if call.data.startswith('pago_cancelar:'):
@@ -242,7 +235,10 @@ def register_payments_handlers(bot: TeleBot):
                 uid = int(call.data.split(':', 1)[1])
             except Exception:
                 return bot.answer_callback_query(call.id, "ID inválido.")
-            PENDIENTES.pop(uid, None)
+            if call.from_user.id not in (uid, ADMIN_ID):
+                return bot.answer_callback_query(call.id, "Sin permisos.")
+            if pedidos.cancelar(uid) is None and pedidos.estado(uid) == ps.APROBANDO:
+                return bot.answer_callback_query(call.id, "Tu pago ya fue aprobado.")
             bot.answer_callback_query(call.id, "Operación cancelada.")
             try:
                 bot.edit_message_reply_markup(call.message.chat.id, call.message.message_id, reply_markup=None)
@@ -255,90 +251,122 @@ def register_payments_handlers(bot: TeleBot):
         if call.from_user.id != ADMIN_ID:
             return bot.answer_callback_query(call.id, "Sin permisos.")
 
-        action, uid_str = call.data.split(':', 1)
+        action, pid_str = call.data.split(':', 1)
         try:
-            uid = int(uid_str)
+            pedido_id = int(pid_str)
         except ValueError:
             return bot.answer_callback_query(call.id, "ID inválido.")
 
-        data = PENDIENTES.get(uid)
-        if not data:
-            return bot.answer_callback_query(call.id, "Solicitud no encontrada o ya procesada.")
-
         if action == 'pago_rechazar':
+            pedido = pedidos.transicion(pedido_id, (ps.REVISION,), ps.RECHAZADO)
+            if not pedido:
+                return bot.answer_callback_query(call.id, "Solicitud no encontrada o ya procesada.")
             bot.answer_callback_query(call.id, "Rechazado.")
-            bot.send_message(uid, "❌ Tu pago fue *rechazado*. Revisa los datos e inténtalo otra vez.", parse_mode="Markdown")
-            PENDIENTES.pop(uid, None)
+            bot.send_message(pedido['user_id'], "❌ Tu pago fue *rechazado*. Revisa los datos e inténtalo otra vez.", parse_mode="Markdown")
             try:
                 bot.edit_message_reply_markup(call.message.chat.id, call.message.message_id, reply_markup=None)
             except Exception:
                 pass
             return
 
-        # Aprobar
-        plan = data['plan']
-        venc = calcular_nuevo_vencimiento(plan)
+        # Aprobar: revision -> aprobando es atómico; una segunda pulsación no hace nada
+        pedido = pedidos.get(pedido_id)
+        if not pedido or pedido['estado'] != ps.REVISION:
+            return bot.answer_callback_query(call.id, "Solicitud no encontrada o ya procesada.")
+        uid = pedido['user_id']
 
         # Nombre del cliente (generado). Puedes cambiarlo si luego pides nombre explícito
-        base_name = data.get('first_name') or data.get('username') or f"user{uid}"
-        safe_name = _sanitize_name(f"{base_name}_{uid}_{datetime.now().strftime('%m%d%H%M')}")
+        base_name = pedido.get('first_name') or pedido.get('username') or f"user{uid}"
+        # Se acorta la base y no el total: el uid tiene que quedar entero (utils.usuario_de_cliente)
+        safe_name = f"{_sanitize_name(base_name)[:20]}_{uid}_{datetime.now().strftime('%m%d%H%M')}"
+        pedido = pedidos.transicion(pedido_id, (ps.REVISION,), ps.APROBANDO, cliente=safe_name)
+        if not pedido:
+            return bot.answer_callback_query(call.id, "Solicitud no encontrada o ya procesada.")
 
-        ok, conf_path, qr_path = create_config(safe_name, venc)
+        ok, posicion = _encolar_creacion(bot, pedido)
         if not ok:
-            bot.answer_callback_query(call.id, "Error al crear config.")
-            bot.send_message(uid, f"❌ Ocurrió un error al generar tu configuración:\n{conf_path}")
-            PENDIENTES.pop(uid, None)
-            return
+            pedidos.transicion(pedido_id, (ps.APROBANDO,), ps.REVISION)
+            return bot.answer_callback_query(call.id, f"No se pudo encolar: {posicion}", show_alert=True)
 
-        # Guardar/actualizar el plan en configuraciones.json para futuras renovaciones
-        try:
-            data_json = load_json(CONFIGS_FILE)
-            if safe_name not in data_json:
-                data_json[safe_name] = {}
-            data_json[safe_name]['vencimiento'] = venc.strftime("%Y-%m-%d %H:%M")
-            data_json[safe_name]['activa'] = True
-            data_json[safe_name]['plan'] = plan
-            save_json(CONFIGS_FILE, data_json)
-        except Exception as e:
-            # No interrumpimos el envío al usuario si falla esta parte
-            print(f"[payments_handlers] No se pudo guardar plan en JSON: {e}")
-
-        # Enviar al cliente
-        caption = (
-            f"✅ *Compra aprobada*\n"
-            f"📦 Plan: *{plan}*\n"
-            f"👤 Cliente: *{safe_name}*\n"
-            f"📅 Vence: *{venc.strftime('%d/%m/%Y %I:%M %p')}*"
-        )
-        try:
-            with open(conf_path, 'rb') as f:
-                bot.send_document(uid, f, caption=caption, parse_mode="Markdown")
-            if os.path.exists(qr_path):
-                with open(qr_path, 'rb') as qrf:
-                    bot.send_photo(uid, qrf, caption="📷 Escanéame para importar rápido.")
-        except Exception as e:
-            bot.send_message(uid, f"⚠️ Configuración creada pero no pude enviarte los archivos: {e}")
-
-        bot.answer_callback_query(call.id, "Aprobado y enviado ✅")
+        bot.answer_callback_query(call.id, f"Aprobado ✅ En cola (posición {posicion})")
         try:
             bot.edit_message_reply_markup(call.message.chat.id, call.message.message_id, reply_markup=None)
         except Exception:
             pass
-        PENDIENTES.pop(uid, None)
+        bot.send_message(uid, "✅ Pago aprobado. Estamos generando tu configuración, te llegará en breve.")
+
+
+# =========================
+# Creación y entrega (cola de aprovisionamiento)
+# =========================
+def _encolar_creacion(bot: TeleBot, pedido: dict):
+    """
+    Encola la creación del cliente de un pedido en estado 'aprobando'.
+    create_config registra el cliente (plan, vencimiento) en el registro.
+    """
+    plan = pedido['plan']
+    venc = calcular_nuevo_vencimiento(plan)
+
+    def entregar(ok, resultado):
+        if not ok:
+            get_payment_store().transicion(pedido['id'], (ps.APROBANDO,), ps.FALLIDO)
+            bot.send_message(pedido['user_id'], f"❌ Ocurrió un error al generar tu configuración:\n{resultado}")
+            avisar_admin(f"❌ Falló la creación de {pedido['cliente']} (ID {pedido['user_id']}):\n{resultado}",
+                         parse_mode=None, bot=bot)
+            return
+        conf_path, qr_path = resultado
+        _entregar_archivos(bot, pedido, conf_path, qr_path, venc)
+
+    return get_provisioning_queue().submit_create(pedido['cliente'], plan, venc, on_done=entregar)
+
+
+def _entregar_archivos(bot: TeleBot, pedido: dict, conf_path: str, qr_path: str, venc: datetime):
+    uid = pedido['user_id']
+    caption = (
+        f"✅ *Compra aprobada*\n"
+        f"📦 Plan: *{pedido['plan']}*\n"
+        f"👤 Cliente: *{pedido['cliente']}*\n"
+        f"📅 Vence: *{venc.strftime('%d/%m/%Y %I:%M %p')}*"
+    )
+    try:
+        enviar_documento(bot, uid, conf_path, caption=caption, parse_mode="Markdown")
+        if os.path.exists(qr_path):
+            enviar_foto(bot, uid, qr_path, caption="📷 Escanéame para importar rápido.")
+    except Exception as e:
+        bot.send_message(uid, f"⚠️ Configuración creada pero no pude enviarte los archivos: {e}")
+    get_payment_store().transicion(pedido['id'], (ps.APROBANDO,), ps.APROBADO)
+
+
+def _recuperar_pedidos(bot: TeleBot):
+    """
+    Al arrancar: los pedidos que quedaron 'aprobando' (reinicio a mitad de la
+    creación) se entregan si el cliente ya existe, o se vuelven a encolar.
+    """
+    pendientes = get_payment_store().en_estado(ps.APROBANDO)
+    for pedido in pendientes:
+        rec = get_client_store().record(pedido['cliente'])
+        if rec and rec.vence and os.path.exists(ruta_conf_cliente(pedido['cliente'])):
+            _entregar_archivos(bot, pedido, ruta_conf_cliente(pedido['cliente']),
+                               ruta_qr_cliente(pedido['cliente']), rec.vencimiento)
+        else:
+            ok, motivo = _encolar_creacion(bot, pedido)
+            if not ok:
+                print(f"[payments_handlers] no se pudo reencolar el pedido {pedido['id']}: {motivo}")
+    if pendientes:
+        print(f"[payments_handlers] {len(pendientes)} pedidos aprobados recuperados")
 
 
 # =========================
 # Enviar solicitud al admin con foto + botones
 # =========================
-def _enviar_solicitud_al_admin(bot: TeleBot, message: Message, require_confirm: bool):
+def _enviar_solicitud_al_admin(bot: TeleBot, message: Message, pedido: dict):
     user_id = message.from_user.id
-    data = PENDIENTES.get(user_id, {})
-    if not data or not data.get('receipt_file_id'):
+    if not pedido or not pedido.get('receipt_file_id'):
         return bot.send_message(message.chat.id, "Falta la captura del comprobante.")
 
-    plan = data['plan']
-    metodo = data['metodo']
-    confirm_txt = data.get('confirmacion') if require_confirm else None
+    plan = pedido['plan']
+    metodo = pedido['metodo']
+    confirm_txt = pedido.get('confirmacion') if metodo == 'cup' else None
 
     texto = (
         f"📥 *Nueva solicitud de compra*\n"
@@ -351,15 +379,15 @@ def _enviar_solicitud_al_admin(bot: TeleBot, message: Message, require_confirm:
 
     markup = InlineKeyboardMarkup()
     markup.add(
-        InlineKeyboardButton("✅ Aprobar", callback_data=f"pago_aprobar:{user_id}"),
-        InlineKeyboardButton("❌ Rechazar", callback_data=f"pago_rechazar:{user_id}")
+        InlineKeyboardButton("✅ Aprobar", callback_data=f"pago_aprobar:{pedido['id']}"),
+        InlineKeyboardButton("❌ Rechazar", callback_data=f"pago_rechazar:{pedido['id']}")
     )
 
     # Enviar al admin
     try:
         bot.send_photo(
             ADMIN_ID,
-            data['receipt_file_id'],
+            pedido['receipt_file_id'],
             caption=texto,
             parse_mode="Markdown",
             reply_markup=markup
@@ -367,6 +395,8 @@ def _enviar_solicitud_al_admin(bot: TeleBot, message: Message, require_confirm:
     except Exception as e:
         return bot.send_message(message.chat.id, f"❌ Error al enviar al admin: {e}")
 
+    get_payment_store().transicion(pedido['id'], (ps.COMPROBANTE, ps.CONFIRMACION), ps.REVISION)
+
     # Avisar al cliente
     bot.send_message(
         message.chat.id,
@@ -0,0 +1,303 @@
+# peer_telemetry.py
+#
+# Telemetría en vivo de los peers WireGuard a partir de `wg show <if> dump`
+# (una sola llamada al proceso para todos los peers en cada muestra).
+# - Cada muestra guarda, por peer, el último handshake y los bytes recibidos/
+#   enviados en buffers circulares de tamaño fijo (array, memoria acotada:
+#   TELEMETRIA_MUESTRAS * 20 bytes por peer).
+# - Los contadores de `wg` se acumulan como totales monótonos (un reinicio de la
+#   interfaz pone los contadores a cero y no resta): el tráfico entre dos
+#   instantes es una resta, y el instante base se busca con bisect.
+# - Los peers que desaparecen del dump (revocados) se olvidan.
+# - Oyentes (add_listener) reciben tras cada muestra el tráfico de cada peer
+#   desde la anterior (p. ej. quota_engine.py para las cuotas de datos).
+#
+# Vistas: en línea ahora (handshake en los últimos TELEMETRIA_ONLINE_S
+# segundos), bytes de hoy (desde la medianoche en TELEMETRIA_ZONA, contados
+# desde que el colector ve al peer) y los que más consumen.
+#
+# Con TELEMETRIA_DUMP se lee el dump de ese fichero en vez de ejecutar `wg`
+# (pruebas; ver benchmarks/bench_telemetry.py --salida).
+#
+# rx = bytes que el servidor recibe del peer (subida del cliente),
+# tx = bytes que le envía (bajada del cliente).
+
+import bisect
+import heapq
+import threading
+import time
+from array import array
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from config import (
+    WG_INTERFACE,
+    TELEMETRIA_INTERVALO,
+    TELEMETRIA_MUESTRAS,
+    TELEMETRIA_ONLINE_S,
+    TELEMETRIA_ZONA,
+    TELEMETRIA_DUMP,
+)
+from client_store import get_client_store
+from wireguard import run_wg
+from wg_server_config import cargar
+
+
+# ========================= DUMP =========================
+def parse_dump(texto: str) -> list[tuple[str, str | None, int, int, int]]:
+    """
+    Peers de `wg show <if> dump`: [(public_key, endpoint, handshake, rx, tx)].
+    La primera línea (la interfaz, 4 campos) y las líneas mal formadas se ignoran.
+    """
+    peers = []
+    for linea in texto.splitlines():
+        campos = linea.split('\t')
+        if len(campos) != 8:
+            continue
+        key, _, endpoint, _, handshake, rx, tx, _ = campos
+        try:
+            peers.append((key, None if endpoint == '(none)' else endpoint,
+                          int(handshake), int(rx), int(tx)))
+        except ValueError:
+            continue
+    return peers
+
+
+# ========================= FORMATO =========================
+def formatear_bytes(n: int) -> str:
+    for unidad in ('B', 'KB', 'MB', 'GB'):
+        if n < 1024:
+            return f"{n:.0f} {unidad}" if unidad == 'B' else f"{n:.1f} {unidad}"
+        n /= 1024
+    return f"{n:.1f} TB"
+
+
+def formatear_hace(segundos: float) -> str:
+    segundos = max(0, int(segundos))
+    if segundos < 60:
+        return f"{segundos} s"
+    if segundos < 3600:
+        return f"{segundos // 60} min"
+    if segundos < 86400:
+        return f"{segundos // 3600} h {segundos % 3600 // 60} min"
+    return f"{segundos // 86400} días"
+
+
+def inicio_del_dia(ahora: float | None = None) -> float:
+    """Medianoche (en TELEMETRIA_ZONA) del día de *ahora*, como timestamp."""
+    tz = ZoneInfo(TELEMETRIA_ZONA)
+    dt = datetime.fromtimestamp(time.time() if ahora is None else ahora, tz)
+    return dt.replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+
+
+# ========================= NOMBRES =========================
+def _peers_conf() -> dict[str, str]:
+    """{nombre: PublicKey} de los comentarios de wg0.conf ({} si no se puede leer)."""
+    try:
+        return cargar().claves_por_nombre()
+    except OSError as e:
+        print(f"[peer_telemetry] no se pudo leer wg0.conf: {e}")
+        return {}
+
+
+def nombres_por_clave() -> dict[str, str]:
+    """
+    {public_key: nombre}: clave registrada de cada cliente y, para los peers
+    sin ella (altas con crear_cliente.sh), el comentario "# nombre" de wg0.conf.
+    """
+    nombres = {key: nombre for nombre, key in _peers_conf().items()}
+    nombres.update({r.public_key: r.nombre for r in get_client_store().records().values() if r.public_key})
+    return nombres
+
+
+def clave_de_cliente(nombre: str) -> str | None:
+    rec = get_client_store().record(nombre)
+    if rec and rec.public_key:
+        return rec.public_key
+    return _peers_conf().get(nombre)
+
+
+# ========================= SERIES =========================
+class _Serie:
+    """Buffers circulares de un peer; la posición de la muestra s es s % muestras."""
+    __slots__ = ('primera', 'handshake', 'rx', 'tx', 'ult_rx', 'ult_tx', 'endpoint')
+
+    def __init__(self, muestras: int, primera: int, rx: int, tx: int):
+        self.primera = primera            # primera muestra en la que aparece
+        self.handshake = array('I', bytes(4 * muestras))
+        self.rx = array('Q', bytes(8 * muestras))   # acumulado desde 'primera'
+        self.tx = array('Q', bytes(8 * muestras))
+        self.ult_rx, self.ult_tx = rx, tx           # contadores crudos de wg
+        self.endpoint = None
+
+
+class PeerTelemetry:
+
+    def __init__(self, muestras: int = TELEMETRIA_MUESTRAS, online_s: float = TELEMETRIA_ONLINE_S):
+        self.muestras = max(2, muestras)
+        self.online_s = online_s
+        self._lock = threading.Lock()
+        self._instantes = array('d', bytes(8 * self.muestras))
+        self._seq = 0                     # muestras tomadas
+        self._peers = {}                  # public_key -> _Serie
+        self._stop = threading.Event()
+        self._ultimo_error = None
+        self._listeners = []
+
+    def add_listener(self, fn) -> None:
+        """
+        Registra fn(instante, {public_key: (rx, tx)}) con el tráfico de cada peer
+        desde la muestra anterior (solo los que transfirieron algo). Se llama tras
+        cada muestra, fuera del lock y en el hilo del colector.
+        """
+        self._listeners.append(fn)
+
+    # ========================= MUESTREO =========================
+    def ingerir(self, dump: str, ahora: float | None = None) -> int:
+        """Añade una muestra a partir del texto del dump; devuelve cuántos peers trae."""
+        peers = parse_dump(dump)
+        ahora = time.time() if ahora is None else ahora
+        with self._lock:
+            seq, m = self._seq, self.muestras
+            pos, prev = seq % m, (seq - 1) % m
+            self._instantes[pos] = ahora
+            vivos, deltas = {}, {}
+            for key, endpoint, handshake, rx, tx in peers:
+                serie = self._peers.get(key)
+                if serie is None:
+                    serie = _Serie(m, seq, rx, tx)
+                else:
+                    # contador menor que el anterior: la interfaz se reinició
+                    d_rx = rx - serie.ult_rx if rx >= serie.ult_rx else rx
+                    d_tx = tx - serie.ult_tx if tx >= serie.ult_tx else tx
+                    serie.rx[pos] = serie.rx[prev] + d_rx
+                    serie.tx[pos] = serie.tx[prev] + d_tx
+                    serie.ult_rx, serie.ult_tx = rx, tx
+                    if d_rx or d_tx:
+                        deltas[key] = (d_rx, d_tx)
+                serie.handshake[pos] = handshake
+                serie.endpoint = endpoint
+                vivos[key] = serie
+            self._peers = vivos
+            self._seq = seq + 1
+        for fn in list(self._listeners):
+            try:
+                fn(ahora, deltas)
+            except Exception as e:
+                print(f"[peer_telemetry] error en oyente {getattr(fn, '__name__', fn)}: {e}")
+        return len(peers)
+
+    def leer_dump(self) -> tuple[bool, str]:
+        """Texto de `wg show <if> dump` (o de TELEMETRIA_DUMP). Devuelve (ok, texto|error)."""
+        if TELEMETRIA_DUMP:
+            try:
+                with open(TELEMETRIA_DUMP, 'r') as f:
+                    return True, f.read()
+            except OSError as e:
+                return False, str(e)
+        try:
+            result = run_wg(["show", WG_INTERFACE, "dump"])
+        except OSError as e:
+            return False, str(e)
+        if result.returncode != 0:
+            return False, result.stderr.strip() or f"wg salió con código {result.returncode}"
+        return True, result.stdout
+
+    def recolectar(self) -> tuple[bool, str]:
+        """Toma una muestra. Devuelve (ok, detalle)."""
+        ok, texto = self.leer_dump()
+        if not ok:
+            # un mismo error solo se registra una vez seguida
+            if texto != self._ultimo_error:
+                print(f"[peer_telemetry] no se pudo leer el dump: {texto}")
+            self._ultimo_error = texto
+            return False, texto
+        self._ultimo_error = None
+        return True, f"{self.ingerir(texto)} peers"
+
+    def run(self, intervalo: float = TELEMETRIA_INTERVALO) -> None:
+        """Muestrea cada *intervalo* segundos; bloquea hasta stop()."""
+        while not self._stop.is_set():
+            self.recolectar()
+            self._stop.wait(intervalo)
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    # ========================= CONSULTAS =========================
+    def _base(self, desde: float) -> int:
+        """Última muestra con instante <= desde (o la más antigua conservada). Bajo el lock."""
+        m = self.muestras
+        muestras = range(max(0, self._seq - m), self._seq)
+        i = bisect.bisect_right(muestras, desde, key=lambda s: self._instantes[s % m])
+        return muestras[max(0, i - 1)]
+
+    def _trafico(self, serie: _Serie, base: int) -> tuple[int, int]:
+        ult, ini = (self._seq - 1) % self.muestras, max(base, serie.primera) % self.muestras
+        return serie.rx[ult] - serie.rx[ini], serie.tx[ult] - serie.tx[ini]
+
+    def ultima_muestra(self) -> float | None:
+        with self._lock:
+            return self._instantes[(self._seq - 1) % self.muestras] if self._seq else None
+
+    def online(self, ahora: float | None = None) -> list[tuple[str, int]]:
+        """[(public_key, último handshake)] con handshake reciente, el más reciente primero."""
+        ahora = time.time() if ahora is None else ahora
+        with self._lock:
+            if not self._seq:
+                return []
+            ult = (self._seq - 1) % self.muestras
+            vivos = [(key, s.handshake[ult]) for key, s in self._peers.items()
+                     if s.handshake[ult] and ahora - s.handshake[ult] <= self.online_s]
+        vivos.sort(key=lambda e: -e[1])
+        return vivos
+
+    def bytes_desde(self, desde: float) -> dict[str, tuple[int, int]]:
+        """{public_key: (rx, tx)} transferidos desde *desde*."""
+        with self._lock:
+            if not self._seq:
+                return {}
+            base = self._base(desde)
+            return {key: self._trafico(s, base) for key, s in self._peers.items()}
+
+    def bytes_hoy(self) -> dict[str, tuple[int, int]]:
+        return self.bytes_desde(inicio_del_dia())
+
+    def top(self, n: int = 10, desde: float | None = None) -> list[tuple[str, int, int]]:
+        """[(public_key, rx, tx)] de los *n* que más transfirieron desde *desde* (hoy)."""
+        trafico = self.bytes_desde(inicio_del_dia() if desde is None else desde)
+        mayores = heapq.nlargest(n, trafico.items(), key=lambda e: e[1][0] + e[1][1])
+        return [(key, rx, tx) for key, (rx, tx) in mayores if rx + tx]
+
+    def peer(self, public_key: str, ahora: float | None = None) -> dict | None:
+        """Estado de un peer: handshake, online, endpoint y bytes de hoy; None si no está."""
+        ahora = time.time() if ahora is None else ahora
+        with self._lock:
+            serie = self._peers.get(public_key)
+            if serie is None:
+                return None
+            handshake = serie.handshake[(self._seq - 1) % self.muestras]
+            rx, tx = self._trafico(serie, self._base(inicio_del_dia(ahora)))
+            return {
+                'handshake': handshake or None,
+                'online': bool(handshake) and ahora - handshake <= self.online_s,
+                'endpoint': serie.endpoint,
+                'rx_hoy': rx,
+                'tx_hoy': tx,
+            }
+
+    def __len__(self) -> int:
+        return len(self._peers)
+
+
+# ========================= INSTANCIA COMPARTIDA =========================
+_telemetry = None
+_telemetry_lock = threading.Lock()
+
+def get_peer_telemetry() -> PeerTelemetry:
+    global _telemetry
+    if _telemetry is None:
+        with _telemetry_lock:
+            if _telemetry is None:
+                _telemetry = PeerTelemetry()
+    return _telemetry
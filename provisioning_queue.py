@@ -0,0 +1,161 @@
+# provisioning_queue.py
+#
+# Cola de trabajos de aprovisionamiento (altas, altas masivas y renovaciones).
+# - Los handlers de Telegram encolan el trabajo y responden al instante; un pool
+#   acotado de hilos (PROVISION_WORKERS) ejecuta create_config /
+#   create_configs_bulk / renew_config fuera del hilo de polling.
+# - La cola está acotada (PROVISION_MAX_PENDIENTES): si se llena, submit_*
+#   devuelve (False, motivo) en lugar de acumular trabajo sin límite.
+# - Al terminar cada trabajo se llama a on_done(ok, resultado) en el hilo del pool.
+# - stats() expone profundidad de la cola y latencias por trabajo
+#   (espera en cola + ejecución).
+#
+# Resultados que recibe on_done:
+#   'alta'      -> (ok, (conf_path, qr_path))   o (False, mensaje_error)
+#   'lote'      -> (ok, informe de create_configs_bulk; ok si se creó alguno)
+#                  o (False, mensaje_error)
+#   'renovacion'-> (ok, nueva_fecha)            o (False, None)
+
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from config import PROVISION_WORKERS, PROVISION_MAX_PENDIENTES
+
+# Latencias recientes que se conservan para las estadísticas
+MAX_MUESTRAS = 200
+
+
+class ProvisioningQueue:
+
+    def __init__(self, workers: int = PROVISION_WORKERS, max_pendientes: int = PROVISION_MAX_PENDIENTES):
+        self.workers = workers
+        self.max_pendientes = max_pendientes
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='provision')
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._en_cola = 0
+        self._en_curso = 0
+        self._completados = 0
+        self._fallidos = 0
+        self._latencias = deque(maxlen=MAX_MUESTRAS)   # (espera, ejecucion)
+
+    # ========================= ENCOLAR =========================
+    def submit_create(self, cliente: str, plan: str, vencimiento: datetime, on_done=None) -> tuple[bool, int | str]:
+        """Encola un alta. Devuelve (True, posición en la cola) o (False, motivo)."""
+        from generator import create_config
+
+        def trabajo():
+            ok, conf_or_err, qr_path = create_config(cliente, plan, vencimiento)
+            return ok, ((conf_or_err, qr_path) if ok else conf_or_err)
+
+        return self._submit('alta', cliente, trabajo, on_done)
+
+    def submit_bulk(self, clientes: list[tuple[str, str]], on_done=None) -> tuple[bool, int | str]:
+        """Encola un alta masiva [(nombre, plan), ...] como un solo trabajo."""
+        from generator import create_configs_bulk
+
+        def trabajo():
+            res = create_configs_bulk(clientes)
+            return bool(res['creados']), res
+
+        return self._submit('lote', f"{len(clientes)} clientes", trabajo, on_done)
+
+    def submit_renew(self, nombre: str, plan: str | None = None, on_done=None) -> tuple[bool, int | str]:
+        """Encola una renovación. Devuelve (True, posición) o (False, motivo)."""
+        from utils import renew_config
+        return self._submit('renovacion', nombre, lambda: renew_config(nombre, plan), on_done)
+
+    def _submit(self, tipo: str, nombre: str, trabajo, on_done) -> tuple[bool, int | str]:
+        with self._lock:
+            if self._en_cola >= self.max_pendientes:
+                return False, f"La cola de aprovisionamiento está llena ({self.max_pendientes} trabajos)."
+            self._en_cola += 1
+            posicion = self._en_cola
+            job_id = next(self._ids)
+        encolado = time.perf_counter()
+        try:
+            self._pool.submit(self._ejecutar, job_id, tipo, nombre, trabajo, on_done, encolado)
+        except RuntimeError as e:  # pool cerrado
+            with self._lock:
+                self._en_cola -= 1
+            return False, str(e)
+        return True, posicion
+
+    # ========================= EJECUCIÓN =========================
+    def _ejecutar(self, job_id, tipo, nombre, trabajo, on_done, encolado) -> None:
+        inicio = time.perf_counter()
+        with self._lock:
+            self._en_cola -= 1
+            self._en_curso += 1
+        try:
+            ok, resultado = trabajo()
+        except Exception as e:
+            ok, resultado = False, f"Excepción en el trabajo {tipo} de {nombre}: {e}"
+        fin = time.perf_counter()
+        with self._lock:
+            self._en_curso -= 1
+            self._completados += 1
+            if not ok:
+                self._fallidos += 1
+            self._latencias.append((inicio - encolado, fin - inicio))
+        print(f"[provisioning_queue] #{job_id} {tipo} {nombre}: "
+              f"{'ok' if ok else 'error'} (espera {inicio - encolado:.2f}s, ejecución {fin - inicio:.2f}s)")
+        if on_done is not None:
+            try:
+                on_done(ok, resultado)
+            except Exception as e:
+                print(f"[provisioning_queue] error al entregar #{job_id} ({nombre}): {e}")
+
+    # ========================= MÉTRICAS =========================
+    def depth(self) -> int:
+        """Trabajos esperando turno (sin contar los que están en curso)."""
+        with self._lock:
+            return self._en_cola
+
+    def stats(self) -> dict:
+        """Profundidad de la cola y latencias (media y p95) de los últimos trabajos."""
+        with self._lock:
+            muestras = list(self._latencias)
+            datos = {
+                'en_cola': self._en_cola,
+                'en_curso': self._en_curso,
+                'completados': self._completados,
+                'fallidos': self._fallidos,
+                'workers': self.workers,
+            }
+        totales = sorted(e + x for e, x in muestras)
+        datos['latencia_media'] = sum(totales) / len(totales) if totales else 0.0
+        datos['latencia_p95'] = totales[min(len(totales) - 1, int(len(totales) * 0.95))] if totales else 0.0
+        datos['espera_media'] = sum(e for e, _ in muestras) / len(muestras) if muestras else 0.0
+        return datos
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait)
+
+
+def formatear_stats(datos: dict) -> str:
+    """Líneas (Markdown) de la cola para el panel de estadísticas."""
+    return (
+        f"⚙️ *Cola de aprovisionamiento:*\n"
+        f"⏳ En espera: {datos['en_cola']} — 🔧 En curso: {datos['en_curso']}/{datos['workers']}\n"
+        f"✔️ Completados: {datos['completados']} (fallidos: {datos['fallidos']})\n"
+        f"⏱ Latencia media: {datos['latencia_media']:.2f}s — p95: {datos['latencia_p95']:.2f}s "
+        f"(espera media {datos['espera_media']:.2f}s)"
+    )
+
+
+# ========================= INSTANCIA COMPARTIDA =========================
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_provisioning_queue() -> ProvisioningQueue:
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = ProvisioningQueue()
+    return _queue
@@ -0,0 +1,191 @@
+# qr_cache.py
+#
+# Caché de códigos QR direccionada por contenido.
+# - Clave: SHA-256 de los bytes del .conf. Si el .conf cambia, cambia la clave:
+#   la invalidación es automática y nunca se sirve un QR viejo.
+# - Dos niveles: memoria (LRU acotada a QR_CACHE_MEMORIA entradas) y disco
+#   (QR_CACHE_DIR/<hash>.png, acotado a QR_CACHE_DISCO ficheros).
+# - Cada QR se renderiza una sola vez; las peticiones repetidas salen de
+#   memoria o de disco.
+# - olvidar(): al borrar un cliente se quita su QR de los dos niveles (la
+#   caché guarda la clave privada del .conf dentro del PNG).
+# - stats() devuelve contadores de aciertos (memoria/disco) y fallos.
+
+import os
+import re
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+from config import CLIENTS_DIR
+from qr_engine import render_png
+
+QR_CACHE_DIR = os.path.join(CLIENTS_DIR, '.qr_cache')
+
+# Entradas en memoria (un PNG de un .conf ronda 1-2 KiB)
+QR_CACHE_MEMORIA = 256
+
+# Ficheros en disco antes de purgar los más antiguos
+QR_CACHE_DISCO = 5000
+
+
+_HASH = re.compile(r'[0-9a-f]{64}')
+
+
+def hash_contenido(contenido: bytes) -> str:
+    return hashlib.sha256(contenido).hexdigest()
+
+
+class QrCache:
+
+    def __init__(self, folder: str | None = QR_CACHE_DIR, max_memoria: int = QR_CACHE_MEMORIA,
+                 max_disco: int = QR_CACHE_DISCO):
+        self.folder = folder
+        self.max_memoria = max_memoria
+        self.max_disco = max_disco
+        self._lock = threading.Lock()
+        self._memoria = OrderedDict()   # hash -> bytes PNG (orden LRU)
+        self._escrituras = 0
+        self.hits_memoria = 0
+        self.hits_disco = 0
+        self.misses = 0
+
+    # ========================= API =========================
+    def png(self, contenido: bytes) -> bytes:
+        """PNG del QR de *contenido* (bytes del .conf), desde caché si es posible."""
+        clave = hash_contenido(contenido)
+        with self._lock:
+            png = self._memoria.get(clave)
+            if png is not None:
+                self._memoria.move_to_end(clave)
+                self.hits_memoria += 1
+                return png
+
+        png = self._leer_disco(clave)
+        if png is not None:
+            with self._lock:
+                self.hits_disco += 1
+                self._recordar(clave, png)
+            return png
+
+        png = render_png(contenido)
+        with self._lock:
+            self.misses += 1
+            self._recordar(clave, png)
+        self._escribir_disco(clave, png)
+        return png
+
+    def guardar(self, contenido: bytes, png: bytes) -> None:
+        """Añade un PNG ya renderizado (p. ej. por qr_engine.render_many)."""
+        clave = hash_contenido(contenido)
+        with self._lock:
+            self._recordar(clave, png)
+        self._escribir_disco(clave, png)
+
+    def png_de_conf(self, ruta_conf: str) -> bytes:
+        with open(ruta_conf, 'rb') as f:
+            return self.png(f.read())
+
+    def olvidar(self, ruta_o_hash: str) -> bool:
+        """
+        Quita de memoria y de disco el QR de un .conf (ruta del fichero, que
+        tiene que existir todavía, o su hash). True si había algo que quitar.
+        """
+        if _HASH.fullmatch(ruta_o_hash):
+            clave = ruta_o_hash
+        else:
+            try:
+                with open(ruta_o_hash, 'rb') as f:
+                    clave = hash_contenido(f.read())
+            except OSError:
+                return False
+        with self._lock:
+            quitado = self._memoria.pop(clave, None) is not None
+        if self.folder:
+            try:
+                os.unlink(self._ruta(clave))
+                quitado = True
+            except OSError:
+                pass
+        return quitado
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits_memoria + self.hits_disco + self.misses
+            return {
+                'hits_memoria': self.hits_memoria,
+                'hits_disco': self.hits_disco,
+                'misses': self.misses,
+                'en_memoria': len(self._memoria),
+                'ratio': (self.hits_memoria + self.hits_disco) / total if total else 0.0,
+            }
+
+    # ========================= NIVELES =========================
+    def _recordar(self, clave: str, png: bytes) -> None:
+        """Inserta en la LRU de memoria (bajo self._lock)."""
+        self._memoria[clave] = png
+        self._memoria.move_to_end(clave)
+        while len(self._memoria) > self.max_memoria:
+            self._memoria.popitem(last=False)
+
+    def _ruta(self, clave: str) -> str:
+        return os.path.join(self.folder, f"{clave}.png")
+
+    def _leer_disco(self, clave: str) -> bytes | None:
+        if not self.folder:
+            return None
+        ruta = self._ruta(clave)
+        try:
+            with open(ruta, 'rb') as f:
+                png = f.read()
+            os.utime(ruta)  # marca de uso para la purga
+            return png
+        except OSError:
+            return None
+
+    def _escribir_disco(self, clave: str, png: bytes) -> None:
+        if not self.folder:
+            return
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(prefix='.qr.', dir=self.folder)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(png)
+            os.replace(tmp, self._ruta(clave))
+        except OSError as e:
+            print(f"[qr_cache] No se pudo guardar en disco: {e}")
+            return
+        with self._lock:
+            self._escrituras += 1
+            purgar = self._escrituras % 64 == 0
+        if purgar:
+            self._purgar_disco()
+
+    def _purgar_disco(self) -> None:
+        """Borra los PNG menos usados recientemente si el disco supera max_disco."""
+        try:
+            entradas = [e for e in os.scandir(self.folder) if e.name.endswith('.png')]
+        except OSError:
+            return
+        if len(entradas) <= self.max_disco:
+            return
+        entradas.sort(key=lambda e: e.stat().st_mtime)
+        for e in entradas[:len(entradas) - self.max_disco]:
+            try:
+                os.unlink(e.path)
+            except OSError:
+                pass
+
+
+# ========================= INSTANCIA COMPARTIDA =========================
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_qr_cache() -> QrCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = QrCache()
+    return _cache
@@ -0,0 +1,81 @@
+# qr_engine.py
+#
+# Renderizado de códigos QR para los .conf de WireGuard.
+# - Renderiza directamente a un buffer en memoria (BytesIO), sin pasar por disco.
+# - Versión y nivel de corrección fijos (QR_VERSION / QR_CORRECCION): un .conf de
+#   cliente ocupa ~250 bytes, así que se evita la búsqueda automática de versión.
+#   Si un .conf no cabe (endpoint muy largo, IPv6...), se recurre a fit=True.
+# - Máscara fija (QR_MASCARA): evaluar las 8 máscaras es la mayor parte del coste.
+# - PNG de 1 bit con compresión baja (QR_PNG_NIVEL): el tamaño apenas cambia y
+#   se ahorra la mayor parte del tiempo de zlib.
+# - render_many(): lote repartido en un pool de procesos (benchmark). Los
+#   procesos se arrancan con 'spawn': fork desde un proceso con hilos puede
+#   heredar locks tomados.
+#
+# Benchmark: benchmarks/bench_qr.py
+
+import io
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import qrcode
+from qrcode.exceptions import DataOverflowError
+
+try:
+    from qrcode.image.pil import PilImage
+except ImportError:  # dependencia opcional: sin Pillow, qrcode usa PyPNG
+    PilImage = None
+
+from config import QR_VERSION, QR_CORRECCION, QR_MASCARA, QR_BOX_SIZE, QR_BORDE, QR_PNG_NIVEL
+
+_NIVELES = {
+    'L': qrcode.constants.ERROR_CORRECT_L,
+    'M': qrcode.constants.ERROR_CORRECT_M,
+    'Q': qrcode.constants.ERROR_CORRECT_Q,
+    'H': qrcode.constants.ERROR_CORRECT_H,
+}
+
+
+def _qr(datos: str, version: int | None) -> qrcode.QRCode:
+    qr = qrcode.QRCode(
+        version=version,
+        error_correction=_NIVELES[QR_CORRECCION],
+        box_size=QR_BOX_SIZE,
+        border=QR_BORDE,
+        mask_pattern=QR_MASCARA,
+        image_factory=PilImage,
+    )
+    qr.add_data(datos)
+    qr.make(fit=version is None)
+    return qr
+
+
+def render_png(contenido: bytes | str) -> bytes:
+    """PNG (bytes) del QR de *contenido* (texto o bytes UTF-8 del .conf)."""
+    datos = contenido.decode('utf-8') if isinstance(contenido, bytes) else contenido
+    try:
+        qr = _qr(datos, QR_VERSION)
+    except DataOverflowError:
+        qr = _qr(datos, None)
+    img = qr.make_image()
+    buf = io.BytesIO()
+    if PilImage is not None:
+        img.save(buf, format='PNG', compress_level=QR_PNG_NIVEL)
+    else:
+        img.save(buf)
+    return buf.getvalue()
+
+
+def render_many(contenidos: list, workers: int | None = None, pool: ProcessPoolExecutor | None = None) -> list[bytes]:
+    """
+    Renderiza un lote de QR en paralelo (mismo orden que *contenidos*).
+    Reutiliza *pool* si se pasa uno; si no, crea uno de *workers* procesos.
+    """
+    if not contenidos:
+        return []
+    if pool is None:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as propio:
+            return render_many(contenidos, workers, pool=propio)
+    chunksize = max(1, len(contenidos) // ((workers or os.cpu_count() or 1) * 4))
+    return list(pool.map(render_png, contenidos, chunksize=chunksize))
@@ -0,0 +1,363 @@
+# quota_engine.py
+#
+# Cuotas de datos por plan: PLANS[plan]['cuota_gb'] (opcional) limita los bytes
+# (subida + bajada) de cada periodo del cliente; el periodo empieza de nuevo al
+# renovar (cuando cambia su vencimiento).
+# - El consumo sale de la telemetría (peer_telemetry.py): cada muestra trae el
+#   tráfico de cada peer desde la anterior, sin llamar a `wg` por peer.
+# - Persistencia por deltas: cada muestra añade sus líneas a consumo.<gen>.log
+#   con una sola escritura; cada CUOTA_COMPACTAR_CADA líneas se escribe una
+#   instantánea (consumo.json, atómica) y se empieza un log nuevo. Al arrancar:
+#   instantánea + log de su generación.
+# - Aviso (una vez por periodo) al llegar a CUOTA_AVISO de la cuota y, con
+#   CUOTA_SUSPENDER, suspensión al agotarla: los peers de la muestra pasan a
+#   suspendidos en wg0.conf (bloque comentado, conserva su dirección), salen de
+#   la interfaz en vivo con un solo `wg syncconf` y se marcan inactivos. Al
+#   renovar se reactivan igual; al arrancar se concilia wg0.conf con las
+#   suspensiones vigentes.
+#
+# Líneas del log (separadas por tabuladores):
+#   + nombre bytes   consumo
+#   = nombre vence   periodo nuevo (consumo a cero)
+#   x nombre         cliente eliminado
+#   s nombre         suspendido
+#   r nombre         reactivado
+
+import os
+import glob
+import json
+import tempfile
+import threading
+
+from config import (
+    CLIENTS_DIR, PLANS, WG_BIN, WG_SUDO, WG_INTERFACE, WG_CONF_PATH,
+    CUOTA_AVISO, CUOTA_SUSPENDER, CUOTA_COMPACTAR_CADA,
+)
+from client_store import ClientRecord, get_client_store
+from peer_telemetry import get_peer_telemetry
+from wireguard import conf_lock
+from wg_server_config import cargar
+
+SNAPSHOT_FILE = os.path.join(CLIENTS_DIR, 'consumo.json')
+
+
+def cuota_de(plan: str | None) -> int | None:
+    """Cuota del plan en bytes, o None si no tiene."""
+    gb = PLANS.get(plan, {}).get('cuota_gb') if plan else None
+    return int(gb * 1024 ** 3) if gb else None
+
+
+def hay_cuotas() -> bool:
+    return any(p.get('cuota_gb') for p in PLANS.values())
+
+
+class QuotaEngine:
+    """
+    on_aviso([(nombre, uso, cuota), ...]) y on_suspension([(nombre, uso, cuota), ...], error)
+    se llaman en lote tras cada muestra, en el hilo del colector de telemetría.
+    """
+
+    def __init__(self, snapshot: str = SNAPSHOT_FILE, store=None, on_aviso=None, on_suspension=None,
+                 aviso: float = CUOTA_AVISO, suspender: bool = CUOTA_SUSPENDER,
+                 compactar_cada: int = CUOTA_COMPACTAR_CADA, interface: str = WG_INTERFACE,
+                 conf_path: str = WG_CONF_PATH, wg_bin: str = WG_BIN, sudo: bool = WG_SUDO):
+        self.snapshot = snapshot
+        self.store = store or get_client_store()
+        self.on_aviso = on_aviso
+        self.on_suspension = on_suspension
+        self.aviso = aviso
+        self.suspender = suspender
+        self.compactar_cada = compactar_cada
+        self.interface = interface
+        self.conf_path = conf_path
+        self.wg = {'wg_bin': wg_bin, 'sudo': sudo}
+        self._lock = threading.RLock()
+        self._uso = {}            # nombre -> bytes en el periodo
+        self._periodo = {}        # nombre -> vence del periodo que se cuenta
+        self._suspendidos = set()
+        self._avisados = set()
+        self._claves = {}         # public_key -> nombre
+        self._desconocidas = set()
+        self._gen = 0
+        self._log = None
+        self._lineas = 0
+
+    # ========================= PERSISTENCIA =========================
+    def _ruta_log(self, gen: int) -> str:
+        base, _ = os.path.splitext(self.snapshot)
+        return f"{base}.{gen}.log"
+
+    def _aplicar(self, linea: str) -> None:
+        campos = linea.rstrip('\n').split('\t')
+        op, nombre = campos[0], campos[1] if len(campos) > 1 else None
+        if not nombre:
+            return
+        if op == '+':
+            self._uso[nombre] = self._uso.get(nombre, 0) + int(campos[2])
+        elif op == '=':
+            self._periodo[nombre] = int(campos[2])
+            self._uso[nombre] = 0
+        elif op == 'x':
+            self._uso.pop(nombre, None)
+            self._periodo.pop(nombre, None)
+            self._suspendidos.discard(nombre)
+        elif op == 's':
+            self._suspendidos.add(nombre)
+        elif op == 'r':
+            self._suspendidos.discard(nombre)
+
+    def _escribir(self, lineas: list[str]) -> None:
+        """Añade *lineas* al log con una sola escritura (bajo el lock)."""
+        if not lineas:
+            return
+        for linea in lineas:
+            self._aplicar(linea)
+        if self._log is not None:
+            self._log.write("".join(lineas))
+            self._log.flush()
+        self._lineas += len(lineas)
+        if self._lineas >= self.compactar_cada:
+            self.compactar()
+
+    def load(self) -> None:
+        """Instantánea + log; concilia con el registro y reaplica las suspensiones."""
+        registros = self.store.records()
+        with self._lock:
+            try:
+                with open(self.snapshot, 'r') as f:
+                    datos = json.load(f)
+            except FileNotFoundError:
+                datos = {}
+            except (OSError, ValueError) as e:
+                print(f"[quota_engine] instantánea ilegible ({e}); se empieza de cero")
+                datos = {}
+            self._gen = int(datos.get('gen', 0))
+            self._periodo = {n: v for n, (v, _) in datos.get('clientes', {}).items()}
+            self._uso = {n: u for n, (_, u) in datos.get('clientes', {}).items()}
+            self._suspendidos = set(datos.get('suspendidos', ()))
+
+            ruta = self._ruta_log(self._gen)
+            try:
+                with open(ruta, 'r') as f:
+                    for linea in f:
+                        try:
+                            self._aplicar(linea)
+                        except (ValueError, IndexError):
+                            continue  # línea cortada por un cierre brusco
+            except FileNotFoundError:
+                pass
+            # logs de otras generaciones: ya incluidos en la instantánea
+            for viejo in glob.glob(self._ruta_log('*')):
+                if viejo != ruta:
+                    os.unlink(viejo)
+            self._log = open(ruta, 'a')
+
+            lineas = [f"x\t{n}\n" for n in self._uso if n not in registros]
+            lineas += [f"=\t{n}\t{rec.vence}\n" for n, rec in registros.items()
+                       if self._periodo.get(n) != rec.vence]
+            lineas += [f"r\t{n}\n" for n in self._suspendidos if n in registros and registros[n].activa]
+            self._escribir(lineas)
+            self._claves = {rec.public_key: n for n, rec in registros.items() if rec.public_key}
+            self._avisados = {
+                n for n, uso in self._uso.items()
+                if n in registros and (c := cuota_de(registros[n].plan)) and uso >= self.aviso * c
+            }
+            suspendidos = list(self._suspendidos)
+        if suspendidos:
+            # suspensiones que wg0.conf aún no refleja (p. ej. fichero editado a mano)
+            ok, err = self._marcar(suspendidos, activo=False)
+            if not ok:
+                print(f"[quota_engine] no se pudieron reaplicar las suspensiones: {err}")
+
+    def compactar(self) -> None:
+        """Instantánea atómica de la generación siguiente y log nuevo."""
+        with self._lock:
+            gen = self._gen + 1
+            datos = {
+                'gen': gen,
+                'clientes': {n: [self._periodo.get(n, 0), u] for n, u in self._uso.items()},
+                'suspendidos': sorted(self._suspendidos),
+            }
+            carpeta = os.path.dirname(self.snapshot) or '.'
+            os.makedirs(carpeta, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(prefix='.consumo.', dir=carpeta)
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(datos, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, self.snapshot)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.unlink(tmp)
+                raise
+            viejo = self._ruta_log(self._gen)
+            if self._log is not None:
+                self._log.close()
+                self._log = open(self._ruta_log(gen), 'a')
+            if os.path.exists(viejo):
+                os.unlink(viejo)
+            self._gen, self._lineas = gen, 0
+
+    def close(self) -> None:
+        with self._lock:
+            if self._log is not None:
+                self.compactar()
+                self._log.close()
+                self._log = None
+
+    # ========================= CLAVES =========================
+    def _peers_conf(self) -> dict[str, str]:
+        """{nombre: PublicKey} de los comentarios de wg0.conf ({} si no se puede leer)."""
+        try:
+            return cargar(self.conf_path, self.wg['sudo']).claves_por_nombre()
+        except OSError as e:
+            print(f"[quota_engine] no se pudo leer {self.conf_path}: {e}")
+            return {}
+
+    def _claves_de(self, nombres: list[str]) -> dict[str, str]:
+        """{nombre: public_key}: registro y, si falta, comentarios de wg0.conf."""
+        with self._lock:
+            inverso = {n: k for k, n in self._claves.items()}
+        claves = {n: inverso[n] for n in nombres if n in inverso}
+        faltan = [n for n in nombres if n not in claves]
+        if faltan:
+            conf = self._peers_conf()
+            claves.update({n: conf[n] for n in faltan if n in conf})
+        return claves
+
+    def _marcar(self, nombres: list[str], activo: bool) -> tuple[bool, str]:
+        """Suspende/reactiva los peers de *nombres* en wg0.conf y en la interfaz (un syncconf)."""
+        claves = self._claves_de(nombres)
+        with conf_lock:
+            try:
+                conf = cargar(self.conf_path, self.wg['sudo'])
+            except OSError as e:
+                return False, f"No se pudo leer {self.conf_path}: {e}"
+            for clave in claves.values():
+                conf.update(clave, activo=activo)
+            return conf.confirmar(self.interface, self.wg['wg_bin'])
+
+    # ========================= EVENTOS =========================
+    def on_muestra(self, instante: float, deltas: dict) -> None:
+        """Oyente de PeerTelemetry: suma el tráfico y aplica avisos y suspensiones."""
+        if not deltas:
+            return
+        with self._lock:
+            nuevas = [k for k in deltas if k not in self._claves and k not in self._desconocidas]
+        if nuevas:
+            # peers sin clave en el registro (altas con crear_cliente.sh): wg0.conf
+            nombres = {key: n for n, key in self._peers_conf().items()}
+            with self._lock:
+                for key, nombre in nombres.items():
+                    self._claves.setdefault(key, nombre)
+                self._desconocidas.update(k for k in nuevas if k not in self._claves)
+
+        # registros antes de tomar self._lock: el store notifica a on_store_event
+        # (que toma self._lock) y el orden de los locks debe ser siempre el mismo
+        registros = self.store.records()
+        avisos, excedidos = [], []
+        with self._lock:
+            por_nombre = {}
+            for key, (rx, tx) in deltas.items():
+                nombre = self._claves.get(key)
+                if nombre and '\t' not in nombre and '\n' not in nombre:
+                    por_nombre[nombre] = por_nombre.get(nombre, 0) + rx + tx
+            self._escribir([f"+\t{n}\t{b}\n" for n, b in por_nombre.items()])
+            for nombre in por_nombre:
+                rec = registros.get(nombre)
+                cuota = cuota_de(rec.plan) if rec else None
+                if not cuota or not rec.activa or nombre in self._suspendidos:
+                    continue
+                uso = self._uso.get(nombre, 0)
+                if uso >= cuota and self.suspender:
+                    excedidos.append((nombre, uso, cuota))
+                elif uso >= self.aviso * cuota and nombre not in self._avisados:
+                    self._avisados.add(nombre)
+                    avisos.append((nombre, uso, cuota))
+        if avisos:
+            self._fire(self.on_aviso, avisos)
+        if excedidos:
+            self._suspender(excedidos)
+
+    def _suspender(self, excedidos: list) -> None:
+        """Suspende los peers en un lote (wg0.conf + interfaz) y los marca inactivos."""
+        nombres = [n for n, _, _ in excedidos]
+        ok, err = self._marcar(nombres, activo=False)
+        if not ok:
+            self._fire(self.on_suspension, excedidos, f"wg syncconf falló: {err}")
+            return
+        with self._lock:
+            self._escribir([f"s\t{n}\n" for n in nombres])
+        for nombre in nombres:
+            self.store.set_activa(nombre, False)
+        self._fire(self.on_suspension, excedidos, None)
+
+    def on_store_event(self, evento: str, nombre: str, registro: ClientRecord | None) -> None:
+        """Oyente del ClientStore: renovación = periodo nuevo (y fin de la suspensión)."""
+        if '\t' in nombre or '\n' in nombre:
+            return
+        reactivar = False
+        with self._lock:
+            if evento == 'delete':
+                if nombre in self._uso or nombre in self._suspendidos:
+                    self._escribir([f"x\t{nombre}\n"])
+                self._avisados.discard(nombre)
+                self._claves = {k: n for k, n in self._claves.items() if n != nombre}
+                return
+            if evento != 'upsert':
+                return
+            if registro.public_key:
+                self._claves[registro.public_key] = nombre
+            self._desconocidas.clear()
+            if self._periodo.get(nombre) != registro.vence:
+                self._escribir([f"=\t{nombre}\t{registro.vence}\n"])
+                self._avisados.discard(nombre)
+                reactivar = nombre in self._suspendidos and registro.activa
+        if reactivar:
+            self._reactivar(nombre)
+
+    def _reactivar(self, nombre: str) -> None:
+        # sin bloque en wg0.conf (revocado mientras estaba suspendido): nada que reponer
+        ok, err = self._marcar([nombre], activo=True)
+        if not ok:
+            return print(f"[quota_engine] no se pudo reactivar {nombre}: {err}")
+        with self._lock:
+            self._escribir([f"r\t{nombre}\n"])
+
+    # ========================= CONSULTAS =========================
+    def uso(self, nombre: str) -> tuple[int, int | None]:
+        """(bytes consumidos en el periodo, cuota en bytes o None)."""
+        rec = self.store.record(nombre)
+        with self._lock:
+            return self._uso.get(nombre, 0), cuota_de(rec.plan) if rec else None
+
+    def suspendidos(self) -> list[str]:
+        with self._lock:
+            return sorted(self._suspendidos)
+
+    def _fire(self, callback, *args) -> None:
+        if callback is None:
+            return
+        try:
+            callback(*args)
+        except Exception as e:
+            print(f"[quota_engine] error en callback: {e}")
+
+
+# ========================= INSTANCIA COMPARTIDA =========================
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_quota_engine() -> QuotaEngine:
+    """Motor compartido; se carga y se suscribe al registro y a la telemetría."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = QuotaEngine()
+                engine.load()
+                get_client_store().add_listener(engine.on_store_event)
+                get_peer_telemetry().add_listener(engine.on_muestra)
+                _engine = engine
+    return _engine
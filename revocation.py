@@ -0,0 +1,132 @@
+# revocation.py
+#
+# Revocación de peers vencidos.
+# - Recibe lotes de clientes vencidos (desde el expiration_watcher).
+# - Suspende sus peers en el modelo de wg0.conf (wg_server_config: bloque
+#   comentado con "#~ ", dirección reservada) y aplica el lote con UN
+#   `wg syncconf` y una sola reescritura atómica del fichero.
+# - Los marca como inactivos en el registro y devuelve un informe.
+# - reactivar(): al renovar, el peer vuelve a la interfaz con la misma clave y
+#   la misma dirección (el .conf del cliente sigue valiendo).
+# - Con quitar=True (eliminación de un cliente) los bloques se borran y las
+#   direcciones vuelven al asignador; sus QR salen de qr_cache.
+#
+# Para pruebas: RevocationEngine(wg_bin='/ruta/a/wg_falso', sudo=False, conf_path=...).
+
+from client_store import get_client_store
+from ip_allocator import get_ip_allocator
+from config import WG_BIN, WG_SUDO, WG_INTERFACE, WG_CONF_PATH
+from wireguard import conf_lock
+from wg_server_config import cargar
+from utils import escapar_md, ruta_conf_cliente
+from qr_cache import get_qr_cache
+
+
+class RevocationEngine:
+
+    def __init__(self, store=None, allocator=None, wg_bin: str = WG_BIN, sudo: bool = WG_SUDO,
+                 interface: str = WG_INTERFACE, conf_path: str = WG_CONF_PATH):
+        self.store = store or get_client_store()
+        self.allocator = allocator
+        self.wg_bin = wg_bin
+        self.sudo = sudo
+        self.interface = interface
+        self.conf_path = conf_path
+
+    def _allocator(self):
+        return self.allocator or get_ip_allocator()
+
+    def revoke(self, nombres: list[str], quitar: bool = False) -> dict:
+        """
+        Revoca *nombres* en lote: suspende sus peers o, con *quitar*, los borra
+        de wg0.conf y libera sus direcciones. Devuelve:
+            {'revocados': [...], 'sin_peer': [...], 'error': <str|None>}
+        'sin_peer' son clientes sin bloque en wg0.conf (solo se desactivan y
+        sus direcciones se liberan: no hay peer que reponer).
+        """
+        informe = {'revocados': [], 'sin_peer': [], 'error': None}
+        nombres = list(dict.fromkeys(nombres))
+        if not nombres:
+            return informe
+
+        with conf_lock:
+            try:
+                conf = cargar(self.conf_path, self.sudo)
+            except Exception as e:
+                informe['error'] = f"No se pudo leer {self.conf_path}: {e}"
+                return informe
+
+            objetivo = {n: conf.clave_de(n) for n in nombres if conf.clave_de(n)}
+            informe['sin_peer'] = [n for n in nombres if n not in objetivo]
+
+            if objetivo:
+                # 1) y 2) Interfaz en vivo y wg0.conf: un syncconf y una escritura por lote
+                for clave in objetivo.values():
+                    if quitar:
+                        conf.remove(clave)
+                    else:
+                        conf.update(clave, activo=False)
+                ok, err = conf.confirmar(self.interface, self.wg_bin)
+                if not ok:
+                    informe['error'] = f"wg syncconf falló: {err}"
+                    return informe
+
+        # 3) Registro: inactivos; 4) direcciones sin peer de vuelta al pool
+        #    (y, al quitar, su QR fuera de la caché)
+        direcciones = []
+        cache = get_qr_cache() if quitar else None
+        for nombre in nombres:
+            if cache:
+                cache.olvidar(ruta_conf_cliente(nombre))
+            rec = self.store.record(nombre)
+            if rec and rec.direccion and (quitar or nombre not in objetivo):
+                direcciones.append(rec.direccion)
+            self.store.set_activa(nombre, False)
+        if direcciones:
+            self._allocator().free_many(direcciones)
+        informe['revocados'] = list(objetivo)
+        return informe
+
+    def reactivar(self, nombre: str) -> tuple[bool, str]:
+        """
+        Vuelve a poner en la interfaz el peer de *nombre* (renovación). Si su
+        bloque ya no está en wg0.conf (revocado antes de que los vencimientos
+        suspendieran), lo da de alta otra vez con la clave y la dirección del
+        registro, siempre que la dirección siga libre. Devuelve (ok, aviso).
+        """
+        rec = self.store.record(nombre)
+        reservada = None
+        with conf_lock:
+            try:
+                conf = cargar(self.conf_path, self.sudo)
+            except Exception as e:
+                return False, f"No se pudo leer {self.conf_path}: {e}"
+            clave = rec.public_key if rec and rec.public_key in conf else conf.clave_de(nombre)
+            if clave is not None:
+                conf.update(clave, activo=True)
+            elif rec and rec.public_key and rec.direccion:
+                if not self._allocator().mark_used(rec.direccion):
+                    return False, (f"La dirección {rec.direccion} de {nombre} ya está asignada; "
+                                   "hay que volver a crear su configuración.")
+                reservada = rec.direccion
+                conf.add(nombre, rec.public_key, rec.direccion)
+            else:
+                return True, ""  # sin peer conocido (alta externa): nada que reponer
+            ok, aviso = conf.confirmar(self.interface, self.wg_bin)
+        if not ok and reservada:
+            self._allocator().free(reservada)
+        return ok, aviso
+
+
+def formatear_informe(informe: dict) -> str:
+    """Texto (Markdown) para avisar al admin del resultado de una revocación."""
+    lines = ["⛔️ *Vencimientos aplicados*"]
+    if informe['revocados']:
+        lines.append(f"Suspendidos hasta renovar ({len(informe['revocados'])}): "
+                     + escapar_md(", ".join(informe['revocados'])))
+    if informe['sin_peer']:
+        lines.append(f"Marcados inactivos sin peer en wg0.conf ({len(informe['sin_peer'])}): "
+                     + escapar_md(", ".join(informe['sin_peer'])))
+    if informe['error']:
+        lines.append(f"⚠️ Error: {escapar_md(informe['error'])}")
+    return "\n".join(lines)
@@ -0,0 +1,185 @@
+# router.py
+#
+# Enrutado de mensajes por tabla, en lugar de una lista de
+# @bot.message_handler(func=lambda m: m.text == ...) que telebot evalúa uno a uno
+# en cada mensaje.
+# - Un solo handler por tipo de contenido (y uno para callbacks) registrado en el
+#   bot; resuelve la ruta con búsquedas en dicts precalculados:
+#     comandos   '/start'         -> handler
+#     textos     '📊 Estadísticas' -> handler   (botones de los menús)
+#     callbacks  'pago_aprobar:…' -> handler   (prefijo antes de ':')
+#   más un handler para las consultas inline.
+#   Coste constante por mensaje aunque el menú crezca.
+# - Filtros que no son un texto fijo (p. ej. "el usuario está escribiendo su
+#   confirmación") van en una lista corta de predicados que se evalúa solo si no
+#   hubo coincidencia en los dicts, en orden de registro.
+# - antes(): funciones que ven cada mensaje ya enrutado (y el nombre de su ruta)
+#   antes de su handler; p. ej. para cerrar un estado en curso al cambiar de menú.
+# - Los next_step_handlers siguen teniendo prioridad: telebot los atiende (y
+#   consume el mensaje) antes de llamar a los handlers registrados.
+# - Mide cuántas veces se usa cada ruta y cuánto tarda (stats()).
+
+import threading
+import time
+import weakref
+
+from telebot import TeleBot
+from telebot.util import extract_command
+
+
+class Router:
+
+    def __init__(self, bot: TeleBot):
+        self.bot = bot
+        self._comandos = {}
+        self._textos = {}
+        self._predicados = {}     # content_type -> [(nombre, predicado, handler)]
+        self._contenidos = {}     # content_type -> (nombre, handler) cuando no hay texto
+        self._callbacks = {}
+        self._inline = None
+        self._antes = []
+        self._instalados = set()
+        self._lock = threading.Lock()
+        self._tiempos = {}        # ruta -> [llamadas, segundos, máximo]
+
+    # ========================= REGISTRO =========================
+    def comando(self, *comandos: str):
+        """Decorador: handler de /comando."""
+        def registrar(handler):
+            for c in comandos:
+                self._comandos[c] = (f"/{c}", handler)
+            self._instalar('text')
+            return handler
+        return registrar
+
+    def texto(self, *textos: str):
+        """Decorador: handler de uno o varios textos exactos (botones)."""
+        def registrar(handler):
+            for t in textos:
+                self._textos[t] = (t, handler)
+            self._instalar('text')
+            return handler
+        return registrar
+
+    def predicado(self, func, content_type: str = 'text', nombre: str | None = None):
+        """Decorador: handler para mensajes que cumplen *func* (si no hubo ruta exacta)."""
+        def registrar(handler):
+            self._predicados.setdefault(content_type, []).append((nombre or handler.__name__, func, handler))
+            self._instalar(content_type)
+            return handler
+        return registrar
+
+    def contenido(self, content_type: str):
+        """Decorador: handler de un tipo de contenido (photo, document…)."""
+        def registrar(handler):
+            self._contenidos[content_type] = (content_type, handler)
+            self._instalar(content_type)
+            return handler
+        return registrar
+
+    def callback(self, *prefijos: str):
+        """Decorador: handler de callbacks cuyo data es 'prefijo' o 'prefijo:…'."""
+        def registrar(handler):
+            for p in prefijos:
+                self._callbacks[p] = (p, handler)
+            if 'callback' not in self._instalados:
+                self._instalados.add('callback')
+                self.bot.register_callback_query_handler(self._despachar_callback, func=lambda c: True)
+            return handler
+        return registrar
+
+    def inline(self, handler):
+        """Decorador: handler de las consultas inline (@bot texto)."""
+        self._inline = handler
+        if 'inline' not in self._instalados:
+            self._instalados.add('inline')
+            self.bot.register_inline_handler(lambda q: self._medir('inline', self._inline, q),
+                                             func=lambda q: True)
+        return handler
+
+    def antes(self, func):
+        """Decorador: func(message, ruta) se llama antes de cada handler de mensaje."""
+        self._antes.append(func)
+        return func
+
+    def _instalar(self, content_type: str) -> None:
+        if content_type not in self._instalados:
+            self._instalados.add(content_type)
+            self.bot.register_message_handler(self._despachar, content_types=[content_type],
+                                              func=lambda m: True)
+
+    # ========================= DESPACHO =========================
+    def resolver(self, message) -> tuple[str, object] | None:
+        """(nombre de la ruta, handler) para *message*, o None."""
+        texto = message.text if message.content_type == 'text' else None
+        if texto:
+            if texto.startswith('/'):
+                ruta = self._comandos.get(extract_command(texto))
+                if ruta:
+                    return ruta
+            ruta = self._textos.get(texto)
+            if ruta:
+                return ruta
+        for nombre, func, handler in self._predicados.get(message.content_type, ()):
+            if func(message):
+                return nombre, handler
+        return self._contenidos.get(message.content_type)
+
+    def _despachar(self, message) -> None:
+        ruta = self.resolver(message)
+        if ruta:
+            for func in self._antes:
+                func(message, ruta[0])
+            self._medir(ruta[0], ruta[1], message)
+
+    def _despachar_callback(self, call) -> None:
+        ruta = self._callbacks.get((call.data or '').split(':', 1)[0])
+        if ruta:
+            self._medir(f"cb:{ruta[0]}", ruta[1], call)
+
+    def _medir(self, nombre: str, handler, arg) -> None:
+        t0 = time.perf_counter()
+        try:
+            handler(arg)
+        finally:
+            dt = time.perf_counter() - t0
+            with self._lock:
+                t = self._tiempos.get(nombre)
+                if t is None:
+                    t = self._tiempos[nombre] = [0, 0.0, 0.0]
+                t[0] += 1
+                t[1] += dt
+                t[2] = max(t[2], dt)
+
+    def stats(self) -> dict:
+        """{ruta: {'llamadas', 'media_ms', 'max_ms'}}"""
+        with self._lock:
+            return {
+                nombre: {'llamadas': n, 'media_ms': total / n * 1000, 'max_ms': maximo * 1000}
+                for nombre, (n, total, maximo) in self._tiempos.items()
+            }
+
+
+def formatear_stats(datos: dict, limite: int = 5) -> str:
+    """Texto para el panel de estadísticas: las rutas que más tiempo consumen."""
+    if not datos:
+        return "🧭 *Rutas:* sin tráfico todavía"
+    top = sorted(datos.items(), key=lambda kv: kv[1]['llamadas'] * kv[1]['media_ms'], reverse=True)[:limite]
+    lines = ["🧭 *Rutas (más tiempo total):*"]
+    for nombre, d in top:
+        nombre = nombre.replace('_', '\\_')  # Markdown
+        lines.append(f"• {nombre}: {d['llamadas']}× — media {d['media_ms']:.0f} ms — máx {d['max_ms']:.0f} ms")
+    return "\n".join(lines)
+
+
+# ========================= INSTANCIA POR BOT =========================
+_routers = weakref.WeakKeyDictionary()
+_routers_lock = threading.Lock()
+
+def get_router(bot: TeleBot) -> Router:
+    """Router del *bot* (admin_handlers y payments_handlers registran en el mismo)."""
+    with _routers_lock:
+        router = _routers.get(bot)
+        if router is None:
+            router = _routers[bot] = Router(bot)
+        return router
@@ -2,31 +2,159 @@
 
 import os
 import json
+import atexit
+import tempfile
+import threading
+from contextlib import contextmanager
 
-def load_json(path: str) -> dict:
+try:
+    import fcntl  # bloqueo entre procesos (solo POSIX)
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+# Retardo para agrupar escrituras seguidas del mismo fichero (save_json_later)
+FLUSH_DELAY = 0.5
+
+# ========================= BLOQUEOS =========================
+_path_locks = {}
+_path_locks_guard = threading.Lock()
+_flocks_held = set()  # rutas con flock tomado (solo se modifica con su RLock)
+
+def _path_lock(path: str) -> threading.RLock:
+    key = os.path.abspath(path)
+    with _path_locks_guard:
+        lock = _path_locks.get(key)
+        if lock is None:
+            lock = _path_locks[key] = threading.RLock()
+        return lock
+
+@contextmanager
+def locked(path: str):
     """
-    Carga y devuelve un diccionario desde el JSON indicado.
-    Si no existe el fichero, crea la carpeta y devuelve {}.
+    Bloqueo exclusivo de *path*: lock en proceso (hilos de polling, watcher…)
+    más flock sobre `<path>.lock` para otros procesos.
     """
-    folder = os.path.dirname(path)
-    if folder and not os.path.isdir(folder):
-        os.makedirs(folder, exist_ok=True)
-    if not os.path.isfile(path):
-        with open(path, 'w') as f:
-            json.dump({}, f, indent=2)
-        return {}
+    key = os.path.abspath(path)
+    with _path_lock(key):
+        # flock solo en la adquisición más externa (el RLock ya es reentrante)
+        if fcntl is None or key in _flocks_held:
+            yield
+            return
+        folder = os.path.dirname(key)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder, exist_ok=True)
+        with open(key + '.lock', 'a') as lf:
+            fcntl.flock(lf, fcntl.LOCK_EX)
+            _flocks_held.add(key)
+            try:
+                yield
+            finally:
+                _flocks_held.discard(key)
+                fcntl.flock(lf, fcntl.LOCK_UN)
+
+# ========================= LECTURA / ESCRITURA =========================
+def _read_json(path: str) -> dict:
     with open(path, 'r') as f:
         try:
             return json.load(f)
         except json.JSONDecodeError:
             return {}
 
-def save_json(path: str, data: dict) -> None:
+def _atomic_write(path: str, data: dict) -> None:
     """
-    Guarda el diccionario en el JSON indicado (reescribe).
+    Escribe en un temporal del mismo directorio, hace fsync y lo renombra
+    sobre *path*: un corte a mitad nunca deja el fichero truncado.
     """
+    folder = os.path.dirname(path) or '.'
+    if not os.path.isdir(folder):
+        os.makedirs(folder, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=folder)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+    # Persistir también la entrada de directorio del rename
+    try:
+        dir_fd = os.open(folder, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+def load_json(path: str) -> dict:
+    """
+    Carga y devuelve un diccionario desde el JSON indicado.
+    Si no existe el fichero, crea la carpeta y devuelve {}.
+    Si hay una escritura agrupada pendiente, devuelve esos datos.
+    """
+    with _pending_lock:
+        if os.path.abspath(path) in _pending:
+            return json.loads(json.dumps(_pending[os.path.abspath(path)]))
     folder = os.path.dirname(path)
     if folder and not os.path.isdir(folder):
         os.makedirs(folder, exist_ok=True)
-    with open(path, 'w') as f:
-        json.dump(data, f, indent=2)
+    if not os.path.isfile(path):
+        with locked(path):
+            if not os.path.isfile(path):
+                _atomic_write(path, {})
+                return {}
+    return _read_json(path)
+
+def save_json(path: str, data: dict) -> None:
+    """
+    Guarda el diccionario en el JSON indicado (reescribe de forma atómica).
+    """
+    with locked(path):
+        _discard_pending(path)
+        _atomic_write(path, data)
+
+# ========================= ESCRITURAS AGRUPADAS =========================
+# save_json_later() deja el último estado de cada fichero en memoria y lo
+# vuelca una sola vez tras FLUSH_DELAY: una ráfaga de N cambios = 1 escritura.
+_pending = {}
+_pending_timers = {}
+_pending_lock = threading.Lock()
+
+def save_json_later(path: str, data: dict, delay: float = FLUSH_DELAY) -> None:
+    key = os.path.abspath(path)
+    with _pending_lock:
+        _pending[key] = data
+        if key not in _pending_timers:
+            timer = threading.Timer(delay, flush_pending, args=(key,))
+            timer.daemon = True
+            _pending_timers[key] = timer
+            timer.start()
+
+def _discard_pending(path: str) -> None:
+    key = os.path.abspath(path)
+    with _pending_lock:
+        _pending.pop(key, None)
+        timer = _pending_timers.pop(key, None)
+    if timer is not None:
+        timer.cancel()
+
+def flush_pending(path: str | None = None) -> None:
+    """Vuelca las escrituras agrupadas pendientes (de *path* o de todos)."""
+    with _pending_lock:
+        keys = [os.path.abspath(path)] if path else list(_pending)
+    for key in keys:
+        with locked(key):
+            with _pending_lock:
+                data = _pending.pop(key, None)
+                timer = _pending_timers.pop(key, None)
+            if timer is not None:
+                timer.cancel()
+            if data is not None:
+                _atomic_write(key, data)
+
+atexit.register(flush_pending)
@@ -0,0 +1,88 @@
+# tests/conftest.py
+#
+# Entorno aislado para las pruebas: config apunta a una carpeta temporal y a un
+# `wg` falso (WG_BIN) que anota cada llamada, copia el fichero de cada
+# `wg syncconf`, que hace de "interfaz en vivo", y responde a genkey/pubkey. Se parchea config antes de
+# importar ningún módulo del bot (los valores por defecto se leen al importar).
+
+import os
+import sys
+import stat
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+
+CARPETA = tempfile.mkdtemp(prefix='franchowire_tests_')
+WG_FALSO = os.path.join(CARPETA, 'wg')
+WG_LOG = os.path.join(CARPETA, 'wg.log')
+WG_VIVO = os.path.join(CARPETA, 'wg_vivo.conf')
+
+config.CLIENTS_DIR = os.path.join(CARPETA, 'clientes')
+config.WG_CONF_PATH = os.path.join(CARPETA, 'wg0.conf')
+config.WG_BIN = WG_FALSO
+config.WG_SUDO = False
+config.GENERATOR_MODE = 'nativo'
+
+with open(WG_FALSO, 'w') as f:
+    # genkey/pubkey (cuando no está cryptography): claves con la forma de las
+    # de `wg`, sin relación criptográfica entre ellas
+    f.write(f'#!/bin/sh\necho "$@" >> {WG_LOG}\n'
+            f'if [ "$1" = syncconf ]; then cp "$3" {WG_VIVO}; fi\n'
+            'if [ "$1" = genkey ]; then head -c 32 /dev/urandom | base64; fi\n'
+            'if [ "$1" = pubkey ]; then echo "$(sha256sum | cut -c1-43)="; fi\n')
+os.chmod(WG_FALSO, os.stat(WG_FALSO).st_mode | stat.S_IXUSR)
+
+INTERFAZ = "[Interface]\nAddress = 10.9.0.1/24\nPrivateKey = servidor\nListenPort = 51820\n"
+
+
+def llamadas_wg() -> list[str]:
+    """Subcomandos de `wg` ejecutados desde el inicio de la prueba."""
+    if not os.path.exists(WG_LOG):
+        return []
+    with open(WG_LOG) as f:
+        return [linea.split()[0] for linea in f if linea.strip()]
+
+
+def interfaz_en_vivo() -> str:
+    """Último fichero aplicado con `wg syncconf` ('' si no hubo ninguno)."""
+    if not os.path.exists(WG_VIVO):
+        return ''
+    with open(WG_VIVO) as f:
+        return f.read()
+
+
+@pytest.fixture
+def entorno():
+    """Carpeta de clientes y wg0.conf vacíos, y singletons del bot sin instanciar."""
+    import client_store
+    import client_index
+    import client_stats
+    import ip_allocator
+    import quota_engine
+    import wg_server_config
+
+    if client_store._client_store is not None:
+        client_store._client_store.close()
+    client_store._client_store = None
+    client_index._index = None
+    client_stats._stats = None
+    ip_allocator._allocator = None
+    quota_engine._engine = None
+    wg_server_config._cache.clear()
+
+    for ruta in (WG_LOG, WG_VIVO):
+        if os.path.exists(ruta):
+            os.unlink(ruta)
+    if os.path.isdir(config.CLIENTS_DIR):
+        for nombre in os.listdir(config.CLIENTS_DIR):
+            ruta = os.path.join(config.CLIENTS_DIR, nombre)
+            if os.path.isfile(ruta):
+                os.unlink(ruta)
+    os.makedirs(config.CLIENTS_DIR, exist_ok=True)
+    with open(config.WG_CONF_PATH, 'w') as f:
+        f.write(INTERFAZ)
+    return CARPETA
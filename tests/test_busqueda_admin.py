@@ -0,0 +1,61 @@
+# tests/test_busqueda_admin.py
+
+from datetime import datetime, timedelta
+
+import pytest
+from telebot import TeleBot
+from telebot.types import Message
+
+import admin_handlers
+from admin_handlers import BUSQUEDAS, register_admin_handlers
+from config import ADMIN_ID
+from generator import create_config
+from router import get_router
+
+TOKEN = '123456:FAKE-token-para-pruebas'
+
+
+def _mensaje(texto: str, uid: int = ADMIN_ID, chat_id: int = ADMIN_ID) -> Message:
+    return Message.de_json({
+        'message_id': 1, 'date': 0, 'text': texto,
+        'chat': {'id': chat_id, 'type': 'group'},
+        'from': {'id': uid, 'is_bot': False, 'first_name': 'x'},
+    })
+
+
+@pytest.fixture
+def router(entorno, monkeypatch):
+    assert create_config('alice', '30 días', datetime.now() + timedelta(days=30))[0]
+    bot = TeleBot(TOKEN, threaded=False)
+    monkeypatch.setattr(bot, 'send_message', lambda *a, **kw: None)
+    register_admin_handlers(bot)
+    BUSQUEDAS.clear()
+    yield get_router(bot)
+    BUSQUEDAS.clear()
+
+
+def _ruta(router, texto, **kw):
+    msg = _mensaje(texto, **kw)
+    ruta = router.resolver(msg)
+    router._despachar(msg)
+    return ruta and ruta[0]
+
+
+def test_otra_ruta_cierra_la_busqueda(router):
+    assert _ruta(router, '♻️ Renovar') == '♻️ Renovar'
+    assert _ruta(router, 'ali') == 'buscar_cliente'
+    assert _ruta(router, '📊 Estadísticas') == '📊 Estadísticas'
+    assert ADMIN_ID not in BUSQUEDAS
+    assert _ruta(router, 'ali') is None
+
+
+def test_solo_el_admin_busca(router):
+    _ruta(router, '❌ Eliminar')
+    assert _ruta(router, 'ali', uid=ADMIN_ID + 1) is None
+
+
+def test_la_busqueda_caduca(router):
+    _ruta(router, '📁 Ver QR')
+    BUSQUEDAS[ADMIN_ID]['hasta'] -= admin_handlers.BUSQUEDA_TTL + 1
+    assert _ruta(router, 'ali') is None
+    assert ADMIN_ID not in BUSQUEDAS
@@ -0,0 +1,72 @@
+# tests/test_client_handlers.py
+
+from datetime import datetime, timedelta
+
+import pytest
+from telebot import TeleBot
+from telebot.types import Message
+
+from admin_handlers import register_admin_handlers
+from client_handlers import register_client_handlers, NO_REGISTRADO
+from generator import create_config
+from router import get_router
+from utils import usuario_de_cliente, clientes_de_usuario
+
+TOKEN = '123456:FAKE-token-para-pruebas'
+UID = 5550001
+
+
+def _mensaje(texto: str, uid: int = UID) -> Message:
+    return Message.de_json({
+        'message_id': 1, 'date': 0, 'text': texto,
+        'chat': {'id': uid, 'type': 'private'},
+        'from': {'id': uid, 'is_bot': False, 'first_name': 'x'},
+        'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(texto)}] if texto[0] == '/' else [],
+    })
+
+
+@pytest.mark.parametrize('nombre, uid', [
+    ('5550001', 5550001),
+    ('Ana_5550001_10181230', 5550001),
+    ('mi_tio_5550001_10181230', 5550001),
+    ('ana_5550001', None),
+    ('alice', None),
+])
+def test_usuario_de_cliente(nombre, uid):
+    assert usuario_de_cliente(nombre) == uid
+
+
+@pytest.fixture
+def panel(entorno, monkeypatch):
+    """(router, mensajes enviados) con los handlers de admin y de cliente registrados."""
+    vence = datetime.now() + timedelta(days=30)
+    for nombre in (str(UID), f'Ana_{UID}_10181230', f'Ana_{UID}1_10181230', 'alice'):
+        assert create_config(nombre, '30 días', vence)[0]
+    bot = TeleBot(TOKEN, threaded=False)
+    enviados = []
+    monkeypatch.setattr(bot, 'send_message', lambda chat_id, texto, **kw: enviados.append((chat_id, texto)))
+    register_admin_handlers(bot)
+    register_client_handlers(bot)
+    return get_router(bot), enviados
+
+
+def test_clientes_de_usuario(panel):
+    assert sorted(clientes_de_usuario(UID)) == sorted([str(UID), f'Ana_{UID}_10181230'])
+    assert clientes_de_usuario(42) == []
+
+
+def test_panel_de_cliente(panel):
+    router, enviados = panel
+    router._despachar(_mensaje('/start'))
+    assert 'Panel de Cliente' in enviados[-1][1]
+
+    router._despachar(_mensaje('📅 Ver vencimiento'))
+    chat_id, texto = enviados[-1]
+    assert chat_id == UID and texto.count('✅ Activa') == 2
+    assert 'alice' not in texto and f'{UID}1' not in texto
+
+
+def test_usuario_sin_clientes(panel):
+    router, enviados = panel
+    router._despachar(_mensaje('📷 Ver código QR', uid=42))
+    assert enviados == [(42, NO_REGISTRADO)]
@@ -0,0 +1,73 @@
+# tests/test_generator.py
+
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+import generator
+from conftest import interfaz_en_vivo
+from client_store import get_client_store
+from ip_allocator import get_ip_allocator
+from wg_server_config import cargar
+
+VENCE = datetime.now() + timedelta(days=30)
+
+
+@pytest.mark.parametrize('nombre', ['', 'a/b', 'alice\n[Peer]', 'alice\n', 'x' * 65])
+def test_nombre_invalido(entorno, nombre):
+    ok, error, _ = generator.create_config_native(nombre, '30 días', VENCE)
+    assert not ok and 'Nombre inválido' in error
+    assert len(cargar()) == 0
+
+
+def test_fallo_del_qr_deshace_el_alta(entorno, monkeypatch):
+    def falla(_):
+        raise OSError("disco lleno")
+    monkeypatch.setattr(generator, 'generate_qr', falla)
+
+    ok, error, _ = generator.create_config_native('alice', '30 días', VENCE)
+    assert not ok and 'disco lleno' in error
+    assert len(cargar()) == 0
+    assert '[Peer]' not in interfaz_en_vivo()
+    assert get_ip_allocator().stats()[0] == 0
+    assert get_client_store().record('alice') is None
+
+
+def test_recrear_un_nombre_existente_no_toca_al_cliente(entorno, monkeypatch):
+    assert generator.create_config_native('alice', '30 días', VENCE)[0]
+    antes = get_client_store().record('alice')
+    with open(generator.ruta_conf_cliente('alice')) as f:
+        conf = f.read()
+
+    # aunque el alta fallara después (QR), no debe llegar a tocar nada
+    def falla(_):
+        raise OSError("disco lleno")
+    monkeypatch.setattr(generator, 'generate_qr', falla)
+    ok, error, _ = generator.create_config_native('alice', '30 días', VENCE)
+    assert not ok and 'Ya existe' in error
+
+    with open(generator.ruta_conf_cliente('alice')) as f:
+        assert f.read() == conf
+    assert get_client_store().record('alice') == antes
+    assert get_ip_allocator().stats()[0] == 1
+    assert list(cargar()) == [cargar().get(antes.public_key)]
+    assert antes.public_key in interfaz_en_vivo()
+
+
+def test_nombre_solo_en_wg0_conf(entorno):
+    conf = cargar()
+    conf.add('externo', 'clave-externa=', '10.9.0.50/32')
+    conf.confirmar()
+    ok, error, _ = generator.create_config_native('externo', '30 días', VENCE)
+    assert not ok and 'Ya existe' in error
+    assert len(cargar()) == 1
+
+
+def test_lote_con_apply_fallido_no_deja_ficheros(entorno, monkeypatch):
+    monkeypatch.setattr(generator, 'add_peers', lambda peers: (False, "wg caído"))
+    res = generator.create_configs_bulk([('ana', '30 días'), ('bob', '15 días')])
+    assert not res['creados'] and res['zip'] is None
+    assert [n for n, _ in res['errores']] == ['ana', 'bob']
+    assert [n for n in os.listdir(generator.CLIENTS_DIR) if n.endswith(('.conf', '.png'))] == []
+    assert get_ip_allocator().stats()[0] == 0
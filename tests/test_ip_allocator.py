@@ -0,0 +1,41 @@
+# tests/test_ip_allocator.py
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import config
+from client_store import get_client_store
+from ip_allocator import IpAllocator, get_ip_allocator
+
+
+def test_reconcile_y_persistencia(tmp_path):
+    ruta = str(tmp_path / 'ip_pool.bin')
+    allocator = IpAllocator('10.9.0.0/29', path=ruta)
+    assert allocator.reconcile(['10.9.0.2/32', '10.9.0.4', 'basura', '192.168.1.2/32', None]) == 2
+    assert allocator.allocate() == '10.9.0.3/32'
+    assert allocator.allocate_many(2) == ['10.9.0.5/32', '10.9.0.6/32']
+    with pytest.raises(RuntimeError):
+        allocator.allocate()   # .0 red, .1 servidor y .7 broadcast reservadas
+
+    recargado = IpAllocator('10.9.0.0/29', path=ruta)
+    assert recargado.stats() == (5, 5)
+    assert recargado.free('10.9.0.4/32') and not recargado.free('10.9.0.4/32')
+    assert not recargado.free('10.9.0.1/32')
+    assert recargado.allocate() == '10.9.0.4/32'
+
+
+def test_arranque_reconcilia_con_wg0_conf_y_el_registro(entorno):
+    with open(config.WG_CONF_PATH, 'a') as f:
+        f.write("\n# ana\n[Peer]\nPublicKey = k-ana\nAllowedIPs = 10.9.0.5/32\n"
+                "\n#~ # bob\n#~ [Peer]\n#~ PublicKey = k-bob\n#~ AllowedIPs = 10.9.0.7/32\n")
+    vence = datetime.now() + timedelta(days=3)
+    store = get_client_store()
+    store.upsert('carla', '30 días', vence, activa=True, direccion='10.9.0.9/32')
+    store.upsert('dani', '30 días', vence, activa=False, direccion='10.9.0.11/32')
+
+    allocator = get_ip_allocator()
+    ocupadas = {f"10.9.0.{i}/32" for i in (5, 7, 9)}
+    assert {d for d in ocupadas if allocator.is_used(d)} == ocupadas   # el suspendido conserva la suya
+    assert not allocator.is_used('10.9.0.11/32')                        # inactivo sin peer: libre
+    assert allocator.stats()[0] == 3
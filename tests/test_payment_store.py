@@ -0,0 +1,68 @@
+# tests/test_payment_store.py
+
+import threading
+
+import pytest
+
+import payment_store as ps
+
+
+@pytest.fixture
+def pedidos(tmp_path):
+    store = ps.PaymentStore(str(tmp_path / 'pagos.db'))
+    yield store
+    store.close()
+
+
+def _en_revision(pedidos, user_id=7):
+    ok, pedido = pedidos.abrir(user_id, 'Ana', 'ana')
+    assert ok
+    pedido = pedidos.transicion(pedido['id'], (ps.PLAN,), ps.METODO, plan='30 días')
+    pedido = pedidos.transicion(pedido['id'], (ps.METODO,), ps.COMPROBANTE, metodo='saldo')
+    return pedidos.transicion(pedido['id'], (ps.COMPROBANTE,), ps.REVISION, receipt_file_id='f1')
+
+
+def test_aprobar_dos_veces_solo_cuenta_una(pedidos):
+    pedido = _en_revision(pedidos)
+    assert pedidos.transicion(pedido['id'], (ps.REVISION,), ps.APROBANDO, cliente='ana_7')
+    assert pedidos.transicion(pedido['id'], (ps.REVISION,), ps.APROBANDO) is None
+    assert pedidos.transicion(pedido['id'], (ps.REVISION,), ps.RECHAZADO) is None
+
+    assert pedidos.transicion(pedido['id'], (ps.APROBANDO,), ps.APROBADO)['estado'] == ps.APROBADO
+    assert pedidos.transicion(pedido['id'], (ps.APROBANDO,), ps.APROBADO) is None
+    assert [v for _, v, _ in pedidos.ventas_por_dia()] == [1]
+    assert pedidos.abierto(7) is None
+
+
+def test_aprobaciones_concurrentes(pedidos):
+    pedido = _en_revision(pedidos)
+    ganadores = []
+
+    def aprobar():
+        if pedidos.transicion(pedido['id'], (ps.REVISION,), ps.APROBANDO):
+            ganadores.append(threading.current_thread().name)
+
+    hilos = [threading.Thread(target=aprobar) for _ in range(8)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    assert len(ganadores) == 1
+
+
+def test_un_solo_pedido_abierto_por_usuario(pedidos):
+    ok, primero = pedidos.abrir(7)
+    ok2, segundo = pedidos.abrir(7)   # reabrir mientras lo rellena: cancela el anterior
+    assert ok and ok2 and segundo['id'] != primero['id']
+    assert pedidos.get(primero['id'])['estado'] == ps.CANCELADO
+
+    en_revision = _en_revision(pedidos, user_id=8)
+    ok, actual = pedidos.abrir(8)
+    assert not ok and actual['id'] == en_revision['id']
+    assert pedidos.estado(8) == ps.REVISION
+
+
+def test_campos_desconocidos(pedidos):
+    ok, pedido = pedidos.abrir(7)
+    with pytest.raises(ValueError):
+        pedidos.transicion(pedido['id'], (ps.PLAN,), ps.METODO, estado='aprobado')
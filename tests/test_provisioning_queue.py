@@ -0,0 +1,29 @@
+# tests/test_provisioning_queue.py
+
+import threading
+
+from provisioning_queue import ProvisioningQueue
+from wg_server_config import cargar
+
+
+def test_alta_masiva_en_la_cola(entorno):
+    cola = ProvisioningQueue(workers=1, max_pendientes=4)
+    hecho = threading.Event()
+    entregas = []
+
+    def on_done(ok, res):
+        entregas.append((ok, res, threading.current_thread().name))
+        hecho.set()
+
+    ok, posicion = cola.submit_bulk([('ana', '30 días'), ('bob', '15 días'), ('mal/nombre', '30 días')],
+                                    on_done=on_done)
+    assert ok and posicion == 1
+    assert hecho.wait(60)
+    cola.shutdown()
+
+    ok, res, hilo = entregas[0]
+    assert ok and hilo.startswith('provision')
+    assert [n for n, _, _ in res['creados']] == ['ana', 'bob']
+    assert [n for n, _ in res['errores']] == ['mal/nombre']
+    assert res['zip'] and len(cargar()) == 2
+    assert cola.stats()['completados'] == 1
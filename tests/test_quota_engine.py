@@ -0,0 +1,64 @@
+# tests/test_quota_engine.py
+
+import os
+import time
+from datetime import datetime, timedelta
+
+import config
+from conftest import interfaz_en_vivo
+from client_store import get_client_store
+from generator import create_config
+from peer_telemetry import PeerTelemetry
+from quota_engine import QuotaEngine
+from utils import renew_config
+from wg_server_config import cargar
+
+
+def _dump(peers: dict) -> str:
+    """Dump de `wg show wg0 dump` con {public_key: bytes en cada sentido}."""
+    lineas = ["privada\tpublica\t51820\toff"]
+    lineas += [f"{k}\t(none)\t(none)\t10.9.0.0/32\t{int(time.time())}\t{b}\t{b}\t25" for k, b in peers.items()]
+    return "\n".join(lineas) + "\n"
+
+
+def test_suspender_por_cuota_y_reactivar_al_renovar(entorno, monkeypatch):
+    monkeypatch.setitem(config.PLANS['30 días'], 'cuota_gb', 1e-6)   # ~1073 bytes
+    for nombre in ('ana', 'bob'):
+        assert create_config(nombre, '30 días', datetime.now() + timedelta(days=3))[0]
+    store = get_client_store()
+    ana, bob = store.record('ana'), store.record('bob')
+
+    eventos = []
+    motor = QuotaEngine(snapshot=os.path.join(entorno, 'clientes', 'consumo.json'), store=store,
+                        on_aviso=lambda avisos: eventos.append(('aviso', avisos)),
+                        on_suspension=lambda excedidos, error: eventos.append(('suspension', excedidos, error)))
+    motor.load()
+    store.add_listener(motor.on_store_event)
+    telemetria = PeerTelemetry()
+    telemetria.add_listener(motor.on_muestra)
+
+    telemetria.ingerir(_dump({ana.public_key: 0, bob.public_key: 0}))
+    telemetria.ingerir(_dump({ana.public_key: 450, bob.public_key: 10}))
+    assert eventos == [('aviso', [('ana', 900, 1073)])]
+
+    telemetria.ingerir(_dump({ana.public_key: 600, bob.public_key: 20}))
+    assert eventos[-1] == ('suspension', [('ana', 1200, 1073)], None)
+    assert motor.suspendidos() == ['ana']
+    assert not store.record('ana').activa
+    assert not cargar().get(ana.public_key).activo
+    assert ana.public_key not in interfaz_en_vivo() and bob.public_key in interfaz_en_vivo()
+
+    # reinicio: instantánea + log, la suspensión sigue vigente
+    motor.close()
+    motor = QuotaEngine(snapshot=os.path.join(entorno, 'clientes', 'consumo.json'), store=store)
+    motor.load()
+    store.add_listener(motor.on_store_event)
+    assert motor.suspendidos() == ['ana'] and motor.uso('ana') == (1200, 1073)
+
+    ok, _ = renew_config('ana')
+    assert ok
+    assert motor.suspendidos() == [] and motor.uso('ana')[0] == 0
+    assert store.record('ana').activa
+    assert cargar().get(ana.public_key).activo
+    assert f"AllowedIPs = {ana.direccion}" in interfaz_en_vivo()
+    motor.close()
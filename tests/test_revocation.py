@@ -0,0 +1,88 @@
+# tests/test_revocation.py
+
+import os
+from datetime import datetime, timedelta
+
+from conftest import interfaz_en_vivo, llamadas_wg
+from client_store import get_client_store
+from generator import create_config
+from ip_allocator import get_ip_allocator
+from revocation import RevocationEngine, formatear_informe
+from qr_cache import get_qr_cache, hash_contenido
+from utils import renew_config, delete_config, ruta_conf_cliente
+from wg_server_config import cargar
+
+
+def _crear(nombre):
+    ok, conf_path, _ = create_config(nombre, '30 días', datetime.now() + timedelta(days=30))
+    assert ok, conf_path
+    return get_client_store().record(nombre)
+
+
+def test_vencer_y_renovar_reconecta_con_la_misma_direccion(entorno):
+    alice = _crear('alice')
+    assert alice.public_key in interfaz_en_vivo()
+
+    informe = RevocationEngine().revoke(['alice'])
+    assert informe == {'revocados': ['alice'], 'sin_peer': [], 'error': None}
+    assert alice.public_key not in interfaz_en_vivo()
+    assert not get_client_store().record('alice').activa
+    # el bloque queda comentado y la dirección reservada
+    assert not cargar().get(alice.public_key).activo
+    assert get_ip_allocator().is_used(alice.direccion)
+
+    bob = _crear('bob')
+    assert bob.direccion != alice.direccion
+
+    ok, fecha = renew_config('alice')
+    assert ok and fecha > datetime.now()
+    rec = get_client_store().record('alice')
+    assert rec.activa and rec.direccion == alice.direccion
+    vivo = interfaz_en_vivo()
+    assert alice.public_key in vivo and f"AllowedIPs = {alice.direccion}" in vivo
+    assert bob.public_key in vivo
+    assert cargar().get(alice.public_key).activo
+
+
+def test_renovar_sin_bloque_da_de_alta_otra_vez(entorno):
+    alice = _crear('alice')
+    RevocationEngine().revoke(['alice'], quitar=True)
+    assert alice.public_key not in cargar()
+    assert not get_ip_allocator().is_used(alice.direccion)
+
+    ok, _ = renew_config('alice')
+    assert ok
+    assert f"AllowedIPs = {alice.direccion}" in interfaz_en_vivo()
+    assert get_ip_allocator().is_used(alice.direccion)
+
+
+def test_renovar_sin_bloque_con_la_direccion_ocupada_falla(entorno):
+    alice = _crear('alice')
+    RevocationEngine().revoke(['alice'], quitar=True)
+    bob = _crear('bob')
+    assert bob.direccion == alice.direccion  # la dirección liberada se reutiliza
+
+    ok, fecha = renew_config('alice')
+    assert not ok and fecha is None
+    assert not get_client_store().record('alice').activa
+    assert alice.public_key not in interfaz_en_vivo()
+
+
+def test_eliminar_borra_el_bloque_y_libera_la_direccion(entorno):
+    alice = _crear('alice')
+    with open(ruta_conf_cliente('alice'), 'rb') as f:
+        clave_qr = hash_contenido(f.read())
+    cache = get_qr_cache()
+    assert os.path.exists(cache._ruta(clave_qr))
+    RevocationEngine().revoke(['alice'])
+    assert delete_config('alice')
+    assert not os.path.exists(cache._ruta(clave_qr)) and clave_qr not in cache._memoria
+    assert alice.public_key not in cargar()
+    assert not get_ip_allocator().is_used(alice.direccion)
+    assert get_client_store().record('alice') is None
+    assert llamadas_wg().count('syncconf') == 3  # alta, suspensión y baja
+
+
+def test_informe_escapa_los_nombres():
+    texto = formatear_informe({'revocados': ['ana_1'], 'sin_peer': ['bob*'], 'error': None})
+    assert 'ana\\_1' in texto and 'bob\\*' in texto
@@ -0,0 +1,69 @@
+# tests/test_wg_server_config.py
+
+import os
+
+import config
+from conftest import WG_LOG, interfaz_en_vivo
+from wg_server_config import cargar
+
+
+def test_syncconf_no_saca_la_clave_privada_del_directorio(entorno):
+    conf = cargar()
+    conf.add('ana', 'clave-ana', '10.9.0.2/32')
+    assert conf.confirmar() == (True, "")
+
+    with open(WG_LOG) as f:
+        _, _, ruta = f.read().split()
+    assert os.path.dirname(ruta) == os.path.dirname(config.WG_CONF_PATH)
+    assert not os.path.exists(ruta)
+    assert 'PrivateKey = servidor' in interfaz_en_vivo()
+
+
+def test_syncconf_fallido_no_toca_el_fichero(entorno):
+    with open(config.WG_CONF_PATH) as f:
+        antes = f.read()
+    conf = cargar()
+    conf.add('ana', 'clave-ana', '10.9.0.2/32')
+
+    ok, error = conf.confirmar(wg_bin='/bin/false')
+    assert not ok and 'código 1' in error
+    with open(config.WG_CONF_PATH) as f:
+        assert f.read() == antes
+    # el modelo con el cambio sin aplicar se descarta: se relee del fichero
+    assert cargar() is not conf and 'clave-ana' not in cargar()
+
+    conf = cargar()
+    conf.add('ana', 'clave-ana', '10.9.0.2/32')
+    assert conf.confirmar() == (True, "")
+    assert 'clave-ana' in cargar()
+
+
+def test_interfaz_caida_guarda_el_fichero(entorno, tmp_path):
+    wg = tmp_path / 'wg'
+    wg.write_text('#!/bin/sh\necho "Unable to access interface: No such device" >&2\nexit 1\n')
+    wg.chmod(0o755)
+    conf = cargar()
+    conf.add('ana', 'clave-ana', '10.9.0.2/32')
+
+    ok, aviso = conf.confirmar(wg_bin=str(wg))
+    assert ok and 'no está activa' in aviso
+    assert 'clave-ana' in cargar()
+    assert conf.cambios() == ([], [], [])   # no se reintenta hasta el próximo cambio
+
+
+def test_parse_render_suspendidos_y_duplicados(entorno):
+    texto = ("[Interface]\nPrivateKey = servidor\n\n"
+             "# ana\n[Peer]\nPublicKey = vieja\nAllowedIPs = 10.9.0.2/32\n\n"
+             "#~ # bob\n#~ [Peer]\n#~ PublicKey = k-bob\n#~ AllowedIPs = 10.9.0.3/32\n\n"
+             "# ana\n[Peer]\nPublicKey = nueva\nAllowedIPs = 10.9.0.2/32\n")
+    with open(config.WG_CONF_PATH, 'w') as f:
+        f.write(texto)
+    conf = cargar()
+    assert [p.public_key for p in conf] == ['k-bob', 'nueva']
+    assert conf.duplicados == ['vieja'] and not conf.get('k-bob').activo
+    assert conf.cambios() == ([], ['vieja'], [])   # el peer sustituido sale de la interfaz
+    assert 'k-bob' not in conf.render_wg()
+
+    assert conf.confirmar() == (True, "")
+    recargado = cargar()
+    assert recargado.render() == conf.render() and 'vieja' not in recargado
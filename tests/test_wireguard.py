@@ -0,0 +1,22 @@
+# tests/test_wireguard.py
+
+import pytest
+
+import wireguard
+from conftest import llamadas_wg
+
+sin_cryptography = pytest.mark.skipif(wireguard.X25519PrivateKey is not None,
+                                      reason="con cryptography las claves no pasan por `wg`")
+
+
+@sin_cryptography
+def test_claves_con_wg_genkey_y_pubkey(entorno):
+    privada, publica = wireguard.generar_par_claves()
+    assert len(privada) == 44 and len(publica) == 44 and privada != publica
+    assert llamadas_wg() == ['genkey', 'pubkey']
+
+
+@sin_cryptography
+def test_fallo_de_wg_genkey():
+    with pytest.raises(RuntimeError, match='genkey'):
+        wireguard.generar_par_claves(wg_bin='/bin/false')
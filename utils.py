@@ -1,16 +1,28 @@
 # utils.py  ✅ Revisado y alineado con admin_handlers.py
+#
+# El registro de clientes (ruta, esquema y acceso) vive en client_store.py.
 
 import os
-import json
-import qrcode
+import io
+import re
 from datetime import datetime, timedelta
 
 from config import CLIENTS_DIR, PLANS
+from client_store import get_client_store
+from client_index import get_client_index
+from client_stats import get_client_stats
+from qr_cache import get_qr_cache
 
-# 👉  La ruta debe ser la MISMA que usa admin_handlers.py
-DATA_DIR = os.path.join(CLIENTS_DIR, "..", "data")
-os.makedirs(DATA_DIR, exist_ok=True)                           # crea data/ si no existe
-CONFIGS_FILE = os.path.join(DATA_DIR, "configuraciones.json")  # data/configuraciones.json
+# Tope de clientes de un mismo usuario en su panel
+MAX_CLIENTES_POR_USUARIO = 20
+
+
+# ========================= TEXTO =========================
+def escapar_md(s: str) -> str:
+    """Escapa los caracteres especiales de Markdown (nombres con '_', etc.)."""
+    for c in ('_', '*', '`', '['):
+        s = s.replace(c, '\\' + c)
+    return s
 
 
 # ========================= RUTAS =========================
@@ -24,30 +36,41 @@ def ruta_qr_cliente(nombre: str) -> str:
     return os.path.join(CLIENTS_DIR, f"{nombre}.png")
 
 
-# ========================= ALTA / BAJA EN JSON =========================
-def _leer_configs():
-    if not os.path.exists(CONFIGS_FILE):
-        return {}
-    with open(CONFIGS_FILE, "r") as f:
-        return json.load(f)
+# ========================= ALTA / BAJA EN EL REGISTRO =========================
+def registrar_config(cliente: str, plan: str, vencimiento: datetime,
+                     public_key: str | None = None, direccion: str | None = None):
+    """
+    Guarda (o actualiza) la entrada de *cliente* en el registro de clientes.
+    """
+    get_client_store().upsert(cliente, plan, vencimiento, activa=True,
+                              public_key=public_key, direccion=direccion)
 
 
-def _guardar_configs(data: dict):
-    with open(CONFIGS_FILE, "w") as f:
-        json.dump(data, f, indent=2)
+def cargar_cliente(nombre: str) -> dict | None:
+    """Registro de *nombre* (plan, vencimiento, activa, ...) o None."""
+    return get_client_store().get(nombre)
 
 
-def registrar_config(cliente: str, plan: str, vencimiento: datetime):
-    """
-    Guarda (o actualiza) la entrada de *cliente* en configuraciones.json
-    """
-    data = _leer_configs()
-    data[cliente] = {
-        "plan": plan,
-        "vencimiento": vencimiento.strftime("%Y-%m-%d %H:%M"),
-        "activa": True
-    }
-    _guardar_configs(data)
+# ========================= CLIENTES DE UN USUARIO =========================
+# Los clientes de un usuario de Telegram llevan su ID en el nombre: "<uid>"
+# (altas del admin para ese usuario) o "<nombre>_<uid>_<MMDDHHMM>" (compras).
+_NOMBRE_COMPRA = re.compile(r'.+_(\d+)_\d{8}')
+
+
+def usuario_de_cliente(nombre: str) -> int | None:
+    """ID de Telegram del dueño de *nombre*, o None si no se puede saber."""
+    if nombre.isdigit():
+        return int(nombre)
+    m = _NOMBRE_COMPRA.fullmatch(nombre)
+    return int(m.group(1)) if m else None
+
+
+def clientes_de_usuario(uid: int) -> list[str]:
+    """Clientes registrados de *uid* (por el índice de nombres, sin recorrer el registro)."""
+    nombres = [str(uid)] if get_client_store().exists(str(uid)) else []
+    candidatos, _ = get_client_index().buscar(f"_{uid}_", 0, MAX_CLIENTES_POR_USUARIO)
+    nombres += [n for n in candidatos if usuario_de_cliente(n) == uid]
+    return nombres
 
 
 # ========================= VENCIMIENTOS =========================
@@ -60,90 +83,116 @@ def calcular_nuevo_vencimiento(plan: str) -> datetime:
 
 # ========================= QR =========================
 def generate_qr(ruta_conf: str) -> str:
-    """Genera y guarda un QR a partir de un .conf; devuelve la ruta del .png."""
+    """
+    Guarda el QR de un .conf junto a él; devuelve la ruta del .png.
+    El PNG sale de la caché por contenido (solo se renderiza si el .conf es nuevo).
+    """
     if not os.path.exists(ruta_conf):
         raise FileNotFoundError(f"No existe {ruta_conf}")
-    with open(ruta_conf, "r") as f:
-        contenido = f.read()
+    png = get_qr_cache().png_de_conf(ruta_conf)
 
-    img = qrcode.make(contenido)
     qr_path = ruta_qr_cliente(os.path.splitext(os.path.basename(ruta_conf))[0])
-    img.save(qr_path)
+    try:
+        with open(qr_path, "rb") as f:
+            if f.read() == png:
+                return qr_path  # ya está al día
+    except OSError:
+        pass
+    with open(qr_path, "wb") as f:
+        f.write(png)
     return qr_path
 
 
+def generar_qr_desde_conf(ruta_conf: str) -> io.BytesIO | None:
+    """QR de un .conf como archivo en memoria (para send_photo); None si falla."""
+    try:
+        buf = io.BytesIO(get_qr_cache().png_de_conf(ruta_conf))
+    except Exception as e:
+        print(f"[utils] No se pudo generar el QR de {ruta_conf}: {e}")
+        return None
+    buf.name = os.path.splitext(os.path.basename(ruta_conf))[0] + ".png"
+    return buf
+
+
 # ========================= ESTADÍSTICAS =========================
 def get_stats() -> tuple[int, int]:
-    """Devuelve (activos, expirados) a la fecha actual."""
-    data = _leer_configs()
-    ahora = datetime.now()
-    activos = sum(datetime.strptime(v["vencimiento"], "%Y-%m-%d %H:%M") > ahora
-                  for v in data.values())
-    expirados = len(data) - activos
-    return activos, expirados
+    """Devuelve (activos, expirados) a la fecha actual (índice incremental, sin recorrer el registro)."""
+    resumen = get_client_stats().resumen()
+    return resumen['activos'], resumen['expirados']
 
 
 # ========================= RENOVACIÓN =========================
-def renew_config(nombre: str) -> tuple[bool, datetime | None]:
-    """Renueva la config de *nombre* (mismo plan) y devuelve (ok, nueva_fecha)."""
-    data = _leer_configs()
-    if nombre not in data:
+def renew_config(nombre: str, plan: str | None = None) -> tuple[bool, datetime | None]:
+    """
+    Renueva la config de *nombre* (con *plan*, o el mismo que tenía) y la
+    reactiva. Devuelve (ok, nueva_fecha).
+    """
+    from revocation import RevocationEngine
+
+    store = get_client_store()
+    with store.lock:
+        rec = store.record(nombre)
+        if rec is None:
+            return False, None
+
+        plan = plan or rec.plan
+        nueva_fecha = calcular_nuevo_vencimiento(plan)
+
+    # El peer suspendido al vencer (o por cuota) vuelve a la interfaz antes de
+    # reactivar el registro: si no se puede, la renovación no se aplica
+    ok, aviso = RevocationEngine().reactivar(nombre)
+    if not ok:
+        print(f"[utils] renew_config({nombre}): {aviso}")
         return False, None
+    if aviso:
+        print(f"[utils] {aviso}")
 
-    plan = data[nombre]["plan"]
-    nueva_fecha = calcular_nuevo_vencimiento(plan)
-    data[nombre]["vencimiento"] = nueva_fecha.strftime("%Y-%m-%d %H:%M")
-    _guardar_configs(data)
+    # Fuera del lock: los oyentes del store (cuotas, vencimientos) toman sus
+    # propios locks y pueden llamar a `wg`
+    store.upsert(nombre, plan, nueva_fecha, activa=True)
     return True, nueva_fecha
 
 
 # ========================= ELIMINACIÓN =========================
 def delete_config(nombre: str) -> bool:
-    """Elimina archivos y entrada JSON; True si algo se borró."""
+    """
+    Elimina archivos, peer (wg0 + wg0.conf, liberando su dirección) y entrada
+    del registro; True si algo se borró.
+    """
+    from revocation import RevocationEngine
+
     removed = False
 
-    # Archivos
+    # Peer y dirección
+    if get_client_store().exists(nombre):
+        informe = RevocationEngine().revoke([nombre], quitar=True)
+        if informe['error']:
+            print(f"[utils] delete_config({nombre}): {informe['error']}")
+
+    # Archivos (el QR en caché antes que el .conf: se localiza por su contenido)
+    get_qr_cache().olvidar(ruta_conf_cliente(nombre))
     for path in (ruta_conf_cliente(nombre), ruta_qr_cliente(nombre)):
         if os.path.exists(path):
             os.remove(path)
             removed = True
 
-    # JSON
-    data = _leer_configs()
-    if nombre in data:
-        data.pop(nombre)
-        _guardar_configs(data)
+    # Registro
+    if get_client_store().delete(nombre):
         removed = True
 
     return removed
-    # --- utils.py (añadir al final) ---
-import json
-import os
-from datetime import datetime
 
-# Asegúrate de tener arriba:
-# CONFIGS_FILE = os.path.join(CLIENTS_DIR, 'configuraciones.json')
 
-def registrar_config(cliente: str, plan: str, vencimiento: datetime) -> None:
-    """
-    Registra/actualiza una configuración en CLIENTS_DIR/configuraciones.json
-    sin tocar el resto de utilidades.
-    """
-    os.makedirs(CLIENTS_DIR, exist_ok=True)
-
-    datos = {}
-    if os.path.isfile(CONFIGS_FILE):
-        try:
-            with open(CONFIGS_FILE, 'r') as f:
-                datos = json.load(f) or {}
-        except json.JSONDecodeError:
-            datos = {}
-
-    datos[cliente] = {
-        "plan": plan,
-        "vencimiento": vencimiento.strftime("%Y-%m-%d %H:%M"),
-        "activa": True
-    }
-
-    with open(CONFIGS_FILE, 'w') as f:
-        json.dump(datos, f, indent=2)
+# ========================= TELEGRAM =========================
+def chat_de_update(update) -> int | None:
+    """Chat al que pertenece un Update (para ordenar/repartir por chat)."""
+    for campo in ('message', 'edited_message', 'callback_query', 'inline_query'):
+        obj = getattr(update, campo, None)
+        if obj is None:
+            continue
+        if campo == 'callback_query':
+            return obj.message.chat.id if obj.message else obj.from_user.id
+        if campo == 'inline_query':
+            return obj.from_user.id
+        return obj.chat.id
+    return None
@@ -0,0 +1,181 @@
+# webhook_server.py
+#
+# Modo webhook del bot (BOT_MODE = 'webhook').
+# - Servidor HTTP embebido (stdlib, ThreadingHTTPServer) que recibe los updates
+#   que Telegram envía por POST a WEBHOOK_PATH.
+# - Verifica la cabecera X-Telegram-Bot-Api-Secret-Token (WEBHOOK_SECRET); si no
+#   coincide, 403.
+# - Encola cada update y responde 200 al instante; WEBHOOK_WORKERS hilos los
+#   procesan con bot.process_new_updates. Cada chat va siempre al mismo hilo
+#   (chat_id % workers), así sus updates se atienden en orden.
+# - Colas acotadas (WEBHOOK_COLA_MAX en total): si la del chat está llena, se
+#   responde 503 con Retry-After y Telegram reintenta más tarde (contrapresión).
+#
+# TLS: Telegram solo llama a URLs HTTPS. Lo normal es poner el servidor detrás de
+# un proxy inverso (nginx, caddy); también puede servir TLS directamente con
+# WEBHOOK_SSL_CERT / WEBHOOK_SSL_KEY.
+
+import hmac
+import json
+import queue
+import secrets
+import ssl
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from telebot import TeleBot
+from telebot.types import Update
+
+from config import (
+    WEBHOOK_HOST,
+    WEBHOOK_PORT,
+    WEBHOOK_PATH,
+    WEBHOOK_URL,
+    WEBHOOK_SECRET,
+    WEBHOOK_WORKERS,
+    WEBHOOK_COLA_MAX,
+    WEBHOOK_SSL_CERT,
+    WEBHOOK_SSL_KEY,
+)
+from utils import chat_de_update
+
+# Tamaño máximo del cuerpo de un update (Telegram envía unos pocos KiB)
+MAX_CUERPO = 1 << 20
+
+
+class WebhookServer:
+
+    def __init__(self, bot: TeleBot, host: str = WEBHOOK_HOST, port: int = WEBHOOK_PORT,
+                 path: str = WEBHOOK_PATH, secret: str | None = WEBHOOK_SECRET,
+                 workers: int = WEBHOOK_WORKERS, cola_max: int = WEBHOOK_COLA_MAX):
+        self.bot = bot
+        self.path = path
+        # Sin secreto configurado se genera uno por arranque (se registra en set_webhook)
+        self.secret = secret or secrets.token_urlsafe(32)
+        self._colas = [queue.Queue(maxsize=max(1, cola_max // workers)) for _ in range(workers)]
+        self._hilos = []
+        self._lock = threading.Lock()
+        self.recibidos = 0
+        self.procesados = 0
+        self.rechazados = 0   # 503 por cola llena
+        self.prohibidos = 0   # 403 por secreto incorrecto
+        self.errores = 0
+        servidor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                codigo, cabeceras = servidor._recibir(self)
+                self.send_response(codigo)
+                for k, v in cabeceras.items():
+                    self.send_header(k, v)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def do_GET(self):
+                self.send_response(405)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        if WEBHOOK_SSL_CERT and WEBHOOK_SSL_KEY:
+            contexto = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            contexto.load_cert_chain(WEBHOOK_SSL_CERT, WEBHOOK_SSL_KEY)
+            self.httpd.socket = contexto.wrap_socket(self.httpd.socket, server_side=True)
+        self.port = self.httpd.server_address[1]
+
+    # ========================= RECEPCIÓN =========================
+    def _recibir(self, req) -> tuple[int, dict]:
+        if req.path != self.path:
+            return 404, {}
+        token = req.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+        if not hmac.compare_digest(token.encode(), self.secret.encode()):
+            with self._lock:
+                self.prohibidos += 1
+            return 403, {}
+        largo = int(req.headers.get('Content-Length') or 0)
+        if not 0 < largo <= MAX_CUERPO:
+            return 400, {}
+        try:
+            update = Update.de_json(json.loads(req.rfile.read(largo)))
+        except (ValueError, KeyError, TypeError):
+            return 400, {}
+
+        chat_id = chat_de_update(update) or 0
+        try:
+            self._colas[chat_id % len(self._colas)].put_nowait(update)
+        except queue.Full:
+            with self._lock:
+                self.rechazados += 1
+            return 503, {'Retry-After': '1'}
+        with self._lock:
+            self.recibidos += 1
+        return 200, {}
+
+    # ========================= PROCESAMIENTO =========================
+    def _worker(self, cola: queue.Queue) -> None:
+        while True:
+            update = cola.get()
+            if update is None:
+                return
+            try:
+                self.bot.process_new_updates([update])
+                with self._lock:
+                    self.procesados += 1
+            except Exception as e:
+                with self._lock:
+                    self.errores += 1
+                print(f"[webhook_server] error procesando update {update.update_id}: {e}")
+            finally:
+                cola.task_done()
+
+    def start(self) -> 'WebhookServer':
+        """Arranca los workers y el servidor HTTP (en segundo plano)."""
+        for i, cola in enumerate(self._colas):
+            hilo = threading.Thread(target=self._worker, args=(cola,), name=f'webhook-{i}', daemon=True)
+            hilo.start()
+            self._hilos.append(hilo)
+        threading.Thread(target=self.httpd.serve_forever, name='webhook-http', daemon=True).start()
+        return self
+
+    def stop(self, esperar: bool = True) -> None:
+        """Deja de aceptar updates y (si *esperar*) procesa los ya encolados."""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        for cola in self._colas:
+            cola.put(None)
+        if esperar:
+            for hilo in self._hilos:
+                hilo.join()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'recibidos': self.recibidos,
+                'procesados': self.procesados,
+                'rechazados': self.rechazados,
+                'prohibidos': self.prohibidos,
+                'errores': self.errores,
+                'en_cola': sum(c.qsize() for c in self._colas),
+            }
+
+
+def run_webhook_bot(bot: TeleBot) -> None:
+    """Punto de entrada del modo webhook desde main.py (bloquea)."""
+    if not WEBHOOK_URL:
+        raise SystemExit("[webhook_server] BOT_MODE = 'webhook' requiere WEBHOOK_URL en config.py")
+    servidor = WebhookServer(bot).start()
+    bot.remove_webhook()
+    bot.set_webhook(url=WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH, secret_token=servidor.secret,
+                    max_connections=WEBHOOK_WORKERS * 5)
+    print(f"[webhook_server] escuchando en {WEBHOOK_HOST}:{servidor.port}{WEBHOOK_PATH} "
+          f"({WEBHOOK_WORKERS} workers)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.stop()
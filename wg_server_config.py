@@ -0,0 +1,358 @@
+# wg_server_config.py
+#
+# wg0.conf como modelo en memoria en lugar de texto que se va añadiendo.
+# - Parser en proceso: la sección [Interface] (y cualquier otra que no sea
+#   [Peer]) se conserva tal cual; cada [Peer] pasa a un WgPeer en un mapa
+#   indexado por clave pública, con índice por nombre (comentario "# nombre").
+# - Altas, bajas y cambios por clave pública. Un alta con un nombre que ya
+#   tenía otro peer (cliente recreado) sustituye al anterior, y una clave
+#   repetida en el fichero (altas antiguas con `echo >>`) queda una sola vez:
+#   el fichero ya no crece sin límite ni arrastra peers obsoletos.
+# - Peers suspendidos: se escriben comentados con "#~ " (wg-quick no los carga)
+#   y conservan su bloque y su dirección hasta reactivarlos.
+# - Escritura atómica (wireguard.write_server_conf) y aplicación a la interfaz
+#   en vivo con un solo `wg syncconf`, que solo toca los peers que difieren
+#   (las sesiones del resto siguen intactas); si no hay cambios desde la última
+#   aplicación no se ejecuta nada.
+# - cargar() guarda el modelo por ruta y solo vuelve a leer el fichero si cambió
+#   (mtime/tamaño), p. ej. tras una alta con crear_cliente.sh.
+#
+# Todo acceso que modifica el modelo va bajo wireguard.conf_lock.
+
+import os
+import tempfile
+from dataclasses import dataclass, field
+
+from config import WG_BIN, WG_SUDO, WG_INTERFACE, WG_CONF_PATH
+from wireguard import run_wg, read_server_conf, write_server_conf, conf_lock
+
+# Prefijo de las líneas de un peer suspendido
+PREFIJO_SUSPENDIDO = '#~ '
+
+# Claves que entiende `wg syncconf` (el resto son de wg-quick: Address, DNS, PostUp…)
+_CLAVES_WG = {'privatekey', 'listenport', 'fwmark', 'publickey', 'presharedkey',
+              'allowedips', 'endpoint', 'persistentkeepalive'}
+
+
+@dataclass(slots=True)
+class WgPeer:
+    public_key: str
+    nombre: str | None = None
+    opciones: dict = field(default_factory=dict)   # AllowedIPs, PersistentKeepalive, …
+    activo: bool = True
+
+    def firma(self) -> tuple:
+        """Lo que ve la interfaz en vivo (el nombre no cuenta)."""
+        return self.activo, tuple(self.opciones.items())
+
+    def render(self) -> str:
+        lineas = ([f"# {self.nombre}"] if self.nombre else []) + ["[Peer]", f"PublicKey = {self.public_key}"]
+        lineas += [f"{k} = {v}" for k, v in self.opciones.items()]
+        if not self.activo:
+            lineas = [PREFIJO_SUSPENDIDO + linea for linea in lineas]
+        return "\n".join(lineas) + "\n"
+
+
+def _clave_valor(linea: str) -> tuple[str, str] | None:
+    if '=' not in linea:
+        return None
+    clave, valor = linea.split('=', 1)
+    return clave.strip(), valor.strip()
+
+
+class WgServerConfig:
+
+    def __init__(self, interfaz: list[str] | None = None, peers=()):
+        self.interfaz = list(interfaz or [])   # líneas que no son [Peer], tal cual
+        self._peers = {}                       # public_key -> WgPeer
+        self._nombres = {}                     # nombre -> public_key
+        self.duplicados = []                   # claves de peers sustituidos al parsear
+        for peer in peers:
+            self._poner(peer)
+        self._aplicado = self._firmas()
+        self.path = WG_CONF_PATH
+        self.sudo = WG_SUDO
+        self._huella = None
+        self._guardado = None                  # último texto leído o escrito
+
+    # ========================= PARSER / RENDER =========================
+    @classmethod
+    def parse(cls, texto: str) -> 'WgServerConfig':
+        conf = cls()
+        pendientes = []        # comentarios/blancos antes del próximo encabezado
+        peer = None            # [nombre, activo, opciones, clave] del [Peer] en curso
+        en_otra = False        # dentro de una sección que no es [Peer]
+
+        def cerrar():
+            if peer and peer[3]:
+                conf._poner(WgPeer(peer[3], peer[0], peer[2], peer[1]))
+
+        for cruda in texto.splitlines():
+            suspendida = cruda.startswith(PREFIJO_SUSPENDIDO)
+            linea = cruda[len(PREFIJO_SUSPENDIDO):] if suspendida else cruda
+            st = linea.strip()
+            if st.startswith('[') and st.endswith(']'):
+                cerrar()
+                if st.lower() == '[peer]':
+                    nombres = [c.strip().lstrip('#').strip() for c in pendientes if c.strip().startswith('#')]
+                    peer = [nombres[-1] if nombres and nombres[-1] else None, not suspendida, {}, None]
+                    en_otra = False
+                else:
+                    conf.interfaz += pendientes + [cruda]
+                    peer, en_otra = None, True
+                pendientes = []
+            elif not st or st.startswith('#'):
+                pendientes.append(linea if suspendida else cruda)
+            elif en_otra or peer is None:
+                conf.interfaz += pendientes + [cruda]
+                pendientes = []
+            else:
+                kv = _clave_valor(st)
+                if kv and kv[0].lower() == 'publickey':
+                    peer[3] = kv[1]
+                elif kv:
+                    peer[2][kv[0]] = kv[1]
+        cerrar()
+        if peer is None:
+            conf.interfaz += [p for p in pendientes if p.strip()]
+        conf._aplicado = conf._firmas()
+        conf._guardado = texto
+        # los peers sustituidos siguen en la interfaz en vivo hasta el próximo syncconf
+        conf._aplicado.update({k: (True, ()) for k in conf.duplicados})
+        return conf
+
+    def render(self) -> str:
+        """Texto de wg0.conf: secciones no-[Peer] tal cual y un bloque por peer."""
+        cabecera = "\n".join(self.interfaz).rstrip("\n")
+        bloques = [peer.render() for peer in self._peers.values()]
+        return (cabecera + "\n\n" if cabecera else "") + "\n".join(bloques)
+
+    def render_wg(self) -> str:
+        """Formato de `wg syncconf`: sin claves de wg-quick ni peers suspendidos."""
+        lineas = []
+        for cruda in self.interfaz:
+            st = cruda.strip()
+            kv = _clave_valor(st)
+            if st.startswith('[') or (kv and kv[0].lower() in _CLAVES_WG):
+                lineas.append(st)
+        for peer in self._peers.values():
+            if peer.activo:
+                lineas += ["[Peer]", f"PublicKey = {peer.public_key}"]
+                lineas += [f"{k} = {v}" for k, v in peer.opciones.items() if k.lower() in _CLAVES_WG]
+        return "\n".join(lineas) + "\n"
+
+    # ========================= PEERS =========================
+    def _poner(self, peer: WgPeer) -> None:
+        if peer.nombre:
+            previa = self._nombres.get(peer.nombre)
+            if previa is not None and previa != peer.public_key:
+                # cliente recreado con el mismo nombre: el peer anterior sobra
+                self._peers.pop(previa, None)
+                self.duplicados.append(previa)
+            self._nombres[peer.nombre] = peer.public_key
+        anterior = self._peers.get(peer.public_key)
+        if anterior is not None and anterior.nombre and anterior.nombre != peer.nombre:
+            self._nombres.pop(anterior.nombre, None)
+        self._peers[peer.public_key] = peer
+
+    def add(self, nombre: str | None, public_key: str, allowed_ips: str, keepalive: int = 25) -> WgPeer:
+        """Alta (o sustitución, si ya existe la clave o el nombre) de un peer."""
+        peer = WgPeer(public_key, nombre, {'AllowedIPs': allowed_ips, 'PersistentKeepalive': str(keepalive)})
+        self._poner(peer)
+        return peer
+
+    def remove(self, public_key: str) -> WgPeer | None:
+        peer = self._peers.pop(public_key, None)
+        if peer is not None and peer.nombre and self._nombres.get(peer.nombre) == public_key:
+            del self._nombres[peer.nombre]
+        return peer
+
+    def update(self, public_key: str, activo: bool | None = None, **opciones) -> bool:
+        """Cambia opciones (AllowedIPs='…') o el estado activo/suspendido; False si no existe."""
+        peer = self._peers.get(public_key)
+        if peer is None:
+            return False
+        if activo is not None:
+            peer.activo = activo
+        peer.opciones.update({k: str(v) for k, v in opciones.items()})
+        return True
+
+    def get(self, public_key: str) -> WgPeer | None:
+        return self._peers.get(public_key)
+
+    def clave_de(self, nombre: str) -> str | None:
+        return self._nombres.get(nombre)
+
+    def claves_por_nombre(self) -> dict[str, str]:
+        """{nombre: PublicKey} de los peers con comentario "# nombre"."""
+        return dict(self._nombres)
+
+    def direcciones(self) -> set[str]:
+        """IPs (sin máscara) de los AllowedIPs de todos los peers, suspendidos incluidos."""
+        usadas = set()
+        for peer in self._peers.values():
+            for clave, valor in peer.opciones.items():
+                if clave.lower() == 'allowedips':
+                    usadas.update(ip.strip().split('/')[0] for ip in valor.split(','))
+        return usadas
+
+    def __contains__(self, public_key: str) -> bool:
+        return public_key in self._peers
+
+    def __len__(self) -> int:
+        return len(self._peers)
+
+    def __iter__(self):
+        return iter(list(self._peers.values()))
+
+    # ========================= APLICAR =========================
+    def _firmas(self) -> dict:
+        return {k: p.firma() for k, p in self._peers.items()}
+
+    def cambios(self) -> tuple[list[str], list[str], list[str]]:
+        """(altas, bajas, modificados) respecto a la última aplicación/lectura."""
+        actual = self._firmas()
+        altas = [k for k in actual if k not in self._aplicado]
+        bajas = [k for k in self._aplicado if k not in actual]
+        modificados = [k for k, f in actual.items() if k in self._aplicado and self._aplicado[k] != f]
+        return altas, bajas, modificados
+
+    def aplicar(self, interface: str = WG_INTERFACE, wg_bin: str = WG_BIN,
+                sudo: bool | None = None) -> tuple[bool, str]:
+        """
+        Lleva la interfaz en vivo al estado del modelo con UN `wg syncconf`
+        (nada si no hay cambios). Devuelve (ok, aviso): si la interfaz no está
+        levantada, (True, aviso).
+        """
+        if not any(self.cambios()):
+            return True, ""
+        sudo = self.sudo if sudo is None else sudo
+        # El texto lleva la PrivateKey del servidor: nunca sale del directorio de
+        # wg0.conf (temporal 0600 a su lado o, sin permiso de escritura, por stdin)
+        folder = os.path.dirname(self.path) or '.'
+        if os.access(folder, os.W_OK) or not sudo:
+            fd, tmp = tempfile.mkstemp(prefix='.' + os.path.basename(self.path) + '.sync.', dir=folder)
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    f.write(self.render_wg())
+                result = run_wg(["syncconf", interface, tmp], wg_bin=wg_bin, sudo=sudo)
+            finally:
+                os.unlink(tmp)
+        else:
+            result = run_wg(["syncconf", interface, "/dev/stdin"], wg_bin=wg_bin, sudo=sudo,
+                            input_text=self.render_wg())
+        if result.returncode != 0:
+            error = result.stderr.strip() or f"wg salió con código {result.returncode}"
+            if 'no such device' in error.lower() or 'unable to access interface' in error.lower():
+                self._aplicado = self._firmas()
+                return True, (f"La interfaz {interface} no está activa. "
+                              "Los cambios quedan en el archivo pero no se aplicaron aún.")
+            return False, error
+        self._aplicado = self._firmas()
+        self.duplicados = []
+        return True, ""
+
+    def guardar(self) -> None:
+        """Reescribe el fichero de forma atómica (nada si el texto no cambió)."""
+        texto = self.render()
+        if texto == self._guardado:
+            return
+        write_server_conf(texto, self.path, sudo=self.sudo)
+        self._guardado = texto
+        self._huella = _huella(self.path)
+
+    def confirmar(self, interface: str = WG_INTERFACE, wg_bin: str = WG_BIN) -> tuple[bool, str]:
+        """
+        Aplica a la interfaz y, si funcionó, guarda el fichero. Si algo falla el
+        modelo cacheado se descarta (la próxima cargar() relee el fichero).
+        """
+        try:
+            ok, aviso = self.aplicar(interface, wg_bin)
+            if ok:
+                self.guardar()
+        except Exception as e:
+            ok, aviso = False, f"No se pudo escribir {self.path}: {e}"
+        if not ok:
+            _cache.pop(self.path, None)
+        return ok, aviso
+
+
+# ========================= INSTANCIAS POR RUTA =========================
+_cache = {}
+
+def _huella(path: str):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None  # sin permiso de stat (p. ej. /etc/wireguard 0700): releer siempre
+    return st.st_mtime_ns, st.st_size
+
+def cargar(path: str = WG_CONF_PATH, sudo: bool = WG_SUDO) -> WgServerConfig:
+    """Modelo de *path*; solo se vuelve a leer si el fichero cambió. Usar bajo conf_lock para modificar."""
+    with conf_lock:
+        conf = _cache.get(path)
+        huella = _huella(path)
+        if conf is None or huella is None or huella != conf._huella:
+            conf = WgServerConfig.parse(read_server_conf(path, sudo=sudo))
+            conf.path, conf.sudo, conf._huella = path, sudo, huella
+            _cache[path] = conf
+        return conf
+
+
+def depurar(conf_path: str = WG_CONF_PATH, sudo: bool = WG_SUDO, **kw) -> tuple[bool, str]:
+    """
+    Relee wg0.conf tras una modificación externa (crear_cliente.sh) y, si hay
+    peers sustituidos o repetidos, los quita del fichero y de la interfaz.
+    """
+    with conf_lock:
+        conf = cargar(conf_path, sudo)
+        if not any(conf.cambios()):
+            return True, ""
+        return conf.confirmar(**kw)
+
+
+# ========================= ALTAS =========================
+def add_peer(nombre: str, pubkey: str, direccion: str, **kw) -> tuple[bool, str]:
+    """Alta de un solo peer (ver add_peers)."""
+    return add_peers([(nombre, pubkey, direccion)], **kw)
+
+
+def add_peers(peers: list[tuple[str, str, str]], interface: str = WG_INTERFACE,
+              conf_path: str = WG_CONF_PATH, wg_bin: str = WG_BIN, sudo: bool = WG_SUDO) -> tuple[bool, str]:
+    """
+    Único paso privilegiado de un alta (o de un lote): añade los peers
+    [(nombre, pubkey, direccion), ...] al modelo de wg0.conf, los aplica a la
+    interfaz con UN `wg syncconf` y reescribe el fichero, sea cual sea el
+    tamaño del lote. Devuelve (ok, aviso).
+    """
+    if not peers:
+        return True, ""
+    with conf_lock:
+        try:
+            conf = cargar(conf_path, sudo)
+        except Exception as e:
+            return False, f"No se pudo leer {conf_path}: {e}"
+        for nombre, pubkey, direccion in peers:
+            conf.add(nombre, pubkey, direccion)
+        return conf.confirmar(interface, wg_bin)
+
+
+# ========================= BAJAS =========================
+def remove_peer(pubkey: str, **kw) -> tuple[bool, str]:
+    """Baja de un solo peer (ver remove_peers)."""
+    return remove_peers([pubkey], **kw)
+
+
+def remove_peers(claves: list[str], interface: str = WG_INTERFACE, conf_path: str = WG_CONF_PATH,
+                 wg_bin: str = WG_BIN, sudo: bool = WG_SUDO) -> tuple[bool, str]:
+    """Quita los peers *claves* de wg0.conf y de la interfaz (un syncconf). Devuelve (ok, aviso)."""
+    if not claves:
+        return True, ""
+    with conf_lock:
+        try:
+            conf = cargar(conf_path, sudo)
+        except Exception as e:
+            return False, f"No se pudo leer {conf_path}: {e}"
+        for clave in claves:
+            conf.remove(clave)
+        return conf.confirmar(interface, wg_bin)
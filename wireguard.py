@@ -0,0 +1,99 @@
+# wireguard.py
+#
+# Utilidades para la interfaz WireGuard del servidor.
+# - Genera pares de claves Curve25519 en proceso con cryptography; si no está
+#   instalado, con `wg genkey` / `wg pubkey` (nada de criptografía propia).
+# - Ejecuta `wg` (con sudo si WG_SUDO) — el binario es configurable para poder
+#   usar un sustituto falso en pruebas.
+# - Lee/reescribe wg0.conf (esto último de forma atómica). El modelo de peers
+#   (altas, bajas, suspensiones y `wg syncconf`) está en wg_server_config.py.
+
+import os
+import base64
+import subprocess
+import tempfile
+import threading
+
+try:
+    from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+    from cryptography.hazmat.primitives import serialization
+except ImportError:  # dependencia opcional
+    X25519PrivateKey = None
+
+from config import WG_BIN, WG_SUDO, WG_CONF_PATH
+
+# Serializa las modificaciones de wg0.conf dentro del proceso (altas desde la
+# cola de aprovisionamiento, revocaciones desde el vigilante de vencimientos)
+conf_lock = threading.RLock()
+
+
+# ========================= CLAVES =========================
+def generar_par_claves(wg_bin: str = WG_BIN) -> tuple[str, str]:
+    """
+    Devuelve (privada, pública) en base64, como `wg genkey | wg pubkey`.
+    Sin cryptography se ejecutan esos dos comandos (sin sudo: no tocan la interfaz).
+    """
+    if X25519PrivateKey is not None:
+        priv = X25519PrivateKey.generate()
+        priv_raw = priv.private_bytes(serialization.Encoding.Raw,
+                                      serialization.PrivateFormat.Raw,
+                                      serialization.NoEncryption())
+        pub_raw = priv.public_key().public_bytes(serialization.Encoding.Raw,
+                                                 serialization.PublicFormat.Raw)
+        return base64.b64encode(priv_raw).decode(), base64.b64encode(pub_raw).decode()
+
+    result = run_wg(['genkey'], wg_bin, sudo=False)
+    if result.returncode != 0:
+        raise RuntimeError(f"wg genkey falló: {result.stderr.strip()}")
+    privada = result.stdout.strip()
+    result = run_wg(['pubkey'], wg_bin, sudo=False, input_text=privada + "\n")
+    if result.returncode != 0:
+        raise RuntimeError(f"wg pubkey falló: {result.stderr.strip()}")
+    return privada, result.stdout.strip()
+
+
+# ========================= COMANDOS =========================
+def run_wg(args: list[str], wg_bin: str = WG_BIN, sudo: bool = WG_SUDO, input_text: str | None = None):
+    """Ejecuta `wg <args>`; devuelve el CompletedProcess."""
+    cmd = (["sudo"] if sudo else []) + [wg_bin] + list(args)
+    return subprocess.run(cmd, capture_output=True, text=True, input=input_text)
+
+
+# ========================= wg0.conf =========================
+def read_server_conf(path: str = WG_CONF_PATH, sudo: bool = WG_SUDO) -> str:
+    """Lee wg0.conf (con sudo si el proceso no tiene permiso de lectura)."""
+    if os.access(path, os.R_OK) or not sudo:
+        with open(path, 'r') as f:
+            return f.read()
+    result = subprocess.run(["sudo", "cat", path], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise PermissionError(result.stderr.strip() or f"No se pudo leer {path}")
+    return result.stdout
+
+
+def write_server_conf(text: str, path: str = WG_CONF_PATH, sudo: bool = WG_SUDO) -> None:
+    """
+    Reescribe wg0.conf de forma atómica (temporal + rename en el mismo directorio).
+    Sin permiso de escritura y con WG_SUDO, lo hace un único `sudo sh`.
+    """
+    folder = os.path.dirname(path) or '.'
+    if os.access(folder, os.W_OK) or not sudo:
+        fd, tmp = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', dir=folder)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(text)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmp, 0o600)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        return
+    result = subprocess.run(
+        ["sudo", "sh", "-c", 'umask 077 && cat > "$1.tmp" && mv "$1.tmp" "$1"', "sh", path],
+        input=text, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise PermissionError(result.stderr.strip() or f"No se pudo escribir {path}")